@@ -4,13 +4,26 @@ Command-line interface to Aide
 """
 
 import datetime
+import json
 import logging
+import os
 import re
-import sqlite3
+import sys
+import time
 from argparse import ArgumentParser, ArgumentTypeError
 
+import client
 import core
+import history
+import notes
+import pool
+import project_mod
 import rpg_mod
+import schedule
+import server
+import status
+import sync
+import views
 
 
 def get_arguments():
@@ -35,6 +48,21 @@ def get_arguments():
         help='Debug mode [under construction]'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        required=False,
+        help='Print a profile of the executed SQL queries at exit'
+    )
+
+    parser.add_argument(
+        '--db',
+        type=str,
+        metavar='NAME',
+        help='Use the DB of the named profile from the config. '
+             'Tasks of other profiles can also be referenced as NAME:ID'
+    )
+
     # adding tasks
     parser_add = subparsers.add_parser('add', help='Create a new task')
     parser_add.add_argument(
@@ -100,6 +128,26 @@ def get_arguments():
         action='store_true',
         help="List open tasks"
     )
+    parser_list.add_argument(
+        '-a', '--all',
+        action='store_true',
+        help="List the tasks of all profiles"
+    )
+    parser_list.add_argument(
+        '-p', '--project',
+        type=int,
+        help="List the tasks of a project and its sub-projects"
+    )
+    list_group.add_argument(
+        '--view',
+        type=str,
+        help="List the tasks of a saved view"
+    )
+    list_group.add_argument(
+        '-f', '--filter',
+        type=str,
+        help="List the tasks matching a filter, e.g. 'tag:work prio>50 due<=+3d'. See views.py"
+    )
 
     # modifying tasks
     parser_mod = subparsers.add_parser('mod', help='Modify a task')
@@ -172,6 +220,68 @@ def get_arguments():
         help="ID of the task to delete"
     )
 
+    # dependencies
+    parser_link = subparsers.add_parser('link', help='Make a task wait until another one is closed')
+    parser_link.add_argument(
+        'id',
+        type=str,
+        help="ID of the waiting task"
+    )
+    parser_link.add_argument(
+        'blocker',
+        type=str,
+        nargs='?',
+        help="ID of the task to wait for. If omitted, list the tasks it waits for"
+    )
+    parser_unlink = subparsers.add_parser('unlink', help='Remove a dependency between tasks')
+    parser_unlink.add_argument(
+        'id',
+        type=str,
+        help="ID of the waiting task"
+    )
+    parser_unlink.add_argument(
+        'blocker',
+        type=str,
+        help="ID of the task it waits for"
+    )
+
+    # tags and saved views
+    parser_tag = subparsers.add_parser('tag', help='Tag a task')
+    parser_tag.add_argument(
+        'id',
+        type=str,
+        help="ID of the task"
+    )
+    parser_tag.add_argument(
+        'tags',
+        type=str,
+        nargs='*',
+        help="Tags to add. If omitted, list the tags of the task"
+    )
+    parser_tag.add_argument(
+        '-r', '--remove',
+        action='store_true',
+        help="Remove the tags instead"
+    )
+    parser_view = subparsers.add_parser('view', help='Save a filter as a named view')
+    parser_view.add_argument(
+        'name',
+        type=str,
+        nargs='?',
+        help="Name of the view. If omitted, list the views"
+    )
+    parser_view.add_argument(
+        'expression',
+        type=str,
+        nargs='?',
+        help="Filter of the view, e.g. 'tag:work !blocked'. If omitted, list the tasks of the view"
+    )
+    parser_view.add_argument(
+        '-d', '--delete',
+        action='store_true',
+        help="Delete the view"
+    )
+
     # reporting
     parser_report = subparsers.add_parser('report',
                                           help='Calculate a total weight of tasks. '
@@ -192,6 +302,11 @@ def get_arguments():
         action='store_true',
         help="Build a plot of productivity by days"
     )
+    parser_report.add_argument(
+        '-a', '--all',
+        action='store_true',
+        help="Weight of today's tasks in every profile"
+    )
 
     # notes
     parser_note = subparsers.add_parser('note',
@@ -208,8 +323,181 @@ def get_arguments():
              "Default: current date"
     )
 
+    parser_notes = subparsers.add_parser('notes', help='Show the journal: the notes and the closed tasks of every day')
+    parser_notes.add_argument(
+        '--from',
+        type=validate_date,
+        dest='from_date',
+        help="The first day. Default: %d days before the last one" % (notes.DEFAULT_DAYS - 1)
+    )
+    parser_notes.add_argument(
+        '--to',
+        type=validate_date,
+        dest='to_date',
+        help="The last day. Default: today"
+    )
+    parser_notes.add_argument(
+        '-e', '--export',
+        type=int,
+        metavar='YEAR',
+        help="Write the journal of a whole year as Markdown"
+    )
+    parser_notes.add_argument(
+        '-o', '--output',
+        type=str,
+        help="File for --export. Default: standard output"
+    )
+
+    # status snapshot
+    parser_status = subparsers.add_parser('status', help='Print the status snapshot: top task, progress, level')
+    parser_status.add_argument(
+        '-j', '--json',
+        action='store_true',
+        help="Print the JSON variant"
+    )
+    parser_status.add_argument(
+        '-w', '--watch',
+        action='store_true',
+        help="Print the status again every time it changes"
+    )
+    parser_status.add_argument(
+        '-r', '--refresh',
+        action='store_true',
+        help="Rewrite the snapshot before printing it"
+    )
+
+    # history
+    parser_history = subparsers.add_parser('history', help='Show the changes of a task')
+    parser_history.add_argument(
+        'id',
+        type=str,
+        nargs='?',
+        help="ID of the task"
+    )
+    history_group = parser_history.add_mutually_exclusive_group()
+    history_group.add_argument(
+        '-s', '--state',
+        type=validate_date,
+        help="List the tasks that were open at the end of a given day. Format: YYYY-MM-DD"
+    )
+    history_group.add_argument(
+        '-p', '--postponed',
+        type=int,
+        metavar='DAYS',
+        help="The most often postponed tasks in the last DAYS days"
+    )
+
+    # bulk reschedule
+    parser_reschedule = subparsers.add_parser('reschedule', help='Spread the overdue tasks over the next days')
+    parser_reschedule.add_argument(
+        '-n', '--days',
+        type=int,
+        default=schedule.DEFAULT_DAYS,
+        help="Number of days, starting today. Default: %d" % schedule.DEFAULT_DAYS
+    )
+    parser_reschedule.add_argument(
+        '-c', '--capacity',
+        type=float,
+        help="Total weight of the tasks per day. Default: daily_capacity from the config, or %g"
+             % schedule.DEFAULT_CAPACITY
+    )
+    parser_reschedule.add_argument(
+        '--dry-run',
+        action='store_true',
+        help="Only print the new due dates"
+    )
+
+    # weight planner
+    parser_plan = subparsers.add_parser('plan', help='Show the undated tasks planned for the next days')
+    parser_plan.add_argument(
+        '-n', '--days',
+        type=int,
+        default=schedule.DEFAULT_DAYS,
+        help="Number of days, starting today. Default: %d" % schedule.DEFAULT_DAYS
+    )
+
+    # project rollups
+    parser_projects = subparsers.add_parser('projects', help='List the open projects with the rollups of their tasks')
+    projects_group = parser_projects.add_mutually_exclusive_group()
+    projects_group.add_argument(
+        '--check',
+        action='store_true',
+        help="Compare the rollups with the tasks"
+    )
+    projects_group.add_argument(
+        '--rebuild',
+        action='store_true',
+        help="Recompute the rollups from the tasks"
+    )
+    projects_group.add_argument(
+        '--hide',
+        type=int,
+        metavar='ID',
+        help="Leave the tasks of a project out of the default lists, the top task and the reports"
+    )
+    projects_group.add_argument(
+        '--unhide',
+        type=int,
+        metavar='ID',
+        help="Show the tasks of a hidden project again"
+    )
+    projects_group.add_argument(
+        '--move',
+        type=int,
+        nargs='+',
+        metavar='ID',
+        help="Make a project a sub-project of another one: --move ID PARENT; top level without PARENT"
+    )
+
+    # replication
+    parser_sync = subparsers.add_parser('sync', help='Exchange the changes with another DB')
+    parser_sync.add_argument(
+        'path',
+        type=str,
+        nargs='?',
+        help="Another DB file, or a directory shared with other DBs (e.g. a synced folder)"
+    )
+    parser_sync.add_argument(
+        '--reset-node',
+        action='store_true',
+        help="Give this DB a new identity. Needed once for a copy of a DB file that has been synced before"
+    )
+
+    # API server
+    parser_server = subparsers.add_parser('server', help='Serve the DB over an HTTP/JSON API')
+    parser_server.add_argument(
+        '-H', '--host',
+        type=str,
+        default=server.DEFAULT_HOST,
+        help="Address to listen on. Default: %s" % server.DEFAULT_HOST
+    )
+    parser_server.add_argument(
+        '-P', '--port',
+        type=int,
+        default=server.DEFAULT_PORT,
+        help="Port to listen on. Default: %d" % server.DEFAULT_PORT
+    )
+
     # RPG extension
     parser_rpg = subparsers.add_parser('rpg', help='tbd')
+    parser_rpg.add_argument(
+        'action',
+        nargs='?',
+        choices=['report', 'rebuild'],
+        help="report: XP per week and skill, gold earned and spent, level-ups; "
+             "rebuild: recompute the character from the ledger after a change of rpg_rules"
+    )
+    parser_rpg.add_argument(
+        '-w', '--weeks',
+        type=int,
+        default=8,
+        help="Number of weeks in the report. Default: 8"
+    )
+    parser_rpg.add_argument(
+        '-n', '--what-if',
+        action='store_true',
+        help="With -f: show what completing the quests would give, without completing them"
+    )
     rpg_group = parser_rpg.add_mutually_exclusive_group()
     rpg_group.add_argument(
         '-l', '--list-quests',
@@ -219,7 +507,9 @@ def get_arguments():
     rpg_group.add_argument(
         '-f', '--finish-quest',
         type=int,
-        help='tbd'
+        nargs='+',
+        metavar='ID',
+        help='Complete the quests; a quest may be given several times'
     )
     rpg_group.add_argument(
         '-a', '--list-awards',
@@ -302,7 +592,7 @@ def print_tasks(tasks: list, verbose=True):
         t = tasks[0]
         due_time = t["due_time"] if t["due_time"] else "--:--"
         print("Pr: {:<3} | Status: {:<2} | Weight: {:<4} | Due: {} | ID: {:<3} | {}".format(
-            t["priority"], t["status"], t["weight"], due_time, t["id"], t["name"]))
+            t["priority"], t["status"], t["weight"], due_time, task_reference(t), t["name"]))
         return
 
     if verbose:
@@ -311,7 +601,32 @@ def print_tasks(tasks: list, verbose=True):
     for t in tasks:
         due_time = t["due_time"] if t["due_time"] else "--:--"
         print("{:<3} | {:<2} | {:<4} | {} | {:<3} | {}".format(
-            t["priority"], t["status"], t["weight"], due_time, t["id"], t["name"]))
+            t["priority"], t["status"], t["weight"], due_time, task_reference(t), t["name"]))
+
+
+def task_reference(task: dict):
+    # tasks listed across profiles are referenced as PROFILE:ID
+    return "%s:%s" % (task["profile"], task["id"]) if "profile" in task else task["id"]
+
+
+def print_all_profiles(config, args):
+    profiles = pool.Pool(config, args.profile)
+    try:
+        if args.subparser_name == 'report':
+            weights = profiles.get_total_weights()
+            print("Profile      | Closed | Total\n-----------------------------")
+            for w in weights:
+                print("{:<12} | {:<6g} | {:g}".format(w["profile"], w["closed"], w["total"]))
+            print("{:<12} | {:<6g} | {:g}".format(
+                "all", sum(w["closed"] for w in weights), sum(w["total"] for w in weights)))
+        elif args.top:
+            task = profiles.get_top_task()
+            print_tasks([task] if task else [], args.verbose)
+        else:
+            tasks = profiles.list_tasks(False, args.open, exclude_overdue_tasks=bool(args.date), due_date=args.date)
+            print_tasks(tasks, args.verbose)
+    finally:
+        profiles.close()
 
 
 def ask_confirmation(question, default="yes"):
@@ -368,14 +683,242 @@ def close(db, cursor, id_):
         print_tasks(tasks)
 
 
+def link(db, cursor, id_, blocker):
+    if blocker:
+        try:
+            core.link_tasks(db, cursor, id_, blocker)
+        except ValueError as e:
+            logging.error(e)
+            return
+        print("Task %s waits for task %s" % (id_, blocker))
+        return
+
+    blockers = core.get_blockers(cursor, id_)
+    if not blockers:
+        print("Task %s does not wait for other tasks" % id_)
+    for b in blockers:
+        print("{:<3} | {} | {}".format(b["id"], "open  " if b["status"] else "closed", b["name"]))
+
+
+def print_history(cursor, args):
+    if args.state:
+        end_of_day = datetime.datetime.strptime(args.state, "%Y-%m-%d") + datetime.timedelta(days=1)
+        try:
+            tasks = history.get_state(cursor, end_of_day.timestamp())
+        except ValueError as e:
+            logging.error(e)
+            return
+        print("ID  | PR  | WEI  | Due        | Name\n-------------------------------------")
+        for id_, t in sorted(tasks.items(), key=lambda t: (-(t[1]["priority"] or 0), t[0])):
+            print("{:<3} | {:<3} | {:<4} | {:<10} | {}".format(
+                id_, t["priority"], t["weight"], t["due_date"] or "", t["name"]))
+
+    elif args.postponed:
+        since = time.time() - args.postponed * 24 * 60 * 60
+        total, tasks = history.get_postponed(cursor, since)
+        print("Postponed {} times in the last {} days".format(total, args.postponed))
+        for count, id_, name in tasks:
+            print("{:<4} | {:<3} | {}".format(count, id_, name))
+
+    elif args.id:
+        for e in history.get_events(cursor, args.id):
+            print("{} | {:<16} | {}".format(e["time"], e["event"], e["value"] if e["value"] is not None else ""))
+
+    else:
+        logging.error("Specify a task, --state or --postponed")
+
+
+def reschedule(db, cursor, config, args):
+    try:
+        capacity = args.capacity if args.capacity is not None else schedule.get_capacity(config)
+        if args.dry_run:
+            plan = schedule.plan_reschedule(cursor, args.days, capacity)
+        else:
+            plan = schedule.reschedule(db, cursor, args.days, capacity)
+    except ValueError as e:
+        logging.error(e)
+        return
+
+    if not plan:
+        print("No overdue tasks")
+        return
+    print("ID  | PR  | WEI  | Due        | New due    | Name\n--------------------------------------------------")
+    for t in plan:
+        print("{:<3} | {:<3} | {:<4} | {:<10} | {:<10} | {}".format(
+            t["id"], t["priority"], t["weight"], t["due_date"], t["new_date"], t["name"]))
+    print("%s %d tasks" % ("Would reschedule" if args.dry_run else "Rescheduled", len(plan)))
+
+
+def print_journal(cursor, config, args):
+    if args.export:
+        if args.output:
+            with open(os.path.expanduser(args.output), "w") as out:
+                days = export_journal(cursor, config, args.export, out)
+            print("%d days written to %s" % (days, args.output))
+        else:
+            export_journal(cursor, config, args.export, sys.stdout)
+        return
+
+    end = args.to_date or datetime.date.today().isoformat()
+    start = args.from_date or (datetime.date.fromisoformat(end) -
+                               datetime.timedelta(days=notes.DEFAULT_DAYS - 1)).isoformat()
+    days = notes.get_journal(cursor, start, end)
+    if not days:
+        logging.info("No notes or closed tasks from %s to %s" % (start, end))
+    for day in days:
+        print(day["date"] + " " + datetime.date.fromisoformat(day["date"]).strftime("%a"))
+        for note in day["notes"]:
+            print("    " + note["text"].replace("\n", "\n    "))
+        for task in day["closed"]:
+            print("  [x] {} ({})".format(task["name"], task["id"]))
+
+
+def export_journal(cursor, config, year, out):
+    # written day by day, so that a year is never held in memory; a server sends it a month at a time
+    if config.get("server"):
+        days = (day for start, end in notes.month_ranges(year) for day in notes.get_journal(cursor, start, end))
+        return notes.write_markdown(year, days, out)
+    return notes.export_markdown(cursor, year, out)
+
+
+def print_plan(db, cursor, config, days):
+    try:
+        plan = schedule.get_plan(db, cursor, days, schedule.get_capacity(config))
+    except ValueError as e:
+        logging.error(e)
+        return
+
+    for day in plan:
+        planned = sum(t["weight"] for t in day["tasks"])
+        print("{} {} | {:.2f} due + {:.2f} planned / {:g}".format(
+            day["date"], datetime.date.fromisoformat(day["date"]).strftime("%a"), day["due"], planned,
+            day["capacity"]))
+        for t in day["tasks"]:
+            print("    {:<4} | {:<4} | {}".format(t["id"], t["weight"], t["name"]))
+
+
+def tag(db, cursor, id_, tags, remove=False):
+    if tags and remove:
+        views.untag_task(db, cursor, id_, tags)
+    elif tags:
+        views.tag_task(db, cursor, id_, tags)
+    print("Task %s: %s" % (id_, ", ".join(views.get_tags(cursor, id_)) or "no tags"))
+
+
+def view(db, cursor, args):
+    if not args.name:
+        print("Name         | Filter\n---------------------")
+        for v in views.get_views(cursor):
+            print("{:<12} | {}".format(v["name"], v["expression"]))
+        return
+    try:
+        if args.delete:
+            print("View deleted" if views.delete_view(db, cursor, args.name) else "No view named " + args.name)
+        elif args.expression:
+            views.save_view(db, cursor, args.name, args.expression)
+            print("View saved: " + args.name)
+        else:
+            print_tasks(views.list_view(cursor, args.name), args.verbose)
+    except ValueError as e:
+        logging.error(e)
+
+
+def print_projects(db, cursor, args):
+    if args.check:
+        mismatches = project_mod.check_stats(cursor)
+        for project, stored, actual in mismatches:
+            print("Project {}: open/closed/weight/closed weight {} instead of {}".format(
+                project, "/".join("%g" % v for v in stored), "/".join("%g" % v for v in actual)))
+        print("%d projects differ from their tasks" % len(mismatches) if mismatches else "The rollups are consistent")
+    elif args.rebuild:
+        project_mod.rebuild_stats(db, cursor)
+        print("The rollups are recomputed")
+    elif args.hide or args.unhide:
+        project_mod.modify_project(db, cursor, args.hide or args.unhide, hidden=bool(args.hide))
+        print("Project %d is %s" % (args.hide or args.unhide, "hidden" if args.hide else "shown"))
+    elif args.move:
+        if len(args.move) > 2:
+            logging.error("Give the project and at most one parent")
+            return
+        try:
+            project_mod.move_project(db, cursor, args.move[0], args.move[1] if len(args.move) > 1 else None)
+        except ValueError as e:
+            logging.error(e)
+            return
+        print("Project %d moved" % args.move[0])
+    else:
+        # the rollups include the sub-projects
+        print("ID  | Open | Closed | Progress      | Last change | Name\n"
+              "-----------------------------------------------------------")
+        for p in project_mod.list_projects(cursor, open_projects=True):
+            print("{:<3} | {:<4} | {:<6} | {:<13} | {:<11} | {}".format(
+                p["id"], p["open_count"], p["closed_count"], "%g / %g" % (p["closed"], p["total"]),
+                p["last_activity"] or "", p["name"] + (" (hidden)" if p["hidden"] else "")))
+
+
+def print_rpg_report(report):
+    print("Week       | XP    | Earned | Spent | Skills\n--------------------------------------------------")
+    for w in report["weeks"]:
+        print("{} | {:<5} | {:<6} | {:<5} | {}".format(
+            w["week"], w["xp"], w["gold_earned"], w["gold_spent"],
+            ", ".join("%s %d" % s for s in sorted(w["skills"].items(), key=lambda s: -s[1]))))
+    if report["levels"]:
+        print("\nLevel-ups: " + ", ".join("%d on %s" % (level, date) for date, level in report["levels"]))
+    if report["skills"]:
+        print("Skill-ups: " + ", ".join("%s %d on %s" % (skill, level, date)
+                                        for date, skill, level in report["skills"]))
+
+
+def print_status(cursor, config, as_json=False, watch=False, refresh=False):
+    path = status.get_path(config)
+    if not path:
+        # no status_file hook configured: compute the status on the spot
+        snapshot = status.get_snapshot(cursor)
+        print(json.dumps(snapshot) if as_json else status.format_snapshot(snapshot))
+        if watch:
+            logging.error("Watching requires a status_file hook in the config")
+        return
+
+    if refresh or not os.path.exists(os.path.expanduser(path)):
+        status.save_snapshot(path, status.get_snapshot(cursor))
+    print(status.read(path, as_json), flush=True)
+
+    if watch:
+        try:
+            for _ in status.changes(path):
+                print(status.read(path, as_json), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
 def main():
     set_logging()
     args = get_arguments()
-    config = core.read_configuration()
 
-    # Connect to DB
-    database_file = config['db_path']
-    db = sqlite3.connect(database_file)
+    # a task of another profile can be referenced as PROFILE:ID; the change then goes to the DB of that profile
+    profile_name = args.db
+    if getattr(args, "id", None) and ":" in args.id:
+        profile_name, args.id = args.id.split(":", 1)
+    try:
+        config = core.read_configuration(profile_name)
+    except ValueError as e:
+        logging.error(e)
+        return
+
+    if getattr(args, "all", False):
+        print_all_profiles(config, args)
+        return
+
+    if args.subparser_name == 'server':
+        server.serve(config, args.host, args.port)
+        return
+
+    # Connect to DB, or to the server that holds it
+    if config.get("server"):
+        db = client.connect(config["server"])
+        client.install(globals(), db)
+    else:
+        db = core.connect(config, args.profile)
     cursor = db.cursor()
 
     #
@@ -387,12 +930,21 @@ def main():
 
     # list tasks
     elif args.subparser_name == 'list':
-        if not args.date:
+        if args.view or args.filter:
+            try:
+                tasks = views.list_view(cursor, args.view) if args.view else views.filter_tasks(cursor, args.filter)
+            except ValueError as e:
+                logging.error(e)
+                return
+            print_tasks(tasks, args.verbose)
+        elif not args.date:
             # by default, list overdue tasks too
-            tasks = core.list_tasks(cursor, args.top, args.open, due_date=args.date)
+            tasks = core.list_tasks(cursor, args.top, args.open, due_date=args.date, project=args.project,
+                                    subprojects=True)
             print_tasks(tasks, args.verbose)
         else:
-            tasks = core.list_tasks(cursor, args.top, args.open, exclude_overdue_tasks=True, due_date=args.date)
+            tasks = core.list_tasks(cursor, args.top, args.open, exclude_overdue_tasks=True, due_date=args.date,
+                                    project=args.project, subprojects=True)
             print_tasks(tasks, args.verbose)
 
     # modify a task
@@ -409,11 +961,62 @@ def main():
         core.delete_task(db, cursor, args.id)
         print("Task deleted: " + args.id)
 
+    # dependencies
+    elif args.subparser_name == 'link':
+        link(db, cursor, args.id, args.blocker)
+
+    elif args.subparser_name == 'unlink':
+        core.unlink_tasks(db, cursor, args.id, args.blocker)
+        print("Task %s does not wait for task %s" % (args.id, args.blocker))
+
+    # tags and saved views
+    elif args.subparser_name == 'tag':
+        tag(db, cursor, args.id, args.tags, args.remove)
+
+    elif args.subparser_name == 'view':
+        view(db, cursor, args)
+
     # add a note
     elif args.subparser_name == 'note':
         core.add_note(db, cursor, args.date, args.text)
         print("Note added")
 
+    # journal
+    elif args.subparser_name == 'notes':
+        print_journal(cursor, config, args)
+
+    # status snapshot
+    elif args.subparser_name == 'status':
+        print_status(cursor, config, args.json, args.watch, args.refresh)
+
+    # task history
+    elif args.subparser_name == 'history':
+        print_history(cursor, args)
+
+    # bulk reschedule
+    elif args.subparser_name == 'reschedule':
+        reschedule(db, cursor, config, args)
+
+    # weight planner
+    elif args.subparser_name == 'plan':
+        print_plan(db, cursor, config, args.days)
+
+    # project rollups
+    elif args.subparser_name == 'projects':
+        print_projects(db, cursor, args)
+
+    # replicate
+    elif args.subparser_name == 'sync':
+        if args.reset_node:
+            sync.reset_node(db, cursor)
+            print("New node id: " + sync.get_node(cursor))
+        if args.path:
+            try:
+                received, sent = sync.sync(db, args.path)
+                print("Received %d changes, sent %d changes" % (received, sent))
+            except sync.SyncError as e:
+                logging.error(e)
+
     # report stats
     elif args.subparser_name == 'report':
         if args.plot:
@@ -426,24 +1029,40 @@ def main():
     # RPG extension:
     elif args.subparser_name == 'rpg':
 
+        # progression report
+        if args.action == 'report':
+            print_rpg_report(rpg_mod.get_report(cursor, args.weeks))
+
+        # recompute the character under the current rules
+        elif args.action == 'rebuild':
+            character = rpg_mod.rebuild(db, cursor)
+            print("Level: {}\nGold: {}\nXP: {} [next: {}]".format(character["level"], character["gold"],
+                                                                  character["xp"], character["xp_for_next_level"]))
+
         # list quests
-        if args.list_quests:
+        elif args.list_quests:
             quests = rpg_mod.get_quests(cursor)
             print("ID  | XP | G  | Name \n-----------------")
             for q in quests:
                 print("{:<3} | {:<2} | {:<2} | {}".format(q["id"], q["xp"], q["gold"], q["name"]))
 
-        # close a quest
+        # close quests
         elif args.finish_quest:
-            result = rpg_mod.close_quest(db, cursor, args.finish_quest)
-            if not result:
+            if args.what_if:
+                summary = rpg_mod.simulate(cursor, args.finish_quest)
+            else:
+                summary = rpg_mod.close_quests(db, cursor, args.finish_quest)
+            if not summary["quests"]:
                 print("Not such quest!")
-
-            print("Closed quest: " + result[0])
-            if result[1]:
-                print("\n\n   Hey! You leveled up!!!\n")
-            if result[2]:
-                print("Skill " + result[3] + " increased to level " + result[4])
+            else:
+                print(("Would close: " if args.what_if else "Closed quests: ") + ", ".join(summary["quests"]))
+                print("XP: +{} | Gold: +{}".format(summary["xp"], summary["gold"]))
+            if summary["levels"]:
+                print("\n\n   Hey! You leveled up{}!!! Level {}\n".format(
+                    " %d times" % summary["levels"] if summary["levels"] > 1 else "", summary["level"]))
+            for skill in summary["skills"]:
+                if skill["levels"]:
+                    print("Skill " + skill["name"] + " increased to level " + str(skill["value"]))
 
         # list available awards
         elif args.list_awards:
@@ -463,8 +1082,9 @@ def main():
             character = rpg_mod.get_character_stats(cursor)
             print("Level: {}\n"
                   "Gold: {}\n"
-                  "XP: {} [next: {}]"
-                  .format(character["level"], character["gold"], character["xp"], character["xp_for_next_level"]))
+                  "XP: {} [next: {}, {}% of the level]"
+                  .format(character["level"], character["gold"], character["xp"], character["xp_for_next_level"],
+                          character["xp_progress"]))
 
         # by default, print all useful info
         else:
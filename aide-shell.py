@@ -3,11 +3,20 @@ import curses
 import curses.ascii
 import sqlite3
 import datetime
+import heapq
+import re
+import time
+from argparse import ArgumentParser
 
 import curses_editor
+import client
 import core
+import notes
+import notify
 import rpg_mod
 import project_mod
+import schedule
+import views
 
 
 class CallStack(list):
@@ -24,6 +33,36 @@ class CallStack(list):
         return self[-1][1]
 
 
+class DueScheduler:
+    """
+    Heap of the moments when open tasks become due; tells how long the shell may sleep before the top task changes
+    """
+    max_timeout = 60 * 60 * 1000  # ms; the home tab is redrawn at least this often, see HomeTab.open
+    slack = 1.0  # s; datetime('now') has a resolution of a second, so a task is actionable a second after its boundary
+
+    def __init__(self, bell: bool = False):
+        self.bell = bell
+        self.boundaries = []
+
+    def refresh(self, cursor: sqlite3.Cursor):
+        self.boundaries = core.get_due_boundaries(cursor)
+        heapq.heapify(self.boundaries)
+
+    def timeout(self) -> int:
+        if not self.boundaries:
+            return self.max_timeout
+        delay = self.boundaries[0] + self.slack - time.time()
+        return min(self.max_timeout, max(0, int(delay * 1000)))
+
+    def pop_due(self) -> bool:
+        now = time.time()
+        due = False
+        while self.boundaries and self.boundaries[0] + self.slack <= now:
+            heapq.heappop(self.boundaries)
+            due = True
+        return due
+
+
 class Windows:
     main = None
     message = None
@@ -34,9 +73,14 @@ class Windows:
     columns = 0
     lines = 0
 
-    def __init__(self, stdscr):
+    frame_interval = 0.0
+    last_update = 0.0
+
+    def __init__(self, stdscr, max_fps: float = 0):
         self.stdscr = stdscr
         self.lines, self.columns = self.stdscr.getmaxyx()
+        if max_fps:
+            self.frame_interval = 1.0 / max_fps
 
     def draw(self):
         lines, columns = self.stdscr.getmaxyx()
@@ -47,11 +91,31 @@ class Windows:
         self.commands = curses.newwin(5, columns - 1, lines - 6, 0)
         self.progress = curses.newwin(3, 29, lines - 1, 0)
         self.character = curses.newwin(3, 42, lines - 1, columns - 42)
-        self.stdscr.refresh()
+        self.stdscr.noutrefresh()
 
         self.lines = lines
         self.columns = columns
 
+    def update(self):
+        # the draw helpers only stage their changes with noutrefresh(),
+        # here everything is pushed to the terminal in a single write
+        if self.frame_interval:
+            now = time.monotonic()
+            if now - self.last_update < self.frame_interval and self.input_pending():
+                # more keys are already queued: skip this frame, the next one will include it
+                return
+            self.last_update = now
+        curses.doupdate()
+
+    def input_pending(self) -> bool:
+        self.stdscr.nodelay(True)
+        c = self.stdscr.getch()
+        self.stdscr.nodelay(False)
+        if c == -1:
+            return False
+        curses.ungetch(c)
+        return True
+
 
 class Tab:
     redraw: bool = True
@@ -88,13 +152,15 @@ class Tab:
         for row in commands:
             position = 2
             for c in row:
+                # on a narrow terminal the commands that do not fit into the box are left out
+                if position + len(c[0]) + len(":" + c[1] if c[1] else "") > self.windows.columns - 3:
+                    break
                 self.windows.commands.addstr(line, position, c[0], curses.A_BOLD)
                 self.windows.commands.addstr(line, position + 1, ":" + c[1] if c[1] else "")
                 position += 20
             line += 1
 
-        self.stdscr.refresh()
-        self.windows.commands.refresh()
+        self.windows.commands.noutrefresh()
 
     def draw_progress_bar(self):
         weight_total = core.get_total_weight(self.db_cursor)
@@ -103,21 +169,18 @@ class Tab:
         weight_week /= (datetime.datetime.today().weekday() + 1)
         self.windows.progress.addstr(0, 0, "Progress: {:.2f} [{:.2f}] / {:.2f}"
                                      .format(weight_current, weight_week, weight_total))
-        self.stdscr.refresh()
-        self.windows.progress.refresh()
+        self.windows.progress.noutrefresh()
 
     def draw_character_bar(self):
         character = rpg_mod.get_character_stats(self.db_cursor)
         self.windows.character.addstr(0, 0, "Level: {:<3} | XP: {:>4} / {:<4} | Gold: {:<4}".format(
             character["level"], character["xp"], character["xp_for_next_level"], character["gold"]))
-        self.stdscr.refresh()
-        self.windows.character.refresh()
+        self.windows.character.noutrefresh()
 
     def draw_cursor(self, new_position: int, old_position: int, offset: int = 3):
         self.windows.main.addstr(offset + old_position, 0, ' ')
         self.windows.main.addstr(offset + new_position, 0, '>')
-        self.stdscr.refresh()
-        self.windows.main.refresh()
+        self.windows.main.noutrefresh()
 
     def draw_selection(self, position: int, unselect=False):
         offset = 3
@@ -125,8 +188,7 @@ class Tab:
             self.windows.main.addstr(offset + position, 1, ' ')
         else:
             self.windows.main.addstr(offset + position, 1, '*')
-        self.stdscr.refresh()
-        self.windows.main.refresh()
+        self.windows.main.noutrefresh()
 
     def resize(self):
         lines, cols = self.stdscr.getmaxyx()
@@ -136,17 +198,15 @@ class Tab:
         self.windows.commands = curses.newwin(5, cols - 1, lines - 6, 0)
         self.windows.progress = curses.newwin(3, 25, lines - 1, 0)
         self.windows.character = curses.newwin(3, 42, lines - 1, cols - 42)
-        self.stdscr.refresh()
+        self.stdscr.noutrefresh()
 
     def print_message(self, text: str):
         self.windows.message.addstr(0, 1, text)
-        self.stdscr.refresh()
-        self.windows.message.refresh()
+        self.windows.message.noutrefresh()
 
     def print_help(self, text: str):
         self.windows.message.addstr(1, 1, text)
-        self.stdscr.refresh()
-        self.windows.message.refresh()
+        self.windows.message.noutrefresh()
 
     def ask_confirmation(self, text: str, default=True):
         valid = {"y": True, "n": False}
@@ -160,26 +220,39 @@ class Tab:
 
         while True:
             self.windows.message.addstr(0, 1, text + prompt)
-            self.stdscr.refresh()
-            self.windows.message.refresh()
+            self.windows.message.noutrefresh()
 
-            choice = self.stdscr.getkey()
+            choice = self.get_key()
 
             if default is not None and choice == '':
-                self.windows.message.clear()
+                self.clear_messages()
                 return default
             elif choice in valid:
-                self.windows.message.clear()
+                self.clear_messages()
                 return valid[choice]
             else:
                 self.windows.message.addstr(1, 1, "Please respond with 'y' or 'n'")
-                self.stdscr.refresh()
-                self.windows.message.refresh()
+                self.windows.message.noutrefresh()
 
     def clear_messages(self):
         self.windows.message.erase()
-        self.stdscr.refresh()
-        self.windows.message.refresh()
+        self.windows.message.noutrefresh()
+
+    def get_key(self, timeout: int = -1):
+        """
+        Flush the screen and wait for a key; returns None if `timeout` (ms) has passed without one
+        """
+        self.windows.update()
+        if timeout < 0:
+            return self.stdscr.getkey()
+
+        self.stdscr.timeout(timeout)
+        try:
+            return self.stdscr.getkey()
+        except curses.error:
+            return None
+        finally:
+            self.stdscr.timeout(-1)
 
     def get_input(self, default: str = "") -> (str, str):
         self.windows.message.move(2, 1)
@@ -189,8 +262,8 @@ class Tab:
         while True:
             self.windows.message.deleteln()
             self.windows.message.addstr(2, 1, ">> " + s)
-            self.windows.message.refresh()
-            self.stdscr.refresh()
+            self.windows.message.noutrefresh()
+            self.windows.update()
 
             c = self.windows.message.getch()
             if c == 27:
@@ -238,7 +311,7 @@ class Tab:
                 self.print_message("Wrong format. Aborted.")
                 return
             params[i][0] = p[3](text)
-            self.windows.message.clear()
+            self.clear_messages()
 
         core.add_task(self.db, self.db_cursor, params[0][0], params[2][0], params[4][0], params[3][0], params[1][0],
                       params[5][0], params[6][0], params[7][0])
@@ -300,15 +373,13 @@ class ListTab(Tab):
         self.windows.main.hline(line, 0, curses.ACS_HLINE, self.windows.columns - 1)
         line += 1
 
-        self.stdscr.refresh()
-        self.windows.main.refresh()
+        self.windows.main.noutrefresh()
 
 
 class DialogTab(Tab):
     def draw_main(self):
         self.windows.main.erase()
-        self.windows.main.refresh()
-        self.stdscr.refresh()
+        self.windows.main.noutrefresh()
 
     def draw_commands(self):
         self.draw_generic_commands([
@@ -333,12 +404,12 @@ class DialogTab(Tab):
             line += 1
 
         self.draw_cursor(cursor, 0, 0)
-        self.stdscr.refresh()
-        self.windows.main.refresh()
+        self.windows.main.noutrefresh()
 
         # select
         while True:
             # wait for commands
+            self.windows.update()
             c = self.stdscr.getch()
 
             if c == ord("j"):
@@ -359,13 +430,13 @@ class DialogTab(Tab):
                 break
 
         self.windows.main.erase()
-        self.stdscr.refresh()
-        self.windows.main.refresh()
+        self.windows.main.noutrefresh()
         return options[cursor]["id"], status
 
 
 class HomeTab(Tab):
     task = None
+    scheduler = DueScheduler()
 
     def open(self):
         navigation = {
@@ -376,7 +447,9 @@ class HomeTab(Tab):
             "m": (ModifyTab, lambda: [self.task] if self.task else []),
             "s": (ReportTab, lambda: []),
             "n": (AddNoteTab, lambda: []),
+            "j": (JournalTab, lambda: []),
             "a": (AddTaskTab, lambda: ["today", 1, ]),
+            "P": (ProfileTab, lambda: []),  # hidden: SQL profile, see --profile
         }
 
         while True:
@@ -384,12 +457,22 @@ class HomeTab(Tab):
                 # retrieve the current task and update windows
                 self.task = core.list_tasks(self.db_cursor, True, due_date="today")
                 self.task = self.task[0] if self.task else None
+                self.scheduler.refresh(self.db_cursor)
                 self.draw_all()
                 self.redraw = False
 
-            # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            # wait for commands or for the next task to become due
+            c = self.get_key(self.scheduler.timeout())
+            if c is None:
+                if self.scheduler.pop_due():
+                    self.on_task_due()
+                else:
+                    # the periodic wake: other processes may have changed the tasks, or the day may have changed
+                    self.redraw = True
+                # only the next boundaries are loaded, so the heap is refilled even if the top task is the same
+                self.scheduler.refresh(self.db_cursor)
+                continue
+            self.clear_messages()
 
             # process normal command
             if c == 'c':
@@ -418,6 +501,20 @@ class HomeTab(Tab):
             if self.process_navigation_commands(c, navigation, enable_return=False):
                 return self.call_stack
 
+    def on_task_due(self):
+        previous = self.task
+        task = core.list_tasks(self.db_cursor, True, due_date="today")
+        task = task[0] if task else None
+        if task == previous:
+            return
+
+        self.redraw = True
+        if task is None:
+            return
+        if self.scheduler.bell:
+            curses.beep()
+        notify.post("due", id=task["id"], name=task["name"])
+
     def draw_main(self):
         self.windows.main.erase()
         self.windows.main.addstr(0, 1, "Current task:")
@@ -425,8 +522,7 @@ class HomeTab(Tab):
 
         if not tasks:
             self.windows.main.addstr(4, (self.windows.columns // 2) - 8, "No open tasks!")
-            self.stdscr.refresh()
-            self.windows.main.refresh()
+            self.windows.main.noutrefresh()
             return
 
         top_task = tasks[0]
@@ -434,13 +530,12 @@ class HomeTab(Tab):
         self.windows.main.addstr(3, 2, "Weight: {} | Priority : {} | ID: {} ".format(
             top_task["weight"], top_task["priority"], top_task["id"]))
 
-        self.stdscr.refresh()
-        self.windows.main.refresh()
+        self.windows.main.noutrefresh()
 
     def draw_commands(self):
         self.draw_generic_commands([
-            [("a", "add task"), ("m", "modify current"), ("c", "close current"), ("e", "cancel current")],
-            [("l", "list tasks"), ("n", "add note"), ("i", "incr. weight"), ("p", "projects")],
+            [("a", "add task"), ("m", "modify current"), ("c", "close, e: cancel"), ("i", "incr. weight")],
+            [("l", "list tasks"), ("n", "add note"), ("j", "journal"), ("p", "projects")],
             [("u", "quests"), ("w", "awards"), ("s", "show reports"), ("q", "quit")],
         ])
 
@@ -454,27 +549,35 @@ class TaskListTab(ListTab):
         self.current = self.call_stack.top_arguments()[0]
 
         navigation = {
-            "m": (ModifyTab, self.call_modify)
+            "m": (ModifyTab, self.call_modify),
+            "R": (RescheduleTab, lambda: []),
         }
         exclude_overdue = False
         exclude_closed = True
+        view = None  # a saved view instead of today's tasks
 
         while True:
             if self.redraw:
-                self.tasks = core.list_tasks(self.db_cursor, False, exclude_closed_tasks=exclude_closed,
-                                             exclude_overdue_tasks=exclude_overdue, due_date="today")
-                if not self.tasks:
-                    self.print_message("No open tasks!")
-
+                if view:
+                    self.tasks = views.filter_tasks(self.db_cursor, view["expression"])
+                else:
+                    self.tasks = core.list_tasks(self.db_cursor, False, exclude_closed_tasks=exclude_closed,
+                                                 exclude_overdue_tasks=exclude_overdue, due_date="today")
                 self.selected_tasks.clear()
 
                 self.draw_all()
+                if not self.tasks:
+                    self.print_message("No open tasks!")
+                if view:
+                    self.print_help("View %s: %s" % (view["name"], view["expression"]))
+                elif any(t["due_date"] and t["due_date"] < self.today() for t in self.tasks if t["status"]):
+                    self.print_help("R: reschedule the overdue tasks")
                 self.draw_cursor(self.current, 0)
                 self.redraw = False
 
             # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             # process the command
             if c == "j":
@@ -500,6 +603,17 @@ class TaskListTab(ListTab):
                 exclude_closed = not exclude_closed
                 self.current = 0
                 self.redraw = True
+            elif c == 'v':
+                # today's tasks, then every saved view in turn
+                saved = views.get_views(self.db_cursor)
+                if not saved:
+                    self.print_message("No saved views; add one with `aide view NAME FILTER`")
+                    continue
+                names = [v["name"] for v in saved]
+                position = names.index(view["name"]) + 1 if view and view["name"] in names else 0
+                view = saved[position] if view is None or position < len(saved) else None
+                self.current = 0
+                self.redraw = True
             elif c == 'a':
                 self.add_task()
                 self.redraw = True
@@ -533,11 +647,16 @@ class TaskListTab(ListTab):
 
     def draw_commands(self):
         self.draw_generic_commands([
-            [("j", "next task"), ("k", "previous task"), ("s", "toggle selection"), ("c", "toggle status")],
-            [("a", "add task"), ("m", "modify selected"), ("p", "increase prio."), ("P", "decrease prio.")],
-            [("o", "toggle overdue"), ("f", "toggle finished"), ("r", "return"), ("q", "quit")],
+            [("j", "next, k: previous"), ("s", "toggle selection"), ("c", "toggle status"), ("a", "add task")],
+            [("m", "modify selected"), ("p", "increase prio."), ("P", "decrease prio."), ("o", "toggle overdue")],
+            [("f", "toggle finished"), ("v", "next view"), ("r", "return"), ("q", "quit")],
         ])
 
+    @staticmethod
+    def today():
+        # the due dates are compared with date('now'), which is in UTC
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
     def call_modify(self):
         self.call_stack.top_arguments()[0] = self.current
         if self.selected_tasks:
@@ -547,11 +666,71 @@ class TaskListTab(ListTab):
         return task_list
 
 
+class RescheduleTab(ListTab):
+    plan = []
+    capacity = schedule.DEFAULT_CAPACITY
+    max_shown = 30
+
+    def open(self):
+        navigation = {}
+        days = schedule.DEFAULT_DAYS
+        self.redraw = True
+
+        while True:
+            if self.redraw:
+                # a dry run: nothing is changed until the plan is applied
+                self.plan = schedule.plan_reschedule(self.db_cursor, days, self.capacity)
+                self.draw_all()
+                if not self.plan:
+                    self.print_message("No overdue tasks")
+                else:
+                    self.print_message("{} tasks over {} days{}".format(
+                        len(self.plan), days,
+                        " (first {} shown)".format(self.max_shown) if len(self.plan) > self.max_shown else ""))
+                self.redraw = False
+
+            # wait for commands
+            c = self.get_key()
+            self.clear_messages()
+
+            if c == "+":
+                days += 1
+                self.redraw = True
+            elif c == "-" and days > 1:
+                days -= 1
+                self.redraw = True
+            elif c == "a" and self.plan:
+                if self.ask_confirmation("Reschedule {} tasks?".format(len(self.plan))):
+                    schedule.reschedule(self.db, self.db_cursor, days, self.capacity)
+                    self.call_stack.pop()
+                    return self.call_stack
+
+            if self.process_navigation_commands(c, navigation):
+                return self.call_stack
+
+    def draw_main(self):
+        self.draw_list(
+            self.plan[:self.max_shown],
+            "|PR |WGHT|Due       |New due   ",
+            "|{0:<3}|{1:<1.2f}|{2:10}|{3}",
+            ("priority", "weight", "due_date", "new_date"),
+        )
+
+    def draw_commands(self):
+        self.draw_generic_commands([
+            [("a", "apply"), ("", ""), ("", ""), ("", "")],
+            [("+", "more days"), ("-", "fewer days"), ("", ""), ("", "")],
+            [("", ""), ("", ""), ("r", "return"), ("q", "quit")],
+        ])
+
+
 class QuestsListTab(ListTab):
     quests = []
 
     def open(self):
-        navigation = {}
+        navigation = {
+            "s": (RpgReportTab, lambda: []),
+        }
         current = 0
         self.redraw = True
 
@@ -566,8 +745,8 @@ class QuestsListTab(ListTab):
                 self.redraw = False
 
             # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             # process the command
             if c == "j":
@@ -605,7 +784,7 @@ class QuestsListTab(ListTab):
     def draw_commands(self):
         self.draw_generic_commands([
             [("j", "next quest"), ("k", "previous quest"), ("", ""), ("", "")],
-            [("c", "complete quest"), ("a", "new quest"), ("", ""), ("", "")],
+            [("c", "complete quest"), ("a", "new quest"), ("s", "progress report"), ("", "")],
             [("", ""), ("", ""), ("r", "return"), ("q", "quit")],
         ])
 
@@ -614,21 +793,21 @@ class QuestsListTab(ListTab):
         name, status = self.get_input()
         if status == "cancel":
             return
-        self.windows.message.clear()
+        self.clear_messages()
 
         self.print_message("Enter the awarded xp (0 if left blank):")
         xp, status = self.get_input()
         if status == "cancel":
             return
         xp = int(xp) if xp else 0
-        self.windows.message.clear()
+        self.clear_messages()
 
         self.print_message("Enter the gold reward (0 if left blank):")
         gold, status = self.get_input()
         if status == "cancel":
             return
         gold = int(gold) if gold else 0
-        self.windows.message.clear()
+        self.clear_messages()
 
         skills = rpg_mod.get_skills(self.db_cursor)
         skill_list = ", ".join([str(s["id"]) + ": " + s["name"] for s in skills])
@@ -640,12 +819,65 @@ class QuestsListTab(ListTab):
         if skill is None:
             return
         skill = int(skill) if skill else 0
-        self.windows.message.clear()
+        self.clear_messages()
 
         rpg_mod.add_quest(self.db, self.db_cursor, name, xp, gold, skill)
         return True
 
 
+class RpgReportTab(ListTab):
+    weeks = []
+
+    def open(self):
+        navigation = {}
+        weeks = 8
+        self.redraw = True
+
+        while True:
+            if self.redraw:
+                report = rpg_mod.get_report(self.db_cursor, weeks)
+                self.weeks = [dict(w, name=w["week"] + "  " + ", ".join(
+                    "%s %d" % s for s in sorted(w["skills"].items(), key=lambda s: -s[1])))
+                    for w in report["weeks"]]
+                self.draw_all()
+                width = self.windows.columns - 3
+                if report["levels"]:
+                    self.print_message(("Level-ups: " + ", ".join(
+                        "%d on %s" % (level, date) for date, level in report["levels"]))[:width])
+                if report["skills"]:
+                    self.print_help(("Skill-ups: " + ", ".join(
+                        "%s %d on %s" % (skill, level, date) for date, skill, level in report["skills"]))[:width])
+                self.redraw = False
+
+            c = self.get_key()
+            self.clear_messages()
+
+            if c == "+":
+                weeks += 1
+                self.redraw = True
+            elif c == "-" and weeks > 1:
+                weeks -= 1
+                self.redraw = True
+
+            if self.process_navigation_commands(c, navigation):
+                return self.call_stack
+
+    def draw_main(self):
+        self.draw_list(
+            self.weeks[:30],
+            "|XP   |Earned|Spent ",
+            "|{:<5}|{:<6}|{:<6}",
+            ("xp", "gold_earned", "gold_spent"),
+        )
+
+    def draw_commands(self):
+        self.draw_generic_commands([
+            [("+", "more weeks"), ("-", "fewer weeks"), ("", ""), ("", "")],
+            [("", ""), ("", ""), ("", ""), ("", "")],
+            [("", ""), ("", ""), ("r", "return"), ("q", "quit")],
+        ])
+
+
 class AwardsListTab(ListTab):
     awards = []
 
@@ -665,7 +897,7 @@ class AwardsListTab(ListTab):
                 self.redraw = False
 
             # wait for commands
-            c = self.stdscr.getkey()
+            c = self.get_key()
             self.clear_messages()
 
             # process the command
@@ -695,7 +927,7 @@ class AwardsListTab(ListTab):
             return
         if name is None:
             return
-        self.windows.message.clear()
+        self.clear_messages()
 
         self.print_message("Enter the award price (0 if left blank):")
         price, status = self.get_input()
@@ -704,7 +936,7 @@ class AwardsListTab(ListTab):
         if price is None:
             return
         price = int(price) if price else 0
-        self.windows.message.clear()
+        self.clear_messages()
 
         rpg_mod.add_award(self.db, self.db_cursor, name, price)
         return True
@@ -728,6 +960,7 @@ class AwardsListTab(ListTab):
 class ProjectListTab(ListTab):
     projects = []
     current_project = 0
+    collapsed = set()
 
     def open(self):
         navigation = {
@@ -738,20 +971,16 @@ class ProjectListTab(ListTab):
 
         while True:
             if self.redraw:
-                self.projects = project_mod.list_projects(self.db_cursor, open_projects=True)
-                for p in self.projects:
-                    if p["priority"] > 50:
-                        p["name"] = "* " + p["name"]
-                    elif p["priority"] == 0:
-                        p["name"] = "- " + p["name"]
+                self.projects = self.project_tree(project_mod.list_projects(self.db_cursor, open_projects=True))
+                self.current_project = min(self.current_project, max(len(self.projects) - 1, 0))
 
                 self.draw_all()
                 self.draw_cursor(0, 0)
                 self.redraw = False
 
             # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             # process the command
             if c == "j":
@@ -775,10 +1004,52 @@ class ProjectListTab(ListTab):
             elif c == 'a':
                 self.add_project()
                 self.redraw = True
+            elif c == 'c':
+                self.collapsed ^= {self.projects[self.current_project]["id"]}
+                self.redraw = True
+            elif c == 'x':
+                project = self.projects[self.current_project]
+                project_mod.modify_project(self.db, self.db_cursor, project["id"], hidden=not project["hidden"])
+                self.redraw = True
+            elif c == 'm':
+                self.print_message("Enter the ID of the parent project (top level if left blank):")
+                parent, status = self.get_input()
+                if status == "cancel":
+                    self.print_message("Aborted")
+                    continue
+                try:
+                    project_mod.move_project(self.db, self.db_cursor, self.projects[self.current_project]["id"],
+                                             int(parent) if parent else None)
+                except ValueError as e:
+                    self.print_message(str(e))
+                    continue
+                self.redraw = True
 
             if self.process_navigation_commands(c, navigation):
                 return self.call_stack
 
+    def project_tree(self, projects):
+        """
+        The projects in the order of the tree, each after its parent, with the names indented by the depth.
+        The sub-projects of the collapsed projects are left out
+        """
+        ids = {p["id"] for p in projects}
+        children = {}
+        for p in projects:
+            children.setdefault(p["parent"] if p["parent"] in ids else None, []).append(p)
+
+        tree = []
+        stack = [(p, 0) for p in reversed(children.get(None, []))]
+        while stack:
+            p, depth = stack.pop()
+            marker = "+" if p["id"] in self.collapsed and p["id"] in children else " "
+            marker += "*" if p["priority"] > 50 else "-" if p["priority"] == 0 else " "
+            p["name"] = "  " * depth + marker + " " + p["name"] + (" (hidden)" if p["hidden"] else "")
+            tree.append(p)
+            if p["id"] not in self.collapsed:
+                stack += [(child, depth + 1) for child in reversed(children.get(p["id"], []))]
+        return tree
+
     def add_project(self):
         self.print_message("Enter the name:")
         name, status = self.get_input()
@@ -793,7 +1064,16 @@ class ProjectListTab(ListTab):
         priority = int(priority) if priority else 0
         self.clear_messages()
 
-        project_mod.add_project(self.db, self.db_cursor, name, priority)
+        self.print_message("Enter the ID of the parent project (top level if left blank):")
+        parent, status = self.get_input()
+        if status == "cancel":
+            return
+        self.clear_messages()
+
+        try:
+            project_mod.add_project(self.db, self.db_cursor, name, priority, int(parent) if parent else None)
+        except ValueError as e:
+            self.print_message(str(e))
 
     def draw_main(self):
         self.draw_list(
@@ -805,9 +1085,9 @@ class ProjectListTab(ListTab):
 
     def draw_commands(self):
         self.draw_generic_commands([
-            [("j", "next project"), ("k", "previous project"), ("", ""), ("", "")],
-            [("l", "list tasks"), ("e", "set priority"), ("a", "add project"), ("", "")],
-            [("h", "hall of fame"), ("", ""), ("r", "return"), ("q", "quit")],
+            [("j", "next project"), ("k", "previous project"), ("x", "hide/show"), ("", "")],
+            [("l", "list tasks"), ("e", "set priority"), ("a", "add project"), ("m", "move project")],
+            [("h", "hall of fame"), ("c", "collapse/expand"), ("r", "return"), ("q", "quit")],
         ])
 
 
@@ -825,8 +1105,8 @@ class HallOfFameTab(ListTab):
                 self.draw_cursor(0, 0)
 
             # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             if self.process_navigation_commands(c, navigation):
                 return self.call_stack
@@ -859,11 +1139,12 @@ class ModifyTab(ListTab):
             navigation = {}
             if self.redraw:
                 self.draw_all()
+                self.print_help("b: wait for another task")
                 self.redraw = False
 
             # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             # process the command
             if c == 'n':
@@ -944,6 +1225,21 @@ class ModifyTab(ListTab):
                     core.modify_task(self.db, self.db_cursor, id_=id_, repeat=repeat)
                     self.tasks[i]["repeat"] = repeat
                 self.redraw = True
+            elif c == 'b':
+                self.print_message("Enter the ID of the task to wait for (-ID to stop waiting):")
+                blocker, status = self.get_input()
+                if status == "cancel" or not re.match(r"-?\d+$", blocker):
+                    continue
+                try:
+                    for id_ in ids:
+                        if blocker.startswith("-"):
+                            core.unlink_tasks(self.db, self.db_cursor, id_, blocker[1:])
+                        else:
+                            core.link_tasks(self.db, self.db_cursor, id_, blocker)
+                except ValueError as e:
+                    self.print_message(str(e))
+                    continue
+                self.redraw = True
             elif c == 'm':
                 for i, id_ in enumerate(ids):
                     if self.tasks[i]["name"].startswith("* "):
@@ -963,6 +1259,7 @@ class ModifyTab(ListTab):
                                               inittext=self.tasks[0]["note"])
                 text = editor()
                 self.stdscr.clear()
+                self.stdscr.noutrefresh()
                 core.add_note_to_task(self.db, self.db_cursor, self.tasks[0]["id"], text)
                 self.redraw = True
 
@@ -1015,13 +1312,14 @@ class TaskListInProjectTab(ListTab):
             if self.redraw:
                 self.tasks = core.list_tasks(self.db_cursor, project=self.project_id, exclude_overdue_tasks=False,
                                              exclude_closed_tasks=closed)
+                self.selected_tasks.clear()
 
                 self.draw_all()
                 self.draw_cursor(self.current, 0)
                 self.redraw = False
 
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             # process the command
             if c == "j":
@@ -1039,42 +1337,33 @@ class TaskListInProjectTab(ListTab):
                     core.modify_task(self.db, self.db_cursor, self.tasks[self.current]["id"], due_date="today")
                 self.redraw = True
             elif c == 'p':
-                if self.current == 0:
-                    task = self.tasks[self.current]
-                    new_priority = task["order_in_project"] - self.priority_step \
-                        if task["order_in_project"] != 0 else 0
-                    core.modify_task(self.db, self.db_cursor, task["id"], order_in_project=new_priority)
-                    self.redraw = True
-                else:
-                    this_task = self.tasks[self.current]
-                    higher_task = self.tasks[self.current - 1]
-                    new_priority_this = higher_task["order_in_project"]
-                    new_priority_higher = this_task["order_in_project"]
-                    if new_priority_this == new_priority_higher:
-                        new_priority_this -= 1
-                    core.modify_task(self.db, self.db_cursor, this_task["id"], order_in_project=new_priority_this)
-                    core.modify_task(self.db, self.db_cursor, higher_task["id"],
-                                     order_in_project=new_priority_higher)
+                if self.current > 0:
+                    after = self.tasks[self.current - 2]["id"] if self.current > 1 else None
+                    core.move_tasks(self.db, self.db_cursor, [self.tasks[self.current]["id"]], after, self.project_id)
                     self.current -= 1
                     self.redraw = True
             elif c == 'P':
-                self.redraw = True
-                if self.current == len(self.tasks) - 1:
-                    task = self.tasks[self.current]
-                    new_priority = task["order_in_project"] + self.priority_step
-                    core.modify_task(self.db, self.db_cursor, task["id"], order_in_project=new_priority)
+                if self.current < len(self.tasks) - 1:
+                    core.move_tasks(self.db, self.db_cursor, [self.tasks[self.current]["id"]],
+                                    self.tasks[self.current + 1]["id"])
+                    self.current += 1
                     self.redraw = True
+            elif c == 'v':
+                if self.current not in self.selected_tasks:
+                    self.selected_tasks.add(self.current)
+                    self.draw_selection(self.current)
                 else:
-                    this_task = self.tasks[self.current]
-                    higher_task = self.tasks[self.current + 1]
-                    new_priority_this = higher_task["order_in_project"]
-                    new_priority_higher = this_task["order_in_project"]
-                    if new_priority_this == new_priority_higher:
-                        new_priority_this += 1
-                    core.modify_task(self.db, self.db_cursor, this_task["id"], order_in_project=new_priority_this)
-                    core.modify_task(self.db, self.db_cursor, higher_task["id"],
-                                     order_in_project=new_priority_higher)
-                    self.current += 1
+                    self.selected_tasks.discard(self.current)
+                    self.draw_selection(self.current, True)
+            elif c == 'M':
+                if not self.selected_tasks:
+                    self.print_message("Select the tasks to move with v")
+                elif self.current in self.selected_tasks:
+                    self.print_message("Move the cursor to the task to put the selected ones after")
+                else:
+                    ids = [self.tasks[i]["id"] for i in sorted(self.selected_tasks)]
+                    core.move_tasks(self.db, self.db_cursor, ids, self.tasks[self.current]["id"])
+                    self.current -= sum(1 for i in self.selected_tasks if i < self.current)
                     self.redraw = True
 
             elif c == 'g':
@@ -1096,14 +1385,14 @@ class TaskListInProjectTab(ListTab):
     def draw_main(self):
         self.draw_list(
             self.tasks,
-            "|ST|PR |WGHT|Time |Date      ",
-            "|{0:<2}|{1:<3}|{2:<1.2f}|{3!s:5}|{4}",
-            ("status", "order_in_project", "weight", "due_time", "due_date"),
+            "|ST|WGHT|Time |Date      ",
+            "|{0:<2}|{1:<1.2f}|{2!s:5}|{3}",
+            ("status", "weight", "due_time", "due_date"),
         )
 
     def draw_commands(self):
         self.draw_generic_commands([
-            [("j", "next"), ("k", "previous"), ("p", "higer prj. prio."), ("P", "lower prj. prio.")],
+            [("j", "next, k: previous"), ("p", "move up, P: down"), ("M", "move selected here"), ("v", "select")],
             [("d", "today/no date"), ("c", "toggle status"), ("a", "add task"), ("m", "modify task")],
             [("s", "quick add"), ("l", "toggle closed"), ("r", "return"), ("q", "quit")],
         ])
@@ -1130,8 +1419,8 @@ class ReportTab(ListTab):
                 self.redraw = False
 
             # wait for commands
-            c = self.stdscr.getkey()
-            self.windows.message.clear()
+            c = self.get_key()
+            self.clear_messages()
 
             if c == "j":
                 previous = self.current
@@ -1164,6 +1453,150 @@ class ReportTab(ListTab):
         ])
 
 
+class ProfileTab(ListTab):
+    statements = []
+    current = 0
+
+    def open(self):
+        navigation = {}
+        profiler = getattr(self.db, "profiler", None)
+        self.redraw = True
+
+        while True:
+            if self.redraw:
+                self.statements = []
+                if profiler:
+                    for s in profiler.get_summary()[:30]:
+                        s["name"] = "{} | {}".format(s["caller"], s["sql"])[:self.windows.columns - 32]
+                        self.statements.append(s)
+
+                self.draw_all()
+                if not profiler:
+                    self.print_message("Profiling is disabled. Start with --profile")
+                self.current = 0
+                self.draw_cursor(0, 0)
+                self.redraw = False
+
+            # wait for commands
+            c = self.get_key()
+            self.clear_messages()
+
+            if c == "j" and self.statements:
+                previous = self.current
+                self.current = (self.current + 1) % len(self.statements)
+                self.draw_cursor(self.current, previous)
+            elif c == "k" and self.statements:
+                previous = self.current
+                self.current = (self.current - 1) % len(self.statements)
+                self.draw_cursor(self.current, previous)
+            elif c == "u":
+                self.redraw = True
+            elif c == "x" and profiler:
+                profiler.records.clear()
+                self.redraw = True
+
+            if self.process_navigation_commands(c, navigation):
+                return self.call_stack
+
+    def draw_main(self):
+        self.draw_list(
+            self.statements,
+            "|Calls|Total ms|Max ms ",
+            "|{:<5}|{:<8.2f}|{:<7.2f}",
+            ("count", "total_ms", "max_ms"),
+        )
+
+    def draw_commands(self):
+        self.draw_generic_commands([
+            [("j", "next"), ("k", "previous"), ("", ""), ("", "")],
+            [("u", "update"), ("x", "reset profile"), ("", ""), ("", "")],
+            [("", ""), ("", ""), ("r", "return"), ("q", "quit")],
+        ])
+
+
+class JournalTab(Tab):
+    page_days = 30  # the journal is read this many days at a time, newest first
+
+    def open(self):
+        navigation = {
+            "n": (AddNoteTab, lambda: []),
+        }
+        self.lines = []
+        self.top = 0
+        self.first_loaded = None  # the earliest day read so far
+        self.first_day = notes.get_first_day(self.db_cursor)
+        self.scroll(0)
+
+        while True:
+            if self.redraw:
+                self.draw_all()
+                self.redraw = False
+
+            # wait for commands
+            c = self.get_key()
+            self.clear_messages()
+
+            if c == "j":
+                self.scroll(1)
+            elif c == "k":
+                self.scroll(-1)
+            elif c == "J":
+                self.scroll(self.height())
+            elif c == "K":
+                self.scroll(-self.height())
+            elif c == "g":
+                self.scroll(-self.top)
+
+            if self.process_navigation_commands(c, navigation):
+                return self.call_stack
+
+    def height(self) -> int:
+        return max(1, min(self.windows.main.getmaxyx()[0], self.windows.lines - 10))
+
+    def exhausted(self) -> bool:
+        return self.first_day is None or (self.first_loaded is not None and self.first_loaded <= self.first_day)
+
+    def load_older(self):
+        # the first page includes the notes added for the days ahead
+        if self.first_loaded is None:
+            end = datetime.datetime.now(datetime.timezone.utc).date()
+        else:
+            end = datetime.date.fromisoformat(self.first_loaded) - datetime.timedelta(days=1)
+        start = (end - datetime.timedelta(days=self.page_days - 1)).isoformat()
+        days = notes.get_journal(self.db_cursor, start, end.isoformat() if self.first_loaded else None, reverse=True)
+        self.first_loaded = start
+
+        for day in days:
+            self.lines.append((day["date"] + " " + datetime.date.fromisoformat(day["date"]).strftime("%A"),
+                               curses.A_BOLD))
+            for note in day["notes"]:
+                self.lines += [("  " + line, curses.A_NORMAL) for line in note["text"].splitlines()]
+            self.lines += [("  [x] " + task["name"], curses.A_NORMAL) for task in day["closed"]]
+            self.lines.append(("", curses.A_NORMAL))
+
+    def scroll(self, delta: int):
+        self.top = max(0, self.top + delta)
+        while len(self.lines) < self.top + self.height() and not self.exhausted():
+            self.load_older()
+        self.top = min(self.top, max(0, len(self.lines) - self.height()))
+        self.redraw = True
+
+    def draw_main(self):
+        self.windows.main.erase()
+        if not self.lines:
+            self.windows.main.addstr(1, 2, "No notes or closed tasks yet")
+        for i, (text, attr) in enumerate(self.lines[self.top:self.top + self.height()]):
+            self.windows.main.addstr(i, 1, text[:self.windows.columns - 3], attr)
+        self.windows.main.noutrefresh()
+
+    def draw_commands(self):
+        self.draw_generic_commands([
+            [("j", "scroll down"), ("k", "scroll up"), ("J", "page down"), ("K", "page up")],
+            [("n", "add note"), ("g", "latest day"), ("", ""), ("", "")],
+            [("", ""), ("", ""), ("r", "return"), ("q", "quit")],
+        ])
+
+
 class AddNoteTab(DialogTab):
     def open(self):
         self.draw_all()
@@ -1184,7 +1617,7 @@ class AddNoteTab(DialogTab):
                 self.print_message("Wrong format. Aborted.")
                 return
             params[i][0] = p[3](text) if text else p[0]
-            self.windows.message.clear()
+            self.clear_messages()
 
         core.add_note(self.db, self.db_cursor, params[1][0], params[0][0])
 
@@ -1224,7 +1657,7 @@ class AddTaskTab(DialogTab):
                 self.call_stack.pop()
                 return self.call_stack
             params[i][2] = p[4](text)
-            self.windows.message.clear()
+            self.clear_messages()
 
         core.add_task(self.db, self.db_cursor, params[0][2], params[3][2], params[5][2], params[4][2], params[1][2],
                       params[6][2], params[2][2], params[7][2])
@@ -1250,7 +1683,7 @@ class AddTaskQuickTab(DialogTab):
             self.call_stack.pop()
             return self.call_stack
         text = str(text)
-        self.windows.message.clear()
+        self.clear_messages()
 
         core.add_task(self.db, self.db_cursor, text, 0, "", date, 0, project=project)
 
@@ -1258,7 +1691,23 @@ class AddTaskQuickTab(DialogTab):
         return self.call_stack
 
 
-def main(stdscr):
+def get_arguments():
+    parser = ArgumentParser(description='Interactive shell of Aide')
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Profile the SQL queries; the profile is shown in a hidden tab (P) and printed at exit'
+    )
+    parser.add_argument(
+        '--db',
+        type=str,
+        metavar='NAME',
+        help='Use the DB of the named profile from the config'
+    )
+    return parser.parse_args()
+
+
+def main(stdscr, args):
     # clear screen
     stdscr.clear()
     try:
@@ -1267,13 +1716,18 @@ def main(stdscr):
         pass
 
     # connect to the DB
-    config = core.read_configuration()
-    database_file = config['db_path']
-    db = sqlite3.connect(database_file)
+    config = core.read_configuration(args.db)
+    if config.get("server"):
+        db = client.connect(config["server"])
+        client.install(globals(), db)
+    else:
+        db = core.connect(config, args.profile)
     cursor = db.cursor()
 
     # prepare windows
-    windows = Windows(stdscr)
+    windows = Windows(stdscr, config.get('max_fps', 0))
+    HomeTab.scheduler = DueScheduler(config.get('due_bell', False))
+    RescheduleTab.capacity = schedule.get_capacity(config)
     windows.draw()
 
     call_stack = CallStack()
@@ -1286,4 +1740,4 @@ def main(stdscr):
 
 
 if __name__ == '__main__':
-    curses.wrapper(main)
+    curses.wrapper(main, get_arguments())
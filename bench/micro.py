@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the public functions of core, project_mod and rpg_mod
+
+Every benchmark runs on a copy of a synthetic DB (see seed.py). Results are stored as JSON and two result
+files (or two git revisions) can be compared.
+"""
+import datetime
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import seed
+from report import summarize, git_revision, compare
+
+# modules under test; imported in main() from the tree given by --repo
+core = None
+project_mod = None
+rpg_mod = None
+
+
+def largest_project(cursor: sqlite3.Cursor):
+    cursor.execute("SELECT project FROM tasks GROUP BY project ORDER BY count(*) DESC LIMIT 1")
+    return cursor.fetchone()[0]
+
+
+def open_tasks(cursor: sqlite3.Cursor, condition: str = "1"):
+    cursor.execute("SELECT id FROM tasks WHERE status=1 AND " + condition + " ORDER BY id")
+    return [r[0] for r in cursor.fetchall()]
+
+
+# Each benchmark gets (db, cursor) and returns a function of the iteration number together with the maximal
+# number of iterations (None if unlimited). Benchmarks that modify the DB get a fresh copy afterwards.
+def bench_list_tasks(**kwargs):
+    def setup(db, cursor):
+        return lambda i: core.list_tasks(cursor, **kwargs), None
+    return setup
+
+
+def bench_list_tasks_in_project(db, cursor):
+    project = largest_project(cursor)
+    return lambda i: core.list_tasks(cursor, project=project, exclude_closed_tasks=False), None
+
+
+def bench_modify_task(db, cursor):
+    ids = open_tasks(cursor)
+    return lambda i: core.modify_task(db, cursor, ids[i % len(ids)], priority=i % 100), None
+
+
+def reorder_project(db, cursor, tasks: int = 5000):
+    # a project of its own, so that the reordered project has the same size in every DB
+    cursor.execute("INSERT INTO projects(name) VALUES ('reordered')")
+    project = cursor.lastrowid
+    cursor.executemany("INSERT INTO tasks(name, project, order_in_project) VALUES ('task', ?, ?)",
+                       ((project, i) for i in range(tasks)))
+    db.commit()
+    return open_tasks(cursor, "project = %d" % project)
+
+
+def bench_move_task(db, cursor):
+    ids = reorder_project(db, cursor)
+    return lambda i: core.move_tasks(db, cursor, [ids[i * 7 % len(ids)]], ids[(i * 13 + 1) % len(ids)]), None
+
+
+def bench_move_tasks_bulk(db, cursor):
+    ids = reorder_project(db, cursor)
+    return lambda i: core.move_tasks(db, cursor, ids[i * 20 % 4000:i * 20 % 4000 + 20], ids[-1 - i]), None
+
+
+def bench_close_task_repeat(db, cursor):
+    ids = open_tasks(cursor, "repeat_period IS NOT NULL AND quest IS NULL")
+    return lambda i: core.close_task(db, cursor, ids[i]), len(ids)
+
+
+def bench_close_task_quest(db, cursor):
+    ids = open_tasks(cursor, "quest IS NOT NULL")
+    return lambda i: core.close_task(db, cursor, ids[i]), len(ids)
+
+
+def bench_productivity_data(interval=None):
+    def setup(db, cursor):
+        return lambda i: core.productivity_data(cursor, None, interval), None
+    return setup
+
+
+def bench_get_total_weight(**kwargs):
+    def setup(db, cursor):
+        return lambda i: core.get_total_weight(cursor, **kwargs), None
+    return setup
+
+
+def bench_list_projects(**kwargs):
+    def setup(db, cursor):
+        return lambda i: project_mod.list_projects(cursor, **kwargs), None
+    return setup
+
+
+def bench_get_project_progress(db, cursor):
+    project = largest_project(cursor)
+    return lambda i: project_mod.get_project_progress(cursor, project), None
+
+
+def bench_close_quest(db, cursor):
+    quests = [q["id"] for q in rpg_mod.get_quests(cursor)]
+    return lambda i: rpg_mod.close_quest(db, cursor, quests[i % len(quests)]), None
+
+
+# name -> (setup, modifies the DB)
+BENCHMARKS = {
+    "core.list_tasks/top": (bench_list_tasks(only_top_result=True, due_date="today"), False),
+    "core.list_tasks/today": (bench_list_tasks(due_date="today"), False),
+    "core.list_tasks/today_no_overdue": (bench_list_tasks(due_date="today", exclude_overdue_tasks=True), False),
+    "core.list_tasks/with_closed": (bench_list_tasks(due_date="today", exclude_closed_tasks=False), False),
+    "core.list_tasks/undated": (bench_list_tasks(due_date="no"), False),
+    "core.list_tasks/all_open": (bench_list_tasks(), False),
+    "core.list_tasks/regular": (bench_list_tasks(project=19), False),
+    "core.list_tasks/project": (bench_list_tasks_in_project, False),
+    "core.modify_task": (bench_modify_task, True),
+    "core.move_tasks/5000": (bench_move_task, True),
+    "core.move_tasks/5000_bulk": (bench_move_tasks_bulk, True),
+    "core.close_task/repeat": (bench_close_task_repeat, True),
+    "core.close_task/quest": (bench_close_task_quest, True),
+    "core.productivity_data/daily": (bench_productivity_data(), False),
+    "core.productivity_data/weekly": (bench_productivity_data("W"), False),
+    "core.get_total_weight/today": (bench_get_total_weight(), False),
+    "core.get_total_weight/closed": (bench_get_total_weight(closed=True), False),
+    "core.get_total_weight/week": (bench_get_total_weight(week_total=True), False),
+    "project_mod.list_projects/all": (bench_list_projects(), False),
+    "project_mod.list_projects/open": (bench_list_projects(open_projects=True), False),
+    "project_mod.list_projects/closed": (bench_list_projects(open_projects=False), False),
+    "project_mod.get_project_progress": (bench_get_project_progress, False),
+    "rpg_mod.close_quest": (bench_close_quest, True),
+}
+
+
+def run_benchmark(db_path: str, setup, repeat: int):
+    db = sqlite3.connect(db_path)
+    cursor = db.cursor()
+    try:
+        function, limit = setup(db, cursor)
+        if limit is not None:
+            repeat = min(repeat, limit)
+
+        function(0)  # warm up the page cache
+        samples = []
+        for i in range(1, repeat):
+            start = time.perf_counter()
+            function(i)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        db.close()
+    return summarize(samples) if samples else None
+
+
+def run(sizes: list, names: list, repeat: int, db_dir: str):
+    os.makedirs(db_dir, exist_ok=True)
+    results = {}
+    for size in sizes:
+        template = os.path.join(db_dir, "tasks-%d.db" % size)
+        if not os.path.exists(template):
+            print("Seeding %d tasks..." % size, file=sys.stderr)
+            seed.create_database(template, size)
+
+        work_copy = os.path.join(db_dir, "micro-%d.db" % size)
+        shutil.copyfile(template, work_copy)
+        results[str(size)] = {}
+        for name in names:
+            setup, modifies = BENCHMARKS[name]
+            try:
+                stats = run_benchmark(work_copy, setup, repeat)
+            except (AttributeError, TypeError, sqlite3.Error) as e:
+                # e.g. a function that does not exist in an older revision
+                print("{:>8} tasks | {:<40} | failed: {}".format(size, name, e), file=sys.stderr)
+                continue
+            finally:
+                if modifies:
+                    shutil.copyfile(template, work_copy)
+            if not stats:
+                continue
+
+            results[str(size)][name] = stats
+            print("{:>8} tasks | {:<40} | p50 {:>9.3f} ms | p99 {:>9.3f} ms".format(
+                size, name, stats["p50_ms"], stats["p99_ms"]), file=sys.stderr)
+        os.remove(work_copy)
+    return results
+
+
+def run_revision(revision: str, argv: list):
+    """
+    Run this script against the code of another revision and return the parsed results
+    """
+    with tempfile.TemporaryDirectory() as tree:
+        archive = subprocess.Popen(["git", "archive", revision], cwd=seed.ROOT, stdout=subprocess.PIPE)
+        subprocess.check_call(["tar", "-x", "-C", tree], stdin=archive.stdout)
+        archive.wait()
+
+        output = os.path.join(tree, "result.json")
+        subprocess.check_call([sys.executable, os.path.abspath(__file__), "--repo", tree, "-o", output] + argv)
+        with open(output) as f:
+            report = json.load(f)
+    report["revision"] = revision
+    return report
+
+
+def main():
+    global core, project_mod, rpg_mod
+
+    parser = ArgumentParser(description='Micro-benchmarks of the Aide modules')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[1000, 100000],
+                        help="Number of tasks in the seeded DBs")
+    parser.add_argument('-b', '--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS),
+                        metavar='NAME', help="Benchmarks to run. Default: all")
+    parser.add_argument('-r', '--repeat', type=int, default=50, help="Iterations of every benchmark")
+    parser.add_argument('--db-dir', type=str, default=os.path.join(tempfile.gettempdir(), "aide-bench"),
+                        help="Where to keep the seeded DBs. Existing DBs are reused")
+    parser.add_argument('--repo', type=str, default=seed.ROOT, help="Tree with the modules under test")
+    parser.add_argument('-o', '--output', type=str, help="Store the results as JSON")
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two stored results instead of running")
+    parser.add_argument('--revisions', type=str, nargs=2, metavar=('OLD', 'NEW'),
+                        help="Run the benchmarks on two git revisions and compare them")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.revisions:
+        argv = ["--sizes"] + [str(s) for s in args.sizes] + ["--repeat", str(args.repeat), "--db-dir", args.db_dir,
+                                                             "--benchmarks"] + args.benchmarks
+        paths = []
+        for revision in args.revisions:
+            report = run_revision(revision, argv)
+            path = os.path.join(args.db_dir, "micro-%s.json" % revision.replace("/", "_"))
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            paths.append(path)
+        compare(*paths)
+        return
+
+    sys.path.insert(0, os.path.abspath(args.repo))
+    core = importlib.import_module("core")
+    project_mod = importlib.import_module("project_mod")
+    rpg_mod = importlib.import_module("rpg_mod")
+
+    report = {
+        "revision": git_revision(args.repo),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeat": args.repeat,
+        "results": run(args.sizes, args.benchmarks, args.repeat, args.db_dir),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Statistics and result files shared by the benchmarks
+"""
+import json
+import subprocess
+
+from seed import ROOT
+
+
+def percentile(values: list, p: float):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def summarize(samples: list):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def git_revision(path: str = ROOT):
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=path,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results: dict, prefix: tuple = ()):
+    """
+    Yield (path, stats) for every leaf of a nested result dictionary
+    """
+    for key, value in results.items():
+        if "p50_ms" in value:
+            yield prefix + (key,), value
+        else:
+            yield from flatten(value, prefix + (key,))
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    old_results = dict(flatten(old["results"]))
+    print("{} -> {}".format(old["revision"], new["revision"]))
+    print("{:<45} | {:>9} | {:>9} | {:>7}".format("benchmark", "old p50", "new p50", "ratio"))
+    for path, stats in flatten(new["results"]):
+        old_stats = old_results.get(path)
+        if not old_stats:
+            continue
+        ratio = stats["p50_ms"] / old_stats["p50_ms"] if old_stats["p50_ms"] else float("inf")
+        print("{:<45} | {:>9.3f} | {:>9.3f} | {:>7.2f}".format(
+            "/".join(path), old_stats["p50_ms"], stats["p50_ms"], ratio))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Synthetic Aide databases for benchmarking
+"""
+import datetime
+import os
+import random
+import sqlite3
+import sys
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import schema  # noqa: E402
+
+WORDS = ["write", "review", "call", "plan", "fix", "read", "clean", "prepare", "send", "update", "report",
+         "paper", "email", "budget", "meeting", "slides", "garden", "kitchen", "taxes", "bike", "draft"]
+
+
+def create_schema(db: sqlite3.Connection):
+    with open(os.path.join(ROOT, "db.sql")) as f:
+        db.executescript(f.read())
+    with open(os.path.join(ROOT, "triggers.sql")) as f:
+        db.executescript(f.read())
+    schema.upgrade(db)
+
+
+def random_name(rng: random.Random, words: int = 3):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(db: sqlite3.Connection, tasks: int, seed_: int = 0):
+    """
+    Fill an empty DB with `tasks` tasks spread over projects, quests and notes.
+
+    Most of the tasks are closed history; the open ones are due today, overdue, in the future or undated.
+    A fifth of the tasks are recurring series with a long history of closed instances.
+    """
+    rng = random.Random(seed_)
+    cursor = db.cursor()
+    today = datetime.date.today()
+
+    n_projects = max(20, tasks // 200)
+    n_skills = 5
+    n_quests = 50
+
+    cursor.executemany("INSERT INTO projects(name, priority, open) VALUES (?, ?, ?)",
+                       ((random_name(rng, 2), rng.choice([0, 10, 50, 60, 100]), int(rng.random() < 0.8))
+                        for _ in range(n_projects - 1)))
+    cursor.execute("UPDATE projects SET name = 'regular', hidden = 1 WHERE id = 19")
+    cursor.executemany("INSERT INTO skills(name, value, xp) VALUES (?, ?, ?)",
+                       ((random_name(rng, 1), rng.randint(0, 10), rng.randint(0, 49)) for _ in range(n_skills)))
+    cursor.executemany("INSERT INTO quests(name, xp, willingness, trained_skill, time) VALUES (?, ?, ?, ?, ?)",
+                       ((random_name(rng), rng.randint(5, 50), rng.randint(0, 10), rng.randint(1, n_skills),
+                         rng.randint(1, 4)) for _ in range(n_quests)))
+    cursor.executemany("INSERT INTO awards(name, price) VALUES (?, ?)",
+                       ((random_name(rng, 2), rng.randint(10, 500)) for _ in range(20)))
+    cursor.execute("UPDATE character SET level = 12, gold = 340, xp = 1500, xp_for_next_level = 1620 WHERE id = 1")
+
+    def task_rows():
+        for _ in range(tasks - recurring):
+            kind = rng.random()
+            status = 1
+            due_time = None
+            if kind < 0.85:
+                # closed history over the last three years
+                status = 0
+                due_date = today - datetime.timedelta(days=rng.randint(0, 3 * 365))
+            elif kind < 0.90:
+                due_date = today
+                if rng.random() < 0.3:
+                    due_time = "%02d:%02d" % (rng.randint(0, 23), rng.choice([0, 15, 30, 45]))
+            elif kind < 0.93:
+                due_date = today - datetime.timedelta(days=rng.randint(1, 30))
+            elif kind < 0.96:
+                due_date = today + datetime.timedelta(days=rng.randint(1, 60))
+            else:
+                due_date = None
+            quest = rng.randint(1, n_quests) if rng.random() < 0.1 else None
+            yield (random_name(rng), rng.choice([0, 0, 10, 20, 50, 100]), due_time, status,
+                   rng.choice([0, 0.5, 1, 2, 3]), due_date.isoformat() if due_date else None, None,
+                   rng.randint(1, n_projects), quest, rng.randint(0, 100))
+
+    def recurring_rows():
+        # long close histories of repeated tasks, as left behind by the repeat triggers
+        per_series = recurring // n_series
+        for _ in range(n_series):
+            name = random_name(rng)
+            period = rng.choice([1, 1, 2, 7])
+            repeat = "workdays" if period == 2 else "%d days" % period
+            project = rng.choice([19, rng.randint(1, n_projects)])
+            quest = rng.randint(1, n_quests) if rng.random() < 0.3 else None
+            priority = rng.choice([10, 50, 100])
+            weight = rng.choice([0.5, 1])
+            due_time = "%02d:00" % rng.randint(6, 21) if rng.random() < 0.3 else None
+            for k in range(per_series, 0, -1):
+                status = 0 if k > 1 else 1
+                due_date = today - datetime.timedelta(days=(k - 1) * period)
+                yield (name, priority, due_time, status, weight, due_date.isoformat(), repeat,
+                       project, quest, 0)
+
+    recurring = tasks // 5
+    n_series = max(1, min(recurring, tasks // 500))
+    recurring -= recurring % n_series
+    query = "INSERT INTO tasks(name, priority, due_time, status, weight, due_date, repeat_period, " \
+            "project, quest, order_in_project) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    cursor.executemany(query, task_rows())
+    cursor.executemany(query, recurring_rows())
+
+    # the close events of the closed tasks, during their due day, as written by the history triggers; the tasks are
+    # inserted after the migrations, so migrations/017_closed_events.sql does not add them
+    cursor.execute("INSERT INTO task_events(task, time, event) "
+                   "SELECT id, CAST(strftime('%s', due_date, '+8 hours') AS INTEGER) + id * 7919 % 43200, 8 "
+                   "FROM tasks WHERE status = 0 ORDER BY due_date")
+    cursor.executemany("INSERT INTO notes(date, text) VALUES (?, ?)",
+                       (((today - datetime.timedelta(days=rng.randint(0, 3 * 365))).isoformat(),
+                         random_name(rng, 8)) for _ in range(max(1, tasks // 20))))
+    db.commit()
+
+
+def create_database(path: str, tasks: int, seed_: int = 0):
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    create_schema(db)
+    seed(db, tasks, seed_)
+    db.close()
+    return path
+
+
+def main():
+    parser = ArgumentParser(description='Create a synthetic Aide database')
+    parser.add_argument('path', type=str, help="Where to write the DB")
+    parser.add_argument('-n', '--tasks', type=int, default=1000, help="Number of tasks")
+    parser.add_argument('-s', '--seed', type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    create_database(args.path, args.tasks, args.seed)
+
+
+if __name__ == '__main__':
+    main()
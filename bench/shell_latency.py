@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Keystroke latency of aide-shell
+
+Seeds synthetic DBs, runs aide-shell.py in a pseudo-terminal, replays scripted key sequences and measures
+the time from a keypress until the screen settles (no more output for `--settle` ms).
+"""
+import datetime
+import fcntl
+import json
+import os
+import pty
+import select
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+import termios
+import time
+from argparse import ArgumentParser
+
+import seed
+from report import summarize, git_revision, compare
+
+ROOT = seed.ROOT
+SHELL = os.path.join(ROOT, "aide-shell.py")
+
+ENTER = "\n"
+FINISH = "\x06"  # ^f: leave the rest of the fields on defaults
+
+# scenario name -> list of (label, keys); only labelled keys are measured
+SCENARIOS = {
+    "navigate": [(None, "l")] + [("j", "j")] * 20 + [("k", "k")] * 20 + [(None, "r")],
+    "toggle": [(None, "l")] + [("c", "c")] * 10 + [(None, "r")],
+    "modify": [("open list", "l")] + [("open modify", "m"), ("return", "r")] * 10 + [(None, "r")],
+    "add": [("open add", "a")] + [(None, c) for c in "benchmark task"] + [(None, ENTER), ("add", FINISH)],
+}
+
+
+class Terminal:
+    def __init__(self, home: str, lines: int = 50, columns: int = 140):
+        self.pid, self.fd = pty.fork()
+        if self.pid == 0:
+            env = dict(os.environ, HOME=home, TERM="xterm-256color", LINES=str(lines), COLUMNS=str(columns))
+            os.execvpe(sys.executable, [sys.executable, SHELL], env)
+        fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack("HHHH", lines, columns, 0, 0))
+
+    def settle(self, settle: float, timeout: float = 30.0):
+        """
+        Read until the output is quiet for `settle` seconds; return the time of the last received byte
+        """
+        last_output = None
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            ready, _, _ = select.select([self.fd], [], [], settle)
+            if not ready:
+                if last_output is not None:
+                    break
+                continue
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError:
+                break
+            if not data:
+                break
+            last_output = time.perf_counter()
+        return last_output
+
+    def press(self, keys: str, settle: float):
+        start = time.perf_counter()
+        os.write(self.fd, keys.encode())
+        end = self.settle(settle)
+        return (end - start) * 1000 if end else None
+
+    def close(self):
+        try:
+            os.write(self.fd, b"q")
+            self.settle(0.2, timeout=5)
+            os.waitpid(self.pid, 0)
+        except OSError:
+            os.kill(self.pid, signal.SIGKILL)
+        os.close(self.fd)
+
+
+def run_scenario(db_path: str, scenario: list, repeat: int, settle: float):
+    samples = {}
+    with tempfile.TemporaryDirectory() as home:
+        with open(os.path.join(home, ".aide.conf"), "w") as f:
+            json.dump({"db_path": db_path}, f)
+
+        terminal = Terminal(home)
+        try:
+            terminal.settle(settle)  # initial screen
+            for _ in range(repeat):
+                for label, keys in scenario:
+                    latency = terminal.press(keys, settle)
+                    if label and latency is not None:
+                        samples.setdefault(label, []).append(latency)
+        finally:
+            terminal.close()
+
+    result = {label: summarize(values) for label, values in samples.items()}
+    all_samples = [v for values in samples.values() for v in values]
+    if all_samples:
+        result["all"] = summarize(all_samples)
+    return result
+
+
+def main():
+    parser = ArgumentParser(description='Measure keystroke latency of aide-shell')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="Number of tasks in the seeded DBs")
+    parser.add_argument('-c', '--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS),
+                        help="Key sequences to replay")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="How many times to replay each scenario")
+    parser.add_argument('--settle', type=float, default=50, help="Quiet period (ms) that marks a settled screen")
+    parser.add_argument('--db-dir', type=str, default=os.path.join(tempfile.gettempdir(), "aide-bench"),
+                        help="Where to keep the seeded DBs. Existing DBs are reused")
+    parser.add_argument('-o', '--output', type=str, help="Store the results as JSON")
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two stored results instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    results = {}
+    for size in args.sizes:
+        template = os.path.join(args.db_dir, "tasks-%d.db" % size)
+        if not os.path.exists(template):
+            print("Seeding %d tasks..." % size, file=sys.stderr)
+            seed.create_database(template, size)
+
+        results[str(size)] = {}
+        for name in args.scenarios:
+            # scenarios modify the DB, so each one starts from a fresh copy
+            db_path = os.path.join(args.db_dir, "run-%d.db" % size)
+            shutil.copyfile(template, db_path)
+
+            results[str(size)][name] = run_scenario(db_path, SCENARIOS[name], args.repeat, args.settle / 1000)
+            stats = results[str(size)][name].get("all")
+            if stats:
+                print("{:>8} tasks | {:<10} | p50 {:>8.2f} ms | p99 {:>8.2f} ms".format(
+                    size, name, stats["p50_ms"], stats["p99_ms"]))
+            os.remove(db_path)
+
+    report = {
+        "revision": git_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "settle_ms": args.settle,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
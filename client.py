@@ -0,0 +1,124 @@
+"""
+Client of the Aide server (see server.py).
+
+With "server": "http://127.0.0.1:8321" in ~/.aide.conf, aide-cli.py and aide-shell.py do not open the DB.
+connect() returns a stand-in for the connection, and install() replaces core, history, notes, project_mod, rpg_mod,
+schedule, status and views with proxies that send the calls of the exported functions to the server. The rest of the
+functions (validation, date helpers) run locally.
+"""
+import copy
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import core
+import history
+import notes
+import project_mod
+import rpg_mod
+import schedule
+import status
+import views
+from server import EXPORTED
+
+
+class RemoteError(Exception):
+    pass
+
+
+class Connection:
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.cached = {}  # url of a GET request -> (ETag, result)
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def call(self, name: str, args: list, kwargs: dict):
+        if EXPORTED[name][1]:
+            request = urllib.request.Request(self.url + "/call/" + name, method="POST",
+                                             data=json.dumps({"args": args, "kwargs": kwargs}).encode(),
+                                             headers={"Content-Type": "application/json"})
+            return self.send(request)
+
+        # reads are repeated by polling clients (e.g. the shell), so they are cached until the result changes
+        url = self.url + "/call/" + name + "?" + urllib.parse.urlencode({
+            "args": json.dumps(args), "kwargs": json.dumps(kwargs)})
+        request = urllib.request.Request(url)
+        if url in self.cached:
+            request.add_header("If-None-Match", self.cached[url][0])
+        return self.send(request, url)
+
+    def send(self, request, cache_url: str = None):
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                result = json.load(response)["result"]
+                if cache_url:
+                    self.cached[cache_url] = (response.headers["ETag"], result)
+                    return copy.deepcopy(result)
+                return result
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cache_url in self.cached:
+                return copy.deepcopy(self.cached[cache_url][1])
+            message = self.error_message(e)
+            # rejected arguments are reported like the local functions do, so the callers handle them the same way
+            if e.code == 400 and message.startswith("ValueError: "):
+                raise ValueError(message[len("ValueError: "):])
+            raise RemoteError(message)
+        except urllib.error.URLError as e:
+            raise RemoteError("Aide server at %s is not available: %s" % (self.url, e.reason))
+
+    @staticmethod
+    def error_message(error: urllib.error.HTTPError):
+        try:
+            return json.load(error)["error"]
+        except ValueError:
+            return "HTTP %d" % error.code
+
+
+class Cursor:
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def execute(self, *args):
+        raise RemoteError("Direct SQL is not available through the Aide server")
+
+
+class RemoteModule:
+    def __init__(self, module, connection: Connection):
+        self.module = module
+        self.connection = connection
+
+    def __getattr__(self, name):
+        qualified_name = self.module.__name__ + "." + name
+        if qualified_name not in EXPORTED:
+            return getattr(self.module, name)
+
+        def call(*args, **kwargs):
+            # the local signatures start with (db, cursor) or (cursor)
+            args = list(args)
+            while args and isinstance(args[0], (Connection, Cursor)):
+                args.pop(0)
+            return self.connection.call(qualified_name, args, kwargs)
+        return call
+
+
+def connect(url: str) -> Connection:
+    return Connection(url)
+
+
+def install(namespace: dict, connection: Connection):
+    """
+    Replace the modules imported into `namespace` (usually, globals() of the caller) with proxies
+    """
+    for module in (core, history, notes, project_mod, rpg_mod, schedule, status, views):
+        if namespace.get(module.__name__) is module:
+            namespace[module.__name__] = RemoteModule(module, connection)
@@ -10,11 +10,16 @@ import json
 import os
 import re
 import sqlite3
+import time
 import psutil
 
 import matplotlib.pyplot as plt
 import pandas
+import history
+import notify
+import profiler
 import rpg_mod
+import schema
 
 
 def add_task(db, cursor: sqlite3.Cursor, name, priority, time, date, weight, repeat=None, project=None, quest=None):
@@ -22,22 +27,26 @@ def add_task(db, cursor: sqlite3.Cursor, name, priority, time, date, weight, rep
         priority += 100
 
     if date:
-        date = relative_date_to_sql_query(date)
+        date, date_arguments = relative_date_to_sql_query(date)
     else:
-        date = "date('now')"
+        date, date_arguments = "date('now')", []
 
     if project is None:
         project = 1
 
-    cursor.execute("INSERT INTO tasks(name, priority, due_time, due_date, weight, repeat_period, project, quest) VALUES"
-                   " (?, ?, " + local_to_utc("?") + "," + date + ", ?, ?, ?, ?)",
-                   (name, priority, time, weight, repeat, project, quest))
+    # a new task goes on top of its project, a gap before the first task (see move_tasks)
+    cursor.execute("INSERT INTO tasks(name, priority, due_time, due_date, weight, repeat_period, project, quest, "
+                   "order_in_project) VALUES (?, ?, " + local_to_utc("?") + "," + date + ", ?, ?, ?, ?, "
+                   "(SELECT coalesce(min(order_in_project), ?) - ? FROM tasks WHERE project = ?))",
+                   [name, priority, time] + date_arguments + [weight, repeat, project, quest, ORDER_GAP, ORDER_GAP,
+                                                              project])
     db.commit()
+    notify.post("add", id=cursor.lastrowid, name=name)
 
 
 def list_tasks(cursor: sqlite3.Cursor, only_top_result: bool = False, exclude_closed_tasks: bool = True,
                exclude_overdue_tasks: bool = False, due_date: str = None, project: int = None,
-               exclude_regular: bool = True):
+               exclude_regular: bool = True, exclude_blocked: bool = True, subprojects: bool = False):
     query = "SELECT id, name, priority, " + utc_to_local("due_time") + ", status, weight, due_date, " \
                                                                        "project, order_in_project, note " \
                                                                        "FROM tasks WHERE "
@@ -46,30 +55,36 @@ def list_tasks(cursor: sqlite3.Cursor, only_top_result: bool = False, exclude_cl
 
     # parametrize the query
     if only_top_result:
-        query += "status=1 AND " \
-                 "((due_time IS NULL AND due_date <= current_date) OR " \
-                 "(due_time < current_time AND due_date = current_date) OR " \
-                 "(due_date < current_date)) " \
-                 " ORDER BY priority DESC, id DESC " \
-                 " LIMIT 1"
+        task = get_top_task(cursor)
+        return [task] if task else []
     else:
         if exclude_closed_tasks:
             where_clauses.append("status=1")
 
-        if project:
-            where_clauses.append("project=" + str(project))
+        if exclude_blocked:
+            # the tasks waiting for other tasks; closed ones are shown regardless
+            where_clauses.append("(blocked_count=0 OR status=0)")
+
+        if project and subprojects:
+            where_clauses.append("project IN (SELECT descendant FROM project_tree WHERE ancestor=?)")
+            query_arguments.append(project)
+        elif project:
+            where_clauses.append("project=?")
+            query_arguments.append(project)
 
         if due_date:
-            due_date = relative_date_to_sql_query(due_date)
+            due_date, date_arguments = relative_date_to_sql_query(due_date)
             if due_date == "null":
                 where_clauses.append("due_date is null")
             elif exclude_overdue_tasks:
                 where_clauses.append("due_date=" + due_date)
             else:
                 where_clauses.append("due_date<=" + due_date)
+            query_arguments += date_arguments
 
-        if exclude_regular and project != 19:
-            where_clauses.append("project!=19")
+        # the tasks of hidden projects are listed only with their project
+        if exclude_regular and not project:
+            where_clauses.append("hidden=0")
 
         query += " AND ".join(where_clauses)
         if project:
@@ -81,7 +96,11 @@ def list_tasks(cursor: sqlite3.Cursor, only_top_result: bool = False, exclude_cl
     # run the query and repack into a list of dictionaries
     cursor.execute(query, query_arguments)
     tasks = cursor.fetchall()
-    return [{
+    return [task_to_dict(t) for t in tasks]
+
+
+def task_to_dict(t: tuple):
+    return {
         "id": t[0],
         "name": t[1],
         "priority": t[2],
@@ -92,7 +111,55 @@ def list_tasks(cursor: sqlite3.Cursor, only_top_result: bool = False, exclude_cl
         "project": t[7],
         "order_in_project": t[8],
         "note": t[9]
-    } for t in tasks]
+    }
+
+
+# the top task is cached until the DB changes (in this process or any other) or the next task becomes actionable;
+# (key, valid until, task) is replaced as a whole, so that threads with their own connections may share it
+_top_task_cache = (None, 0.0, None)
+
+
+def get_top_task(cursor: sqlite3.Cursor):
+    """
+    The open task with the highest priority among the tasks that are already actionable, or None
+    """
+    global _top_task_cache
+    key = schema.connection_key(cursor)
+    cached_key, valid_until, cached_task = _top_task_cache
+    if cached_key == key and time.time() < valid_until:
+        return cached_task
+
+    # walk tasks_top_index in the priority order until the first actionable task that is not blocked
+    cursor.execute("SELECT id, name, priority, " + utc_to_local("due_time") + ", status, weight, due_date, "
+                   "project, order_in_project, note FROM tasks INDEXED BY tasks_top_index "
+                   "WHERE status=1 AND blocked_count=0 AND hidden=0 AND actionable_at < datetime('now') "
+                   "ORDER BY priority DESC, id DESC LIMIT 1")
+    task = cursor.fetchone()
+
+    # the next moment the top task may change without a write
+    cursor.execute("SELECT min(actionable_at) FROM tasks WHERE status=1 AND actionable_at >= datetime('now')")
+    next_boundary = cursor.fetchone()[0]
+
+    task = task_to_dict(task) if task else None
+    _top_task_cache = (key, utc_timestamp(next_boundary) if next_boundary else float("inf"), task)
+    return task
+
+
+def get_due_boundaries(cursor: sqlite3.Cursor, limit: int = 20):
+    """
+    UNIX timestamps of the next moments when open tasks become actionable, earliest first
+    """
+    cursor.execute("SELECT DISTINCT actionable_at FROM tasks WHERE status=1 AND actionable_at >= datetime('now') "
+                   "ORDER BY actionable_at LIMIT ?", (limit,))
+    return [utc_timestamp(r[0]) for r in cursor.fetchall()]
+
+
+def utc_timestamp(moment: str) -> float:
+    """
+    Convert an actionable_at value ('YYYY-MM-DD', 'YYYY-MM-DD HH:MM' or 'YYYY-MM-DD HH:MM:SS') into a UNIX timestamp
+    """
+    parsed = datetime.datetime.fromisoformat(moment)
+    return parsed.replace(tzinfo=datetime.timezone.utc).timestamp()
 
 
 def modify_task(db, cursor: sqlite3.Cursor, id_: str, name: str = "", priority: int = -1, time: str = "",
@@ -122,8 +189,9 @@ def modify_task(db, cursor: sqlite3.Cursor, id_: str, name: str = "", priority:
         query_arguments.append(repeat)
 
     if due_date:
-        due_date = relative_date_to_sql_query(due_date)
+        due_date, date_arguments = relative_date_to_sql_query(due_date)
         setters.append("due_date=" + due_date)
+        query_arguments += date_arguments
 
     if status == 0 or status == 1:
         setters.append("status=?")
@@ -142,6 +210,70 @@ def modify_task(db, cursor: sqlite3.Cursor, id_: str, name: str = "", priority:
 
     cursor.execute(query, query_arguments)
     db.commit()
+    notify.post("modify", id=id_)
+
+
+# the distance between neighbouring tasks after renumbering: this many tasks fit between them without renumbering
+ORDER_GAP = 1024
+
+
+def move_tasks(db, cursor: sqlite3.Cursor, ids: list, after: int = None, project: int = None):
+    """
+    Put the tasks `ids`, in this order, right after the task `after` in the order of its project, or at the top of
+    `project` (default: the project of the first task). Every moved task is updated once; the project is renumbered
+    only when there is no gap left at the position
+    """
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+    if after is not None and int(after) in ids:
+        raise ValueError("Task %s is one of the moved tasks" % after)
+    if after is not None or project is None:
+        reference = after if after is not None else ids[0]
+        cursor.execute("SELECT project FROM tasks WHERE id = ?", (reference,))
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError("No task %s" % reference)
+        project = row[0]
+
+    low, high = order_gap(cursor, ids, after, project)
+    if high - low <= len(ids):
+        renumber_project(cursor, project)
+        low, high = order_gap(cursor, ids, after, project)
+    cursor.executemany("UPDATE tasks SET project = ?, order_in_project = ? WHERE id = ?",
+                       [(project, low + (high - low) * (i + 1) // (len(ids) + 1), id_) for i, id_ in enumerate(ids)])
+    db.commit()
+    for id_ in ids:
+        notify.post("modify", id=id_)
+
+
+def order_gap(cursor: sqlite3.Cursor, ids: list, after, project: int):
+    # the order_in_project of the task `after` and of the next one, skipping the moved tasks; the tasks are ordered
+    # by order_in_project ASC, id DESC (see list_tasks)
+    excluded = " AND id NOT IN (" + ", ".join("?" * len(ids)) + ")"
+    if after is None:
+        cursor.execute("SELECT min(order_in_project) FROM tasks WHERE project = ?" + excluded, [project] + ids)
+        high = cursor.fetchone()[0]
+        if high is None:
+            return 0, ORDER_GAP * (len(ids) + 1)
+        return high - ORDER_GAP * (len(ids) + 1), high
+
+    cursor.execute("SELECT order_in_project FROM tasks WHERE id = ?", (after,))
+    low = cursor.fetchone()[0]
+    cursor.execute("SELECT min(order_in_project) FROM tasks WHERE project = ? AND "
+                   "(order_in_project > ? OR (order_in_project = ? AND id < ?))" + excluded,
+                   [project, low, low, after] + ids)
+    high = cursor.fetchone()[0]
+    return low, high if high is not None else low + ORDER_GAP * (len(ids) + 1)
+
+
+def renumber_project(cursor: sqlite3.Cursor, project: int):
+    """
+    Spread the tasks of the project ORDER_GAP apart, keeping their order
+    """
+    cursor.execute("UPDATE tasks SET order_in_project = r.position * ? FROM "
+                   "(SELECT id, row_number() OVER (ORDER BY order_in_project, id DESC) AS position FROM tasks "
+                   "WHERE project = ?) AS r WHERE tasks.id = r.id", (ORDER_GAP, project))
 
 
 def add_note_to_task(db, cursor: sqlite3.Cursor, id_: str, text: str):
@@ -150,41 +282,86 @@ def add_note_to_task(db, cursor: sqlite3.Cursor, id_: str, text: str):
 
 
 def close_task(db, cursor: sqlite3.Cursor, id_: str, quest_executed: bool = True):
-    cursor.execute("SELECT name, quest FROM tasks WHERE id = ?", (id_,))
-    name, quest = cursor.fetchone()
+    names, _ = close_tasks(db, cursor, [id_], quest_executed)
+    return names[0] if names else None
+
+
+def close_tasks(db, cursor: sqlite3.Cursor, ids: list, quest_executed: bool = True):
+    """
+    Close the tasks and complete their quests in one transaction; returns (names, summary of rpg_mod.close_quests)
+    """
+    if not ids:
+        return [], None
+    placeholders = ", ".join("?" * len(ids))
+    cursor.execute("SELECT id, name, quest FROM tasks WHERE id IN (" + placeholders + ")", list(ids))
+    tasks = {t[0]: t for t in cursor.fetchall()}
+    tasks = [tasks[int(i)] for i in ids if int(i) in tasks]
+
+    cursor.execute("UPDATE tasks SET status=0 WHERE id IN (" + placeholders + ")", list(ids))
+    quests = [t[2] for t in tasks if t[2]] if quest_executed else []
+    summary = rpg_mod.close_quests(db, cursor, quests, commit=False)
+    db.commit()
+
+    for id_, name, _ in tasks:
+        notify.post("close", id=id_, name=name)
+    return [t[1] for t in tasks], summary
 
-    cursor.execute("UPDATE tasks SET status=0 WHERE id = ?", (id_,))
+
+def delete_task(db, cursor: sqlite3.Cursor, id_: str):
+    cursor.execute("DELETE FROM tasks WHERE id = ?", (id_,))
     db.commit()
+    notify.post("delete", id=id_)
 
-    if quest and quest_executed:
-        rpg_mod.close_quest(db, cursor, quest)
 
-    # for i3 integration
-    os.system('pkill -SIGRTMIN+10 i3blocks')
+def link_tasks(db, cursor: sqlite3.Cursor, id_: str, blocker: str):
+    """
+    Make the task `id_` wait until the task `blocker` is closed
+    """
+    cursor.execute("SELECT count(*) FROM tasks WHERE id IN (?, ?)", (id_, blocker))
+    if cursor.fetchone()[0] != 2 or int(id_) == int(blocker):
+        raise ValueError("Cannot make task %s wait for task %s" % (id_, blocker))
 
-    return name
+    # the new edge closes a cycle if the blocker already waits for the task, directly or not
+    cursor.execute("WITH RECURSIVE waits_for(id) AS (SELECT ? UNION "
+                   "SELECT d.blocker FROM task_dependencies d JOIN waits_for w ON d.task = w.id) "
+                   "SELECT 1 FROM waits_for WHERE id = ?", (int(blocker), int(id_)))
+    if cursor.fetchone():
+        raise ValueError("Task %s already waits for task %s" % (blocker, id_))
 
+    cursor.execute("INSERT OR IGNORE INTO task_dependencies(task, blocker) VALUES (?, ?)", (id_, blocker))
+    db.commit()
+    notify.post("modify", id=id_)
 
-def delete_task(db, cursor: sqlite3.Cursor, id_: str):
-    cursor.execute("DELETE FROM tasks WHERE id = ?", (id_,))
+
+def unlink_tasks(db, cursor: sqlite3.Cursor, id_: str, blocker: str):
+    cursor.execute("DELETE FROM task_dependencies WHERE task = ? AND blocker = ?", (id_, blocker))
     db.commit()
+    notify.post("modify", id=id_)
 
 
-def add_note(db, cursor: sqlite3.Cursor, date: str, text: str):
-    date = relative_date_to_sql_query(date)
+def get_blockers(cursor: sqlite3.Cursor, id_: str):
+    """
+    The tasks that the task `id_` waits for, open ones first
+    """
+    cursor.execute("SELECT t.id, t.name, t.status FROM task_dependencies d JOIN tasks t ON t.id = d.blocker "
+                   "WHERE d.task = ? ORDER BY t.status DESC, t.id", (id_,))
+    return [{"id": b[0], "name": b[1], "status": b[2]} for b in cursor.fetchall()]
+
 
+def add_note(db, cursor: sqlite3.Cursor, date: str, text: str):
     if date:
-        cursor.execute("INSERT INTO notes(date, text) VALUES (" + date + ",?)", (text,))
+        date, date_arguments = relative_date_to_sql_query(date)
+        cursor.execute("INSERT INTO notes(date, text) VALUES (" + date + ",?)", date_arguments + [text])
     else:
         cursor.execute("INSERT INTO notes(date, text) VALUES (date('now'), ?)", (text,))
     db.commit()
 
 
-def productivity_plot(cursor: sqlite3.Cursor, project_ids: list = None, interval: str = None):
+def productivity_data(cursor: sqlite3.Cursor, project_ids: list = None, interval: str = None):
     if not project_ids or project_ids == [None]:
         cursor.execute('SELECT sum(tasks.weight),tasks.due_date, projects.name FROM tasks '
                        'INNER JOIN projects ON tasks.project = projects.id '
-                       'WHERE status=0 AND due_date is not NULL GROUP BY due_date,project'
+                       'WHERE status=0 AND due_date is not NULL AND tasks.hidden=0 GROUP BY due_date,project'
                        )
     else:
         cursor.execute('SELECT sum(tasks.weight),tasks.due_date, projects.name FROM tasks '
@@ -196,7 +373,7 @@ def productivity_plot(cursor: sqlite3.Cursor, project_ids: list = None, interval
     data = cursor.fetchall()
 
     if len(data) <= 2:
-        return False
+        return None
 
     # import into a DataFrame
     labels = ["weight", "date", "project"]
@@ -209,6 +386,13 @@ def productivity_plot(cursor: sqlite3.Cursor, project_ids: list = None, interval
     df = df.reindex(dates, fill_value=0)
     if interval:
         df = df.resample(interval).sum()
+    return df
+
+
+def productivity_plot(cursor: sqlite3.Cursor, project_ids: list = None, interval: str = None):
+    df = productivity_data(cursor, project_ids, interval)
+    if df is None:
+        return False
 
     # build the plot
     fig = plt.figure(figsize=(12, 1))
@@ -231,11 +415,12 @@ def productivity_plot(cursor: sqlite3.Cursor, project_ids: list = None, interval
 
 def get_total_weight(cursor: sqlite3.Cursor, closed=False, week_total=False):
     if closed:
-        query = "SELECT sum(weight) FROM tasks WHERE due_date=current_date AND status=0 GROUP BY due_date"
+        query = "SELECT sum(weight) FROM tasks WHERE due_date=current_date AND status=0 AND hidden=0 GROUP BY due_date"
     elif week_total:
-        query = "SELECT sum(weight) FROM tasks WHERE date(due_date) > date('now', 'weekday 0', '-7 days') AND status=0"
+        query = "SELECT sum(weight) FROM tasks WHERE date(due_date) > date('now', 'weekday 0', '-7 days') " \
+                "AND status=0 AND hidden=0"
     else:
-        query = "SELECT sum(weight) FROM tasks WHERE due_date=current_date GROUP BY due_date"
+        query = "SELECT sum(weight) FROM tasks WHERE due_date=current_date AND hidden=0 GROUP BY due_date"
     query_arguments = []
 
     result = cursor.execute(query, query_arguments).fetchone()
@@ -243,19 +428,23 @@ def get_total_weight(cursor: sqlite3.Cursor, closed=False, week_total=False):
 
 
 def relative_date_to_sql_query(date: str):
+    """
+    SQL expression and parameters of a date (YYYY-MM-DD, +N days, today, tomorrow or no); the date itself is always
+    a bound parameter, so that a date sent by a client of the server cannot change the query
+    """
     if date[0] == "+":
-        return "date('now', '" + date + "')"
+        return "date('now', ?)", [date]
 
     if date == "today":
-        return "date('now')"
+        return "date('now')", []
 
     if date == "tomorrow":
-        return "date('now', '+1 day')"
+        return "date('now', '+1 day')", []
 
     if date == "no":
-        return "null"
+        return "null", []
 
-    return "date('" + date + "')"
+    return "date(?)", [date]
 
 
 # SQLite doesn't handle daylight saving properly
@@ -270,10 +459,50 @@ def local_to_utc(time: str):
            "    strftime('%s', " + time + ") + strftime('%s', 'now') - strftime('%s', 'now', 'localtime'), 'unixepoch')"
 
 
-def read_configuration():
+def read_configuration(profile_name: str = None):
     with open(os.path.expanduser("~/.aide.conf")) as f:
         config = json.load(f)
-    return config
+    return profile_config(config, profile_name)
+
+
+def profile_config(config: dict, name: str = None) -> dict:
+    """
+    The settings of the profile `name` (see pool.py) on top of the top-level ones. The default profile if no name
+    is given; the config itself if it has no profiles
+    """
+    profiles = config.get("profiles")
+    if not profiles:
+        if name and name != "default":
+            raise ValueError("Unknown profile: %s" % name)
+        return config
+
+    name = name or config.get("default_profile") or next(iter(profiles))
+    if name not in profiles:
+        raise ValueError("Unknown profile: %s" % name)
+    result = dict(config)
+    result.update(profiles[name])
+    result["profile_name"] = name
+    return result
+
+
+def connect(config: dict, profile: bool = False) -> sqlite3.Connection:
+    notify.configure(config)
+    rpg_mod.configure(config)
+    db = open_database(config, profile)
+    history.snapshot_if_due(db, db.cursor())
+    return db
+
+
+def open_database(config: dict, profile: bool = False) -> sqlite3.Connection:
+    db_path = os.path.expanduser(config['db_path'])
+    profile_options = config.get("profile", False)
+    if profile or profile_options:
+        db = profiler.connect(db_path, profile_options if isinstance(profile_options, dict) else {})
+    else:
+        db = sqlite3.connect(db_path)
+
+    schema.upgrade(db)
+    return db
 
 
 def validate_date(date_string: str) -> bool:
@@ -1,76 +1,85 @@
--- we don't know how to generate schema main (class Schema) :(
-create table abstract_tasks
+-- Schema of the aide database. Apply triggers.sql afterwards:
+--   sqlite3 tasks.db < db.sql && sqlite3 tasks.db < triggers.sql
+-- The scripts in migrations/ are applied on top of it by schema.py when aide connects to the DB.
+
+create table projects
 (
-	id INTEGER not null,
-	name TEXT not null
+	id INTEGER not null primary key,
+	name TEXT not null,
+	priority INTEGER default 0 not null,
+	open INTEGER default 1 not null
 )
 ;
 
-create unique index abstract_tasks_id_uindex
-	on abstract_tasks (id)
-;
-
-create unique index abstract_tasks_name_uindex
-	on abstract_tasks (name)
-;
-
--- unexpected locus for key
-;
-
-create table day_notes
+create table skills
 (
-	id INTEGER not null,
-	date TEXT not null,
-	text TEXT not null
+	id INTEGER not null primary key,
+	name TEXT not null,
+	value INTEGER default 0 not null,
+	xp INTEGER default 0 not null
 )
 ;
 
-create unique index day_notes_id_uindex
-	on day_notes (id)
-;
-
--- unexpected locus for key
+create table quests
+(
+	id INTEGER not null primary key,
+	name TEXT not null,
+	xp INTEGER default 0 not null,
+	willingness INTEGER default 0 not null,
+	trained_skill INTEGER
+		constraint quests_skills_id_fk
+			references skills,
+	time INTEGER default 1 not null
+)
 ;
 
 create table tasks
 (
-	id INTEGER not null,
+	id INTEGER not null primary key,
 	due_date TEXT,
 	name TEXT not null,
 	priority INTEGER default 0 not null,
 	due_time TEXT,
 	status INTEGER default 1 not null,
 	weight REAL default 0 not null,
-	abstract_task_id INTEGER default 1 not null
-		constraint tasks_abstract_tasks_id_fk
-			references abstract_tasks,
-	repeat_period TEXT
+	repeat_period TEXT,
+	project INTEGER default 1 not null
+		constraint tasks_projects_id_fk
+			references projects,
+	quest INTEGER
+		constraint tasks_quests_id_fk
+			references quests,
+	order_in_project INTEGER default 0 not null,
+	note TEXT
 )
 ;
 
-create unique index tasks_id_uindex
-	on tasks (id)
+create table notes
+(
+	id INTEGER not null primary key,
+	date TEXT not null,
+	text TEXT not null
+)
 ;
 
--- unexpected locus for key
+create table character
+(
+	id INTEGER not null primary key,
+	level INTEGER default 1 not null,
+	gold INTEGER default 0 not null,
+	xp INTEGER default 0 not null,
+	xp_for_next_level INTEGER default 100 not null
+)
 ;
 
-CREATE TRIGGER "repeat_task"
-   AFTER
-   UPDATE
-   ON tasks
-  FOR EACH ROW WHEN (old.status = 1 AND new.status = 0 AND old.repeat_period is not null)
-BEGIN
-    INSERT INTO tasks(name, priority, due_time, weight, repeat_period, due_date)
-    VALUES (old.name, old.priority, old.due_time, old.weight, old.repeat_period, date(old.due_date,old.repeat_period));
-END;
-
-CREATE TRIGGER "set_due_date"
-   AFTER
-   INSERT
-   ON tasks
-  FOR EACH ROW WHEN (new.due_date is null)
-BEGIN
-    UPDATE tasks SET due_date=date('now') WHERE id = new.id;
-END;
+create table awards
+(
+	id INTEGER not null primary key,
+	name TEXT not null,
+	price INTEGER default 0 not null
+)
+;
 
+-- tasks without an explicit project go to the project 1
+INSERT INTO projects(id, name, priority) VALUES (1, 'Inbox', 0);
+INSERT INTO character(id) VALUES (1);
@@ -0,0 +1,139 @@
+"""
+History of the tasks.
+
+The triggers from migrations/003_task_events.sql append an event to task_events in the same transaction as every
+change of a task. The open tasks are snapshotted once a week (see snapshot_if_due), so the state at a past date is
+rebuilt from the closest snapshot before it and the events in between.
+"""
+import datetime
+import json
+import sqlite3
+import time
+
+# event codes
+CREATED = 1
+RENAMED = 2
+REPRIORITIZED = 3
+POSTPONED = 4
+ADVANCED = 5
+RETIMED = 6
+REWEIGHTED = 7
+CLOSED = 8
+REOPENED = 9
+MOVED = 10
+DELETED = 11
+
+EVENT_NAMES = {
+    CREATED: "created",
+    RENAMED: "renamed",
+    REPRIORITIZED: "priority",
+    POSTPONED: "postponed",
+    ADVANCED: "brought forward",
+    RETIMED: "due time",
+    REWEIGHTED: "weight",
+    CLOSED: "closed",
+    REOPENED: "reopened",
+    MOVED: "moved to project",
+    DELETED: "deleted",
+}
+
+# the task fields that are tracked; the events that change them
+FIELDS = ("name", "priority", "due_date", "due_time", "weight", "project")
+EVENT_FIELDS = {
+    RENAMED: "name",
+    REPRIORITIZED: "priority",
+    POSTPONED: "due_date",
+    ADVANCED: "due_date",
+    RETIMED: "due_time",
+    REWEIGHTED: "weight",
+    MOVED: "project",
+}
+
+SNAPSHOT_INTERVAL = 7 * 24 * 60 * 60
+
+
+def get_events(cursor: sqlite3.Cursor, id_: int):
+    cursor.execute("SELECT time, event, value FROM task_events WHERE task = ? ORDER BY id", (id_,))
+    return [{
+        "time": datetime.datetime.fromtimestamp(e[0]).isoformat(sep=" ", timespec="minutes"),
+        "event": EVENT_NAMES.get(e[1], str(e[1])),
+        "value": e[2],
+    } for e in cursor.fetchall()]
+
+
+def take_snapshot(db, cursor: sqlite3.Cursor):
+    cursor.execute("INSERT INTO task_snapshots(time, last_event) SELECT ?, coalesce(max(id), 0) FROM task_events",
+                   (int(time.time()),))
+    snapshot = cursor.lastrowid
+    cursor.execute("INSERT INTO task_snapshot_rows(snapshot, task, " + ", ".join(FIELDS) + ") "
+                   "SELECT ?, id, " + ", ".join(FIELDS) + " FROM tasks WHERE status = 1", (snapshot,))
+    db.commit()
+    return snapshot
+
+
+def snapshot_if_due(db, cursor: sqlite3.Cursor, interval: int = SNAPSHOT_INTERVAL):
+    cursor.execute("SELECT max(time) FROM task_snapshots")
+    last = cursor.fetchone()[0]
+    if last is None or time.time() - last >= interval:
+        return take_snapshot(db, cursor)
+    return None
+
+
+def get_state(cursor: sqlite3.Cursor, moment: float):
+    """
+    The open tasks at the UNIX time `moment`: id -> dict of FIELDS. Raises ValueError if the history
+    does not reach that far back
+    """
+    cursor.execute("SELECT id, last_event FROM task_snapshots WHERE time <= ? ORDER BY time DESC LIMIT 1", (moment,))
+    snapshot = cursor.fetchone()
+    if not snapshot:
+        cursor.execute("SELECT min(time) FROM task_snapshots")
+        start = cursor.fetchone()[0]
+        raise ValueError("The history starts at %s" % datetime.datetime.fromtimestamp(start).isoformat(
+            sep=" ", timespec="minutes"))
+
+    snapshot, last_event = snapshot
+    cursor.execute("SELECT task, " + ", ".join(FIELDS) + " FROM task_snapshot_rows WHERE snapshot = ?", (snapshot,))
+    tasks = {t[0]: dict(zip(FIELDS, t[1:])) for t in cursor.fetchall()}
+
+    # replay the events after the snapshot; the fields of closed tasks are kept in case they are reopened.
+    # The times have a resolution of a second, so the snapshot is matched by the id of its last event
+    closed = {}
+    cursor.execute("SELECT task, event, value FROM task_events WHERE id > ? AND time <= ? ORDER BY id",
+                   (last_event, moment))
+    for task, event, value in cursor.fetchall():
+        if event == CREATED:
+            tasks[task] = dict(zip(FIELDS, json.loads(value)))
+        elif event in (CLOSED, DELETED):
+            if task in tasks:
+                closed[task] = tasks.pop(task)
+        elif event == REOPENED:
+            tasks[task] = closed.pop(task, None) or get_current_fields(cursor, task)
+        elif task in tasks:
+            tasks[task][EVENT_FIELDS[event]] = value
+        elif task in closed:
+            closed[task][EVENT_FIELDS[event]] = value
+    return tasks
+
+
+def get_current_fields(cursor: sqlite3.Cursor, id_: int):
+    # a task that was closed before the snapshot: its fields at the time are not known, the current ones are used
+    cursor.execute("SELECT " + ", ".join(FIELDS) + " FROM tasks WHERE id = ?", (id_,))
+    row = cursor.fetchone()
+    return dict(zip(FIELDS, row)) if row else dict.fromkeys(FIELDS)
+
+
+def get_postponed(cursor: sqlite3.Cursor, since: float, limit: int = 10):
+    """
+    The most often postponed tasks since the UNIX time `since`: (total number of postponements, [(count, id, name)])
+    """
+    cursor.execute("SELECT task, count(*) FROM task_events INDEXED BY task_events_time_index "
+                   "WHERE event = ? AND time >= ? GROUP BY task ORDER BY count(*) DESC", (POSTPONED, since))
+    counts = cursor.fetchall()
+
+    result = []
+    for task, count in counts[:limit]:
+        cursor.execute("SELECT name FROM tasks WHERE id = ?", (task,))
+        name = cursor.fetchone()
+        result.append((count, task, name[0] if name else "(deleted)"))
+    return sum(c for _, c in counts), result
@@ -0,0 +1,27 @@
+-- The moment a task becomes actionable (UTC): its due date, or due date and time if the task is timed.
+-- Lets the top task be found by walking a single index instead of evaluating due_date/due_time for every task.
+ALTER TABLE tasks ADD COLUMN actionable_at TEXT;
+
+UPDATE tasks SET actionable_at = CASE
+    WHEN due_time IS NULL THEN due_date
+    ELSE due_date || ' ' || due_time
+END;
+
+CREATE INDEX tasks_top_index ON tasks (priority DESC, id DESC, actionable_at) WHERE status = 1;
+CREATE INDEX tasks_actionable_index ON tasks (actionable_at) WHERE status = 1;
+
+CREATE TRIGGER "main"."set_actionable_at"
+    AFTER INSERT
+    ON tasks
+BEGIN
+    UPDATE tasks SET actionable_at = CASE WHEN new.due_time IS NULL THEN new.due_date ELSE new.due_date || ' ' || new.due_time END
+    WHERE id = new.id;
+END;
+
+CREATE TRIGGER "main"."update_actionable_at"
+    AFTER UPDATE OF due_date, due_time
+    ON tasks
+BEGIN
+    UPDATE tasks SET actionable_at = CASE WHEN new.due_time IS NULL THEN new.due_date ELSE new.due_date || ' ' || new.due_time END
+    WHERE id = new.id;
+END;
@@ -0,0 +1,288 @@
+-- Change log for `aide sync` (see sync.py).
+-- Every synced row gets a uuid that identifies it in all the DBs. Rows that existed before this migration get
+-- uuids derived from their ids, so copies of the same DB agree on them.
+-- The triggers append the uuid of every inserted, updated or deleted row to the change log; the rows themselves
+-- are read when the changes are sent. While remote changes are applied (the "applying" key in sync_meta is set),
+-- the triggers are skipped and sync.py logs the changes with their original time and node.
+
+CREATE TABLE sync_meta
+(
+    key TEXT NOT NULL PRIMARY KEY,
+    value TEXT
+);
+
+INSERT INTO sync_meta(key, value) VALUES ('node', lower(hex(randomblob(8))));
+
+CREATE TABLE changelog
+(
+    seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    op INTEGER NOT NULL, -- 0: insert or update, 1: delete
+    modified TEXT NOT NULL,
+    node TEXT NOT NULL
+);
+
+CREATE INDEX changelog_row_index ON changelog (tbl, uuid, seq);
+
+-- the last change of the peer received by this DB and the last change of this DB sent to the peer
+CREATE TABLE sync_peers
+(
+    peer TEXT NOT NULL PRIMARY KEY,
+    received_seq INTEGER DEFAULT 0 NOT NULL,
+    sent_seq INTEGER DEFAULT 0 NOT NULL,
+    synced TEXT
+);
+
+ALTER TABLE projects ADD COLUMN uuid TEXT;
+UPDATE projects SET uuid = 'projects:' || id;
+CREATE UNIQUE INDEX projects_uuid_index ON projects (uuid);
+
+CREATE TRIGGER "main"."sync_projects_insert"
+    AFTER INSERT
+    ON projects
+BEGIN
+    UPDATE projects SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'projects', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM projects WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_projects_update"
+    AFTER UPDATE OF name, priority, open
+    ON projects
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('projects', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_projects_delete"
+    AFTER DELETE
+    ON projects
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('projects', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+ALTER TABLE skills ADD COLUMN uuid TEXT;
+UPDATE skills SET uuid = 'skills:' || id;
+CREATE UNIQUE INDEX skills_uuid_index ON skills (uuid);
+
+CREATE TRIGGER "main"."sync_skills_insert"
+    AFTER INSERT
+    ON skills
+BEGIN
+    UPDATE skills SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'skills', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM skills WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_skills_update"
+    AFTER UPDATE OF name, value, xp
+    ON skills
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('skills', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_skills_delete"
+    AFTER DELETE
+    ON skills
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('skills', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+ALTER TABLE quests ADD COLUMN uuid TEXT;
+UPDATE quests SET uuid = 'quests:' || id;
+CREATE UNIQUE INDEX quests_uuid_index ON quests (uuid);
+
+CREATE TRIGGER "main"."sync_quests_insert"
+    AFTER INSERT
+    ON quests
+BEGIN
+    UPDATE quests SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'quests', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM quests WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_quests_update"
+    AFTER UPDATE OF name, xp, willingness, trained_skill, time
+    ON quests
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('quests', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_quests_delete"
+    AFTER DELETE
+    ON quests
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('quests', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+ALTER TABLE awards ADD COLUMN uuid TEXT;
+UPDATE awards SET uuid = 'awards:' || id;
+CREATE UNIQUE INDEX awards_uuid_index ON awards (uuid);
+
+CREATE TRIGGER "main"."sync_awards_insert"
+    AFTER INSERT
+    ON awards
+BEGIN
+    UPDATE awards SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'awards', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM awards WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_awards_update"
+    AFTER UPDATE OF name, price
+    ON awards
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('awards', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_awards_delete"
+    AFTER DELETE
+    ON awards
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('awards', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+ALTER TABLE character ADD COLUMN uuid TEXT;
+UPDATE character SET uuid = 'character:' || id;
+CREATE UNIQUE INDEX character_uuid_index ON character (uuid);
+
+CREATE TRIGGER "main"."sync_character_insert"
+    AFTER INSERT
+    ON character
+BEGIN
+    UPDATE character SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'character', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM character WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_character_update"
+    AFTER UPDATE OF level, gold, xp, xp_for_next_level
+    ON character
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('character', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_character_delete"
+    AFTER DELETE
+    ON character
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('character', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+ALTER TABLE notes ADD COLUMN uuid TEXT;
+UPDATE notes SET uuid = 'notes:' || id;
+CREATE UNIQUE INDEX notes_uuid_index ON notes (uuid);
+
+CREATE TRIGGER "main"."sync_notes_insert"
+    AFTER INSERT
+    ON notes
+BEGIN
+    UPDATE notes SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'notes', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM notes WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_notes_update"
+    AFTER UPDATE OF date, text
+    ON notes
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('notes', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_notes_delete"
+    AFTER DELETE
+    ON notes
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('notes', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+ALTER TABLE tasks ADD COLUMN uuid TEXT;
+UPDATE tasks SET uuid = 'tasks:' || id;
+CREATE UNIQUE INDEX tasks_uuid_index ON tasks (uuid);
+
+CREATE TRIGGER "main"."sync_tasks_insert"
+    AFTER INSERT
+    ON tasks
+BEGIN
+    UPDATE tasks SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'tasks', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM tasks WHERE id = new.id AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
+
+CREATE TRIGGER "main"."sync_tasks_update"
+    AFTER UPDATE OF due_date, name, priority, due_time, status, weight, repeat_period, project, quest, order_in_project, note
+    ON tasks
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('tasks', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+CREATE TRIGGER "main"."sync_tasks_delete"
+    AFTER DELETE
+    ON tasks
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('tasks', old.uuid, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+-- the clones of repeated tasks arrive with the other changes, so they must not be created once more
+DROP TRIGGER IF EXISTS "main"."repeat_task";
+DROP TRIGGER IF EXISTS "main"."repeat_task_workdays";
+
+CREATE TRIGGER "main"."repeat_task"
+    AFTER UPDATE
+    ON tasks
+    FOR EACH ROW WHEN (old.status = 1 AND new.status = 0 AND old.repeat_period is not null AND old.repeat_period != 'workdays' AND old.repeat_period != ''
+                       AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL)
+BEGIN
+    INSERT INTO tasks(name, priority, due_time, weight, repeat_period, due_date, quest, project)
+    VALUES (old.name, old.priority, old.due_time, old.weight, old.repeat_period, date(old.due_date,old.repeat_period), old.quest, old.project);
+END;
+
+CREATE TRIGGER "main"."repeat_task_workdays"
+    AFTER UPDATE
+    ON tasks
+    FOR EACH ROW WHEN (old.status = 1 AND new.status = 0 AND old.repeat_period is not null AND old.repeat_period == 'workdays'
+                       AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL)
+BEGIN
+    INSERT INTO tasks(name, priority, due_time, weight, repeat_period, quest, project, due_date)
+    VALUES (old.name, old.priority, old.due_time, old.weight, old.repeat_period, old.quest, old.project,
+            CASE strftime("%w", date(old.due_date))
+                WHEN '5' THEN date(old.due_date,'weekday 1')
+                ELSE date(old.due_date,'+1 days')
+            END
+           );
+END;
@@ -0,0 +1,117 @@
+-- History of the tasks (see history.py).
+-- Every change of a task appends one row to task_events: the event code, the time (UNIX seconds) and the new value.
+-- The open tasks are snapshotted from time to time, so that the state at a past date is rebuilt from the closest
+-- snapshot and the events after it.
+
+CREATE TABLE task_events
+(
+    id INTEGER NOT NULL PRIMARY KEY,
+    task INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    event INTEGER NOT NULL, -- history.CREATED, ...
+    value
+);
+
+CREATE INDEX task_events_task_index ON task_events (task, id);
+CREATE INDEX task_events_time_index ON task_events (event, time);
+
+CREATE TABLE task_snapshots
+(
+    id INTEGER NOT NULL PRIMARY KEY,
+    time INTEGER NOT NULL,
+    last_event INTEGER NOT NULL DEFAULT 0 -- the events up to this one are included in the snapshot
+);
+
+CREATE TABLE task_snapshot_rows
+(
+    snapshot INTEGER NOT NULL REFERENCES task_snapshots,
+    task INTEGER NOT NULL,
+    name TEXT,
+    priority INTEGER,
+    due_date TEXT,
+    due_time TEXT,
+    weight REAL,
+    project INTEGER,
+    PRIMARY KEY (snapshot, task)
+) WITHOUT ROWID;
+
+-- the history starts with the open tasks of today
+INSERT INTO task_snapshots(id, time) VALUES (1, CAST(strftime('%s', 'now') AS INTEGER));
+INSERT INTO task_snapshot_rows(snapshot, task, name, priority, due_date, due_time, weight, project)
+SELECT 1, id, name, priority, due_date, due_time, weight, project FROM tasks WHERE status = 1;
+
+CREATE TRIGGER "main"."task_created"
+    AFTER INSERT
+    ON tasks
+BEGIN
+    INSERT INTO task_events(task, time, event, value)
+    VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), 1,
+            json_array(new.name, new.priority, new.due_date, new.due_time, new.weight, new.project));
+END;
+
+CREATE TRIGGER "main"."task_renamed"
+    AFTER UPDATE OF name
+    ON tasks
+    FOR EACH ROW WHEN old.name IS NOT new.name
+BEGIN
+    INSERT INTO task_events(task, time, event, value) VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), 2, new.name);
+END;
+
+CREATE TRIGGER "main"."task_reprioritized"
+    AFTER UPDATE OF priority
+    ON tasks
+    FOR EACH ROW WHEN old.priority IS NOT new.priority
+BEGIN
+    INSERT INTO task_events(task, time, event, value) VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), 3, new.priority);
+END;
+
+-- moving the due date later (or dropping it) is a postponement, anything else brings the task forward
+CREATE TRIGGER "main"."task_rescheduled"
+    AFTER UPDATE OF due_date
+    ON tasks
+    FOR EACH ROW WHEN old.due_date IS NOT new.due_date
+BEGIN
+    INSERT INTO task_events(task, time, event, value)
+    VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER),
+            CASE WHEN new.due_date IS NULL OR new.due_date > old.due_date THEN 4 ELSE 5 END, new.due_date);
+END;
+
+CREATE TRIGGER "main"."task_retimed"
+    AFTER UPDATE OF due_time
+    ON tasks
+    FOR EACH ROW WHEN old.due_time IS NOT new.due_time
+BEGIN
+    INSERT INTO task_events(task, time, event, value) VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), 6, new.due_time);
+END;
+
+CREATE TRIGGER "main"."task_reweighted"
+    AFTER UPDATE OF weight
+    ON tasks
+    FOR EACH ROW WHEN old.weight IS NOT new.weight
+BEGIN
+    INSERT INTO task_events(task, time, event, value) VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), 7, new.weight);
+END;
+
+CREATE TRIGGER "main"."task_status_changed"
+    AFTER UPDATE OF status
+    ON tasks
+    FOR EACH ROW WHEN old.status IS NOT new.status
+BEGIN
+    INSERT INTO task_events(task, time, event)
+    VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), CASE WHEN new.status = 0 THEN 8 ELSE 9 END);
+END;
+
+CREATE TRIGGER "main"."task_moved"
+    AFTER UPDATE OF project
+    ON tasks
+    FOR EACH ROW WHEN old.project IS NOT new.project
+BEGIN
+    INSERT INTO task_events(task, time, event, value) VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER), 10, new.project);
+END;
+
+CREATE TRIGGER "main"."task_deleted"
+    AFTER DELETE
+    ON tasks
+BEGIN
+    INSERT INTO task_events(task, time, event) VALUES (old.id, CAST(strftime('%s', 'now') AS INTEGER), 11);
+END;
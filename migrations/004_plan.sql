@@ -0,0 +1,21 @@
+-- The days the undated tasks are planned for (see schedule.py). Derived from the tasks, hence not synced:
+-- every DB plans its own backlog.
+CREATE TABLE task_plan
+(
+    position INTEGER NOT NULL PRIMARY KEY, -- in the order of schedule.get_backlog()
+    task INTEGER NOT NULL,
+    project INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    day TEXT NOT NULL
+);
+
+CREATE INDEX task_plan_day_index ON task_plan (day, position);
+
+-- the inputs of the plan besides the backlog: the first day, the capacity and the weight already due on the days
+CREATE TABLE plan_meta
+(
+    key TEXT NOT NULL PRIMARY KEY,
+    value
+);
+
+CREATE INDEX tasks_backlog_index ON tasks (project, order_in_project, id) WHERE status = 1 AND due_date IS NULL;
@@ -0,0 +1,61 @@
+-- Dependencies between tasks: `task` waits until `blocker` is closed.
+-- tasks.blocked_count is the number of open blockers of a task; it is kept up to date by the triggers below,
+-- so that the listing and the top task need no graph traversal. Cycles are rejected by core.link_tasks().
+CREATE TABLE task_dependencies
+(
+    task INTEGER NOT NULL REFERENCES tasks,
+    blocker INTEGER NOT NULL REFERENCES tasks,
+    PRIMARY KEY (task, blocker)
+) WITHOUT ROWID;
+
+CREATE INDEX task_dependencies_blocker_index ON task_dependencies (blocker, task);
+
+ALTER TABLE tasks ADD COLUMN blocked_count INTEGER NOT NULL DEFAULT 0;
+
+-- blocked tasks are never the top task
+DROP INDEX tasks_top_index;
+CREATE INDEX tasks_top_index ON tasks (priority DESC, id DESC, actionable_at) WHERE status = 1 AND blocked_count = 0;
+
+CREATE TRIGGER "main"."dependency_added"
+    AFTER INSERT
+    ON task_dependencies
+BEGIN
+    UPDATE tasks SET blocked_count = blocked_count + 1
+    WHERE id = new.task AND (SELECT status FROM tasks WHERE id = new.blocker) = 1;
+END;
+
+CREATE TRIGGER "main"."dependency_removed"
+    AFTER DELETE
+    ON task_dependencies
+BEGIN
+    UPDATE tasks SET blocked_count = blocked_count - 1
+    WHERE id = old.task AND (SELECT status FROM tasks WHERE id = old.blocker) = 1;
+END;
+
+CREATE TRIGGER "main"."blocker_closed"
+    AFTER UPDATE OF status
+    ON tasks
+    WHEN old.status = 1 AND new.status = 0
+BEGIN
+    UPDATE tasks SET blocked_count = blocked_count - 1
+    WHERE id IN (SELECT task FROM task_dependencies WHERE blocker = new.id);
+END;
+
+CREATE TRIGGER "main"."blocker_reopened"
+    AFTER UPDATE OF status
+    ON tasks
+    WHEN old.status = 0 AND new.status = 1
+BEGIN
+    UPDATE tasks SET blocked_count = blocked_count + 1
+    WHERE id IN (SELECT task FROM task_dependencies WHERE blocker = new.id);
+END;
+
+-- the blocker is gone by the time its edges are deleted, so dependency_removed leaves the count alone
+CREATE TRIGGER "main"."blocker_deleted"
+    AFTER DELETE
+    ON tasks
+BEGIN
+    UPDATE tasks SET blocked_count = blocked_count - 1
+    WHERE old.status = 1 AND id IN (SELECT task FROM task_dependencies WHERE blocker = old.id);
+    DELETE FROM task_dependencies WHERE task = old.id OR blocker = old.id;
+END;
@@ -0,0 +1,10 @@
+-- Bumped on every change of the character, so that processes caching it (see rpg_mod.get_character_stats)
+-- notice the changes made by others.
+ALTER TABLE character ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER "main"."character_changed"
+    AFTER UPDATE OF level, gold, xp, xp_for_next_level
+    ON character
+BEGIN
+    UPDATE character SET version = version + 1 WHERE id = new.id;
+END;
@@ -0,0 +1,36 @@
+-- Every XP and gold change of the character (see rpg_mod.QUEST, ...), written in the same transaction as the change.
+-- rpg_weekly holds the totals per week (its Monday, local time) and skill (0: none); it is kept up to date by
+-- the trigger below, so that the reports do not scan the ledger.
+CREATE TABLE rpg_ledger
+(
+    id INTEGER NOT NULL PRIMARY KEY,
+    time INTEGER NOT NULL, -- UNIX seconds
+    event INTEGER NOT NULL,
+    ref INTEGER, -- the quest or award; the new level for level-ups
+    skill INTEGER,
+    xp INTEGER NOT NULL DEFAULT 0,
+    gold INTEGER NOT NULL DEFAULT 0 -- negative when spent
+);
+
+CREATE INDEX rpg_ledger_event_index ON rpg_ledger (event, time);
+
+CREATE TABLE rpg_weekly
+(
+    week TEXT NOT NULL,
+    skill INTEGER NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    gold_earned INTEGER NOT NULL DEFAULT 0,
+    gold_spent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week, skill)
+) WITHOUT ROWID;
+
+CREATE TRIGGER "main"."rpg_ledger_totals"
+    AFTER INSERT
+    ON rpg_ledger
+BEGIN
+    INSERT INTO rpg_weekly(week, skill, xp, gold_earned, gold_spent)
+    VALUES (date(new.time, 'unixepoch', 'localtime', 'weekday 0', '-6 days'), coalesce(new.skill, 0), new.xp,
+            max(new.gold, 0), max(-new.gold, 0))
+    ON CONFLICT (week, skill) DO UPDATE SET xp = xp + excluded.xp, gold_earned = gold_earned + excluded.gold_earned,
+                                            gold_spent = gold_spent + excluded.gold_spent;
+END;
@@ -0,0 +1,27 @@
+-- The progress made before the ledger, as one OPENING row (rpg_mod.OPENING) for the character and one per skill,
+-- so that rpg_mod.rebuild() can recompute everything from the ledger. ref is the level (value) at the opening.
+-- The opening rows are not part of the weekly totals.
+DROP TRIGGER rpg_ledger_totals;
+CREATE TRIGGER "main"."rpg_ledger_totals"
+    AFTER INSERT
+    ON rpg_ledger
+    WHEN new.event != 0
+BEGIN
+    INSERT INTO rpg_weekly(week, skill, xp, gold_earned, gold_spent)
+    VALUES (date(new.time, 'unixepoch', 'localtime', 'weekday 0', '-6 days'), coalesce(new.skill, 0), new.xp,
+            max(new.gold, 0), max(-new.gold, 0))
+    ON CONFLICT (week, skill) DO UPDATE SET xp = xp + excluded.xp, gold_earned = gold_earned + excluded.gold_earned,
+                                            gold_spent = gold_spent + excluded.gold_spent;
+END;
+
+INSERT INTO rpg_ledger(time, event, ref, xp, gold)
+SELECT 0, 0, c.level - (SELECT count(*) FROM rpg_ledger WHERE event = 2),
+       c.xp - (SELECT coalesce(sum(xp), 0) FROM rpg_ledger WHERE event = 1),
+       c.gold - (SELECT coalesce(sum(gold), 0) FROM rpg_ledger)
+FROM character c WHERE c.id = 1;
+
+-- a skill value has taken 50 XP per level so far
+INSERT INTO rpg_ledger(time, event, ref, skill, xp)
+SELECT 0, 0, s.value - (SELECT count(*) FROM rpg_ledger WHERE event = 3 AND skill = s.id), s.id,
+       50 * s.value + s.xp - (SELECT coalesce(sum(xp), 0) FROM rpg_ledger WHERE event = 1 AND skill = s.id)
+FROM skills s;
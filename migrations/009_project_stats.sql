@@ -0,0 +1,66 @@
+-- Rollups of the tasks of every project (see project_mod.list_projects), kept up to date by the triggers below,
+-- so that the project views do not scan the tasks. project_mod.check_stats() compares them with the tasks and
+-- project_mod.rebuild_stats() recomputes them.
+CREATE TABLE project_stats
+(
+    project INTEGER NOT NULL PRIMARY KEY,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    closed_count INTEGER NOT NULL DEFAULT 0,
+    total_weight REAL NOT NULL DEFAULT 0,
+    closed_weight REAL NOT NULL DEFAULT 0,
+    last_activity TEXT -- the local date of the last change of a task
+) WITHOUT ROWID;
+
+INSERT INTO project_stats(project, open_count, closed_count, total_weight, closed_weight, last_activity)
+SELECT t.project, sum(t.status != 0), sum(t.status = 0), sum(t.weight),
+       sum(CASE WHEN t.status = 0 THEN t.weight ELSE 0 END),
+       (SELECT date(max(e.time), 'unixepoch', 'localtime') FROM task_events e JOIN tasks t2 ON t2.id = e.task
+        WHERE t2.project = t.project)
+FROM tasks t GROUP BY t.project;
+
+CREATE TRIGGER "main"."project_stats_task_added"
+    AFTER INSERT
+    ON tasks
+BEGIN
+    INSERT INTO project_stats(project, open_count, closed_count, total_weight, closed_weight, last_activity)
+    VALUES (new.project, new.status != 0, new.status = 0, new.weight,
+            CASE WHEN new.status = 0 THEN new.weight ELSE 0 END, date('now', 'localtime'))
+    ON CONFLICT (project) DO UPDATE SET open_count = open_count + excluded.open_count,
+                                        closed_count = closed_count + excluded.closed_count,
+                                        total_weight = total_weight + excluded.total_weight,
+                                        closed_weight = closed_weight + excluded.closed_weight,
+                                        last_activity = excluded.last_activity;
+END;
+
+CREATE TRIGGER "main"."project_stats_task_deleted"
+    AFTER DELETE
+    ON tasks
+BEGIN
+    UPDATE project_stats SET open_count = open_count - (old.status != 0),
+                             closed_count = closed_count - (old.status = 0),
+                             total_weight = total_weight - old.weight,
+                             closed_weight = closed_weight - CASE WHEN old.status = 0 THEN old.weight ELSE 0 END,
+                             last_activity = date('now', 'localtime')
+    WHERE project = old.project;
+END;
+
+-- the task leaves the old rollup and joins the new one, which may be the same
+CREATE TRIGGER "main"."project_stats_task_changed"
+    AFTER UPDATE OF status, weight, project
+    ON tasks
+    WHEN old.status IS NOT new.status OR old.weight IS NOT new.weight OR old.project IS NOT new.project
+BEGIN
+    UPDATE project_stats SET open_count = open_count - (old.status != 0),
+                             closed_count = closed_count - (old.status = 0),
+                             total_weight = total_weight - old.weight,
+                             closed_weight = closed_weight - CASE WHEN old.status = 0 THEN old.weight ELSE 0 END
+    WHERE project = old.project;
+    INSERT INTO project_stats(project, open_count, closed_count, total_weight, closed_weight, last_activity)
+    VALUES (new.project, new.status != 0, new.status = 0, new.weight,
+            CASE WHEN new.status = 0 THEN new.weight ELSE 0 END, date('now', 'localtime'))
+    ON CONFLICT (project) DO UPDATE SET open_count = open_count + excluded.open_count,
+                                        closed_count = closed_count + excluded.closed_count,
+                                        total_weight = total_weight + excluded.total_weight,
+                                        closed_weight = closed_weight + excluded.closed_weight,
+                                        last_activity = excluded.last_activity;
+END;
@@ -0,0 +1,69 @@
+-- Sub-projects. project_tree is the closure of projects.parent: a row for every project and each of its ancestors,
+-- itself included (depth 0), so that a subtree is one indexed range. It is kept up to date by the triggers below;
+-- moves that would form a cycle are ignored (project_mod.move_project() rejects them first).
+ALTER TABLE projects ADD COLUMN parent INTEGER REFERENCES projects;
+
+CREATE TABLE project_tree
+(
+    ancestor INTEGER NOT NULL,
+    descendant INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor, descendant)
+) WITHOUT ROWID;
+
+CREATE INDEX project_tree_descendant_index ON project_tree (descendant, ancestor);
+CREATE INDEX tasks_project_index ON tasks (project, status);
+
+INSERT INTO project_tree(ancestor, descendant, depth) SELECT id, id, 0 FROM projects;
+
+CREATE TRIGGER "main"."project_tree_added"
+    AFTER INSERT
+    ON projects
+BEGIN
+    INSERT INTO project_tree(ancestor, descendant, depth) VALUES (new.id, new.id, 0);
+    INSERT INTO project_tree(ancestor, descendant, depth)
+    SELECT ancestor, new.id, depth + 1 FROM project_tree WHERE descendant = new.parent;
+END;
+
+CREATE TRIGGER "main"."project_tree_cycle"
+    BEFORE UPDATE OF parent
+    ON projects
+    WHEN new.parent IN (SELECT descendant FROM project_tree WHERE ancestor = new.id)
+BEGIN
+    SELECT RAISE(IGNORE);
+END;
+
+-- the subtree is detached from the old ancestors and attached to the new ones
+CREATE TRIGGER "main"."project_tree_moved"
+    AFTER UPDATE OF parent
+    ON projects
+    WHEN old.parent IS NOT new.parent
+BEGIN
+    DELETE FROM project_tree
+    WHERE descendant IN (SELECT descendant FROM project_tree WHERE ancestor = new.id)
+      AND ancestor NOT IN (SELECT descendant FROM project_tree WHERE ancestor = new.id);
+    INSERT INTO project_tree(ancestor, descendant, depth)
+    SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+    FROM project_tree a JOIN project_tree d ON d.ancestor = new.id
+    WHERE a.descendant = new.parent;
+END;
+
+-- the sub-projects of a deleted project go to its parent
+CREATE TRIGGER "main"."project_tree_deleted"
+    AFTER DELETE
+    ON projects
+BEGIN
+    UPDATE projects SET parent = old.parent WHERE parent = old.id;
+    DELETE FROM project_tree WHERE ancestor = old.id OR descendant = old.id;
+END;
+
+-- moves are synced
+DROP TRIGGER sync_projects_update;
+CREATE TRIGGER "main"."sync_projects_update"
+    AFTER UPDATE OF name, priority, open, parent
+    ON projects
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('projects', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
@@ -0,0 +1,7 @@
+-- The tasks of a project are spread core.ORDER_GAP apart, so that a task is moved by updating its own row
+-- (see core.move_tasks).
+CREATE INDEX tasks_order_index ON tasks (project, order_in_project);
+
+UPDATE tasks SET order_in_project = r.position * 1024
+FROM (SELECT id, row_number() OVER (PARTITION BY project ORDER BY order_in_project, id DESC) AS position FROM tasks) AS r
+WHERE tasks.id = r.id;
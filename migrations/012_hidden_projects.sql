@@ -0,0 +1,48 @@
+-- Hidden projects (e.g. routine tasks) are left out of the default lists, the top task and the reports.
+-- tasks.hidden is a copy of the flag of the project of the task, kept up to date by the triggers below, so that
+-- the indexes over the visible tasks can be partial. Project 19 used to be hidden by aide itself.
+ALTER TABLE projects ADD COLUMN hidden INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE tasks ADD COLUMN hidden INTEGER NOT NULL DEFAULT 0;
+
+UPDATE projects SET hidden = 1 WHERE id = 19;
+UPDATE tasks SET hidden = 1 WHERE project = 19;
+
+DROP INDEX tasks_top_index;
+CREATE INDEX tasks_top_index ON tasks (priority DESC, id DESC, actionable_at)
+    WHERE status = 1 AND blocked_count = 0 AND hidden = 0;
+-- the default lists walk the visible open tasks in the listing order and stop after the first page
+CREATE INDEX tasks_visible_index ON tasks (priority DESC, id DESC, due_date) WHERE status = 1 AND hidden = 0;
+
+CREATE TRIGGER "main"."task_hidden_added"
+    AFTER INSERT
+    ON tasks
+BEGIN
+    UPDATE tasks SET hidden = coalesce((SELECT hidden FROM projects WHERE id = new.project), 0) WHERE id = new.id;
+END;
+
+CREATE TRIGGER "main"."task_hidden_moved"
+    AFTER UPDATE OF project
+    ON tasks
+    WHEN old.project IS NOT new.project
+BEGIN
+    UPDATE tasks SET hidden = coalesce((SELECT hidden FROM projects WHERE id = new.project), 0) WHERE id = new.id;
+END;
+
+CREATE TRIGGER "main"."project_hidden_changed"
+    AFTER UPDATE OF hidden
+    ON projects
+    WHEN old.hidden IS NOT new.hidden
+BEGIN
+    UPDATE tasks SET hidden = new.hidden WHERE project = new.id;
+END;
+
+-- hiding a project is synced; tasks.hidden follows on the peer through project_hidden_changed
+DROP TRIGGER sync_projects_update;
+CREATE TRIGGER "main"."sync_projects_update"
+    AFTER UPDATE OF name, priority, open, parent, hidden
+    ON projects
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('projects', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
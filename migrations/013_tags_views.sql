@@ -0,0 +1,29 @@
+-- Tags of tasks and the saved views of views.py; neither is synced.
+CREATE TABLE tags
+(
+    id INTEGER NOT NULL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE task_tags
+(
+    task INTEGER NOT NULL REFERENCES tasks,
+    tag INTEGER NOT NULL REFERENCES tags,
+    PRIMARY KEY (task, tag)
+) WITHOUT ROWID;
+
+-- tag:NAME looks up the tasks of a tag
+CREATE INDEX task_tags_tag_index ON task_tags (tag, task);
+
+CREATE TABLE views
+(
+    name TEXT NOT NULL PRIMARY KEY,
+    expression TEXT NOT NULL
+);
+
+CREATE TRIGGER "main"."task_tags_deleted"
+    AFTER DELETE
+    ON tasks
+BEGIN
+    DELETE FROM task_tags WHERE task = old.id;
+END;
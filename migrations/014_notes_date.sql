@@ -0,0 +1,2 @@
+-- The journal reads the notes by date (see notes.py).
+CREATE INDEX notes_date_index ON notes (date, id);
@@ -0,0 +1,50 @@
+-- The RPG progress is synced as the quests and awards of rpg_ledger rather than as the character and the skill
+-- values, which are recomputed from the ledger after a sync (see rpg_mod.recompute). Ledger rows are only ever
+-- inserted, so there is no update or delete trigger; the level-ups and skill-ups are derived, so only the quest
+-- and award rows (rpg_mod.QUEST, rpg_mod.AWARD) are logged.
+
+DROP TRIGGER sync_character_insert;
+DROP TRIGGER sync_character_update;
+DROP TRIGGER sync_character_delete;
+DELETE FROM changelog WHERE tbl = 'character';
+
+DROP TRIGGER sync_skills_update;
+CREATE TRIGGER "main"."sync_skills_update"
+    AFTER UPDATE OF name
+    ON skills
+    FOR EACH ROW WHEN (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL
+BEGIN
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    VALUES ('skills', new.uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node'));
+END;
+
+-- The character and the skills may have received progress from a peer that is not in the local ledger; the
+-- opening rows are taken again as in 008_rpg_opening.sql, so that recomputing keeps it
+DELETE FROM rpg_ledger WHERE event = 0;
+
+INSERT INTO rpg_ledger(time, event, ref, xp, gold)
+SELECT 0, 0, c.level - (SELECT count(*) FROM rpg_ledger WHERE event = 2),
+       c.xp - (SELECT coalesce(sum(xp), 0) FROM rpg_ledger WHERE event = 1),
+       c.gold - (SELECT coalesce(sum(gold), 0) FROM rpg_ledger)
+FROM character c WHERE c.id = 1;
+
+INSERT INTO rpg_ledger(time, event, ref, skill, xp)
+SELECT 0, 0, s.value - (SELECT count(*) FROM rpg_ledger WHERE event = 3 AND skill = s.id), s.id,
+       50 * s.value + s.xp - (SELECT coalesce(sum(xp), 0) FROM rpg_ledger WHERE event = 1 AND skill = s.id)
+FROM skills s;
+
+-- the rows written so far stay local: their progress is in the opening rows of the peers already
+ALTER TABLE rpg_ledger ADD COLUMN uuid TEXT;
+UPDATE rpg_ledger SET uuid = 'rpg_ledger:' || id;
+CREATE UNIQUE INDEX rpg_ledger_uuid_index ON rpg_ledger (uuid);
+
+CREATE TRIGGER "main"."sync_rpg_ledger_insert"
+    AFTER INSERT
+    ON rpg_ledger
+BEGIN
+    UPDATE rpg_ledger SET uuid = lower(hex(randomblob(16))) WHERE id = new.id AND uuid IS NULL;
+    INSERT INTO changelog(tbl, uuid, op, modified, node)
+    SELECT 'rpg_ledger', uuid, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT value FROM sync_meta WHERE key = 'node')
+    FROM rpg_ledger WHERE id = new.id AND new.event IN (1, 4)
+                      AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL;
+END;
@@ -0,0 +1,31 @@
+-- The next occurrence of a repeated task takes the place of the closed one in the order of its project, rather
+-- than order_in_project 0, which would make core.move_tasks renumber the project.
+DROP TRIGGER repeat_task;
+DROP TRIGGER repeat_task_workdays;
+
+CREATE TRIGGER "main"."repeat_task"
+    AFTER UPDATE
+    ON tasks
+    FOR EACH ROW WHEN (old.status = 1 AND new.status = 0 AND old.repeat_period is not null AND old.repeat_period != 'workdays' AND old.repeat_period != ''
+                       AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL)
+BEGIN
+    INSERT INTO tasks(name, priority, due_time, weight, repeat_period, due_date, quest, project, order_in_project)
+    VALUES (old.name, old.priority, old.due_time, old.weight, old.repeat_period, date(old.due_date,old.repeat_period), old.quest, old.project,
+            old.order_in_project);
+END;
+
+CREATE TRIGGER "main"."repeat_task_workdays"
+    AFTER UPDATE
+    ON tasks
+    FOR EACH ROW WHEN (old.status = 1 AND new.status = 0 AND old.repeat_period is not null AND old.repeat_period == 'workdays'
+                       AND (SELECT value FROM sync_meta WHERE key = 'applying') IS NULL)
+BEGIN
+    INSERT INTO tasks(name, priority, due_time, weight, repeat_period, quest, project, due_date, order_in_project)
+    VALUES (old.name, old.priority, old.due_time, old.weight, old.repeat_period, old.quest, old.project,
+            CASE strftime("%w", date(old.due_date))
+                WHEN '5' THEN date(old.due_date,'weekday 1')
+                ELSE date(old.due_date,'+1 days')
+            END,
+            old.order_in_project
+           );
+END;
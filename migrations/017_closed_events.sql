@@ -0,0 +1,7 @@
+-- The tasks closed before the history (003_task_events.sql) have no close event, so the journal (see notes.py)
+-- would leave them out. Like the plots, they are taken as closed on their due date; tasks without one are not
+-- placed on any day.
+INSERT INTO task_events(task, time, event)
+SELECT id, CAST(strftime('%s', due_date) AS INTEGER), 8 FROM tasks
+WHERE status = 0 AND due_date IS NOT NULL AND id NOT IN (SELECT task FROM task_events WHERE event = 8)
+ORDER BY due_date, id;
@@ -0,0 +1,119 @@
+"""
+Day notes and the journal.
+
+The journal lists, day by day, the notes of the day (see core.add_note) and the tasks closed that day. It is read
+as a merge of two streams sorted by date: the notes through notes_date_index, and the close events of
+task_events (see history.py) through task_events_time_index. Either stream is read by a single query, and the
+days are assembled as the rows arrive, so a journal of any length costs two index range scans. Like the due dates
+and the default date of a note (date('now')), the day a task was closed on is taken in UTC; the tasks closed before
+the history was recorded are placed on their due date (see migrations/017_closed_events.sql).
+"""
+import calendar
+import datetime
+import heapq
+import itertools
+import sqlite3
+
+import history
+
+DEFAULT_DAYS = 7
+
+
+def note_stream(cursor: sqlite3.Cursor, start: str = None, end: str = None, reverse: bool = False):
+    # (date, kind, id, text) of the notes between the dates, inclusive
+    conditions = []
+    params = []
+    if start:
+        conditions.append("date >= ?")
+        params.append(start)
+    if end:
+        conditions.append("date <= ?")
+        params.append(end)
+    order = " DESC" if reverse else ""
+    cursor.execute("SELECT date, 0, id, text FROM notes" +
+                   (" WHERE " + " AND ".join(conditions) if conditions else "") +
+                   " ORDER BY date" + order + ", id" + order, params)
+    return cursor
+
+
+def closed_stream(cursor: sqlite3.Cursor, start: str = None, end: str = None, reverse: bool = False):
+    # (date, kind, id, name) of the tasks closed between the dates, inclusive; deleted tasks are left out. A task
+    # closed more than once is listed on the day of its last close, a reopened one not at all
+    conditions = ["e.event = ?", "NOT EXISTS (SELECT 1 FROM task_events l WHERE l.task = e.task AND l.id > e.id "
+                                 "AND l.event IN (?, ?))"]
+    params = [history.CLOSED, history.CLOSED, history.REOPENED]
+    if start:
+        conditions.append("e.time >= CAST(strftime('%s', ?) AS INTEGER)")
+        params.append(start)
+    if end:
+        conditions.append("e.time < CAST(strftime('%s', ?, '+1 day') AS INTEGER)")
+        params.append(end)
+    order = " DESC" if reverse else ""
+    cursor.execute("SELECT date(e.time, 'unixepoch'), 1, t.id, t.name FROM task_events e "
+                   "JOIN tasks t ON t.id = e.task WHERE " + " AND ".join(conditions) +
+                   " ORDER BY e.time" + order + ", e.id" + order, params)
+    return cursor
+
+
+def journal(cursor: sqlite3.Cursor, start: str = None, end: str = None, reverse: bool = False):
+    """
+    The days between start and end (YYYY-MM-DD, inclusive) that have notes or closed tasks, one
+    {"date", "notes", "closed"} at a time; the latest day first if `reverse`
+    """
+    # the streams are read at the same time, so each gets a cursor of its own
+    notes = note_stream(cursor.connection.cursor(), start, end, reverse)
+    closed = closed_stream(cursor.connection.cursor(), start, end, reverse)
+    entries = heapq.merge(notes, closed, key=lambda e: e[0], reverse=reverse)
+    for date, day in itertools.groupby(entries, key=lambda e: e[0]):
+        day = list(day)[::-1] if reverse else list(day)
+        yield {
+            "date": date,
+            "notes": [{"id": e[2], "text": e[3]} for e in day if e[1] == 0],
+            "closed": [{"id": e[2], "name": e[3]} for e in day if e[1] == 1],
+        }
+
+
+def get_journal(cursor: sqlite3.Cursor, start: str = None, end: str = None, reverse: bool = False):
+    return list(journal(cursor, start, end, reverse))
+
+
+def get_first_day(cursor: sqlite3.Cursor):
+    """
+    The earliest day of the journal, or None if it is empty
+    """
+    cursor.execute("SELECT min(date) FROM notes")
+    first_note = cursor.fetchone()[0]
+    cursor.execute("SELECT date(min(time), 'unixepoch') FROM task_events WHERE event = ?",
+                   (history.CLOSED,))
+    first_closed = cursor.fetchone()[0]
+    return min(filter(None, (first_note, first_closed)), default=None)
+
+
+def month_ranges(year: int):
+    # (first day, last day) of every month of the year
+    return [("%04d-%02d-01" % (year, m), "%04d-%02d-%02d" % (year, m, calendar.monthrange(year, m)[1]))
+            for m in range(1, 13)]
+
+
+def export_markdown(cursor: sqlite3.Cursor, year: int, out):
+    """
+    Write the journal of a year to the file object `out` as Markdown, a day at a time; returns the number of days
+    """
+    return write_markdown(year, journal(cursor, "%04d-01-01" % year, "%04d-12-31" % year), out)
+
+
+def write_markdown(year: int, days, out):
+    """
+    Write the days of the journal of a year (e.g. from journal() or get_journal()) to `out` as Markdown
+    """
+    out.write("# Journal %d\n" % year)
+    count = 0
+    for day in days:
+        date = datetime.date.fromisoformat(day["date"])
+        out.write("\n## %s, %s\n\n" % (day["date"], date.strftime("%A")))
+        for note in day["notes"]:
+            out.write("- " + note["text"].strip().replace("\n", "\n  ") + "\n")
+        for task in day["closed"]:
+            out.write("- [x] %s\n" % task["name"])
+        count += 1
+    return count
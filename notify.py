@@ -0,0 +1,152 @@
+"""
+Post-commit notifications.
+
+Changes to the tasks are reported with post(); a background thread coalesces bursts of events and fires
+the configured hooks once per burst. Hooks are listed in ~/.aide.conf:
+
+    "hooks": [
+        {"type": "i3blocks", "signal": 10},
+        {"type": "status_file", "path": "~/.cache/aide/status"},  # see status.py
+        {"type": "desktop", "events": ["close"]},
+        {"type": "command", "command": "~/bin/on-aide-change.sh"}
+    ],
+    "hooks_delay": 0.3
+
+Without the "hooks" key only i3blocks is signalled. Nothing is fired until configure() is called,
+so library and batch use of core does not spawn processes.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+
+DEFAULT_HOOKS = [{"type": "i3blocks", "signal": 10}]
+DEFAULT_DELAY = 0.3  # seconds of quiet after the last event before the hooks fire
+
+_hooks = []
+_delay = DEFAULT_DELAY
+_db_path = None
+_pending = []
+_condition = threading.Condition()
+_fire_lock = threading.Lock()
+_worker = None
+
+
+def i3blocks_hook(options: dict, events: list):
+    subprocess.run(["pkill", "-SIGRTMIN+%d" % options.get("signal", 10), "i3blocks"],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def status_file_hook(options: dict, events: list):
+    import status  # status imports core, which imports this module
+
+    # the hooks run in a separate thread, so they cannot share the connection of the main one
+    db = sqlite3.connect(_db_path)
+    try:
+        status.write_snapshot(db.cursor(), options.get("path", status.DEFAULT_PATH))
+    finally:
+        db.close()
+
+
+def desktop_hook(options: dict, events: list):
+    if len(events) == 1:
+        e = events[0]
+        message = "{}: {}".format(e["event"].capitalize(), e.get("name") or e.get("id", ""))
+    else:
+        message = "{} changes".format(len(events))
+    subprocess.run(["notify-send", options.get("title", "Aide"), message],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def command_hook(options: dict, events: list):
+    # the events are passed as JSON on stdin
+    env = dict(os.environ, AIDE_EVENTS=",".join(sorted({e["event"] for e in events})))
+    subprocess.run(os.path.expanduser(options["command"]), shell=True, env=env, input=json.dumps(events).encode(),
+                   stdout=subprocess.DEVNULL)
+
+
+HOOK_TYPES = {
+    "i3blocks": i3blocks_hook,
+    "status_file": status_file_hook,
+    "desktop": desktop_hook,
+    "command": command_hook,
+}
+
+
+def configure(config: dict):
+    global _hooks, _delay, _db_path
+    hooks = config.get("hooks", DEFAULT_HOOKS)
+    for hook in hooks:
+        if hook.get("type") not in HOOK_TYPES:
+            raise ValueError("Unknown hook type: %s" % hook.get("type"))
+    _hooks = hooks
+    _delay = config.get("hooks_delay", DEFAULT_DELAY)
+    _db_path = os.path.expanduser(config["db_path"]) if config.get("db_path") else None
+
+
+def post(event: str, **details):
+    """
+    Report a committed change. Returns immediately; the hooks run later in a background thread.
+    """
+    global _worker
+    if not _hooks:
+        return
+
+    details["event"] = event
+    details["time"] = datetime.datetime.now().isoformat(timespec="seconds")
+    with _condition:
+        _pending.append(details)
+        _condition.notify()
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="aide-notify", daemon=True)
+            _worker.start()
+            atexit.register(flush)
+
+
+def fire(events: list):
+    with _fire_lock:
+        for hook in _hooks:
+            selected = [e for e in events if "events" not in hook or e["event"] in hook["events"]]
+            if not selected:
+                continue
+            try:
+                HOOK_TYPES[hook["type"]](hook, selected)
+            except (OSError, KeyError, subprocess.SubprocessError, sqlite3.Error) as e:
+                logging.warning("Hook %s failed: %s", hook["type"], e)
+
+
+def _take_burst():
+    # wait until no new event arrived for _delay seconds (but not longer than 10 delays in total),
+    # then take the whole burst
+    with _condition:
+        while not _pending:
+            _condition.wait()
+        for _ in range(10):
+            count = len(_pending)
+            _condition.wait(_delay)
+            if len(_pending) == count:
+                break
+        events = _pending[:]
+        _pending.clear()
+    return events
+
+
+def _run():
+    while True:
+        events = _take_burst()
+        if events:
+            fire(events)
+
+
+def flush():
+    """
+    Fire the pending events right away and wait for the hooks that are already running; used at exit
+    """
+    with _condition:
+        events = _pending[:]
+        _pending.clear()
+    fire(events)
@@ -0,0 +1,132 @@
+"""
+Several Aide DBs opened at once.
+
+Named profiles are listed in ~/.aide.conf; every profile may override any top-level setting:
+
+    "profiles": {
+        "personal": {"db_path": "/var/lib/aide/tasks.db"},
+        "work": {"db_path": "~/work/tasks.db"},
+        "team": {"db_path": "/mnt/team/tasks.db"}
+    },
+    "default_profile": "personal"
+
+Writes go through a separate connection per profile, opened on first use. Cross-profile queries run
+on one more connection with all the DBs attached, so a report over all profiles is a single query.
+Without "profiles", the pool has a single profile named "default" that uses db_path.
+"""
+import os
+import re
+import sqlite3
+
+import core
+
+MAX_ATTACHED = 10  # SQLITE_MAX_ATTACHED in the default builds
+
+
+def get_profiles(config: dict) -> dict:
+    """
+    Profile name -> config of the profile
+    """
+    if not config.get("profiles"):
+        return {"default": config}
+
+    profiles = {}
+    for name in config["profiles"]:
+        if not re.match(r"[A-Za-z_]\w*$", name) or name.lower() in ("main", "temp"):
+            raise ValueError("Invalid profile name: %s" % name)
+        profiles[name] = core.profile_config(config, name)
+    return profiles
+
+
+class Pool:
+    def __init__(self, config: dict, profile_sql: bool = False):
+        self.profiles = get_profiles(config)
+        self.profile_sql = profile_sql
+        self.connections = {}
+        self.reader = None
+
+    def get(self, name: str) -> sqlite3.Connection:
+        """
+        The connection to the DB of the profile `name`; changes to that DB must go through it
+        """
+        if name not in self.profiles:
+            raise ValueError("Unknown profile: %s" % name)
+        if name not in self.connections:
+            self.connections[name] = core.open_database(self.profiles[name], self.profile_sql)
+        return self.connections[name]
+
+    def attached(self) -> sqlite3.Connection:
+        """
+        A read-only view of all the profiles: the tasks of the profile `name` are in "name".tasks
+        """
+        if self.reader is not None:
+            return self.reader
+        if len(self.profiles) > MAX_ATTACHED:
+            raise ValueError("At most %d profiles can be queried together" % MAX_ATTACHED)
+
+        # the attached DBs are not migrated, so open every DB on its own first
+        for name in self.profiles:
+            self.get(name)
+
+        self.reader = sqlite3.connect(":memory:")
+        for name, profile in self.profiles.items():
+            self.reader.execute("ATTACH DATABASE ? AS " + name, (os.path.expanduser(profile["db_path"]),))
+        self.reader.execute("PRAGMA query_only = 1")
+        return self.reader
+
+    def get_top_task(self):
+        """
+        The top task across all the profiles, or None. The task has an additional "profile" key
+        """
+        # the top task of every profile is found through its own tasks_top_index
+        queries = []
+        for name in self.profiles:
+            queries.append(
+                "SELECT * FROM (SELECT '" + name + "', id, name, priority, " + core.utc_to_local("due_time") +
+                ", status, weight, due_date, project, order_in_project, note FROM " + name +
+                ".tasks INDEXED BY tasks_top_index "
+                "WHERE status=1 AND blocked_count=0 AND hidden=0 AND actionable_at < datetime('now') "
+                "ORDER BY priority DESC, id DESC LIMIT 1)")
+        cursor = self.attached().cursor()
+        cursor.execute(" UNION ALL ".join(queries) + " ORDER BY 4 DESC LIMIT 1")
+        task = cursor.fetchone()
+        if not task:
+            return None
+
+        result = core.task_to_dict(task[1:])
+        result["profile"] = task[0]
+        return result
+
+    def list_tasks(self, *args, **kwargs):
+        """
+        core.list_tasks() on every profile; the tasks have an additional "profile" key
+        """
+        tasks = []
+        for name in self.profiles:
+            for task in core.list_tasks(self.get(name).cursor(), *args, **kwargs):
+                tasks.append(dict(task, profile=name))
+        return tasks
+
+    def get_total_weights(self):
+        """
+        Today's total and closed weight of every profile
+        """
+        queries = []
+        for name in self.profiles:
+            queries.append("SELECT '" + name + "', sum(weight), sum(CASE WHEN status=0 THEN weight ELSE 0 END) "
+                           "FROM " + name + ".tasks WHERE due_date=current_date AND hidden=0")
+        cursor = self.attached().cursor()
+        cursor.execute(" UNION ALL ".join(queries))
+        return [{
+            "profile": w[0],
+            "total": float(w[1] or 0),
+            "closed": float(w[2] or 0),
+        } for w in cursor.fetchall()]
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        for db in self.connections.values():
+            db.close()
+        self.connections = {}
@@ -0,0 +1,206 @@
+"""
+Query profiler for the shared DB connection.
+
+Records every SQL statement issued by core, project_mod and rpg_mod together with its duration,
+the number of returned rows and the calling function.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import sqlite3
+import sys
+import time
+
+PROFILED_MODULES = ("core", "project_mod", "rpg_mod")
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def find_caller():
+    # the first frame from one of the profiled modules; otherwise, the first frame outside of this one
+    frame = sys._getframe(2)
+    fallback = None
+    while frame:
+        module = frame.f_globals.get("__name__", "")
+        if module in PROFILED_MODULES:
+            return module + "." + frame.f_code.co_name
+        if fallback is None and module != __name__:
+            fallback = module + "." + frame.f_code.co_name
+        frame = frame.f_back
+    return fallback or "?"
+
+
+class Profiler:
+    def __init__(self, log_path: str = None, slow_ms: float = 0, summary: bool = True,
+                 max_bytes: int = 1024 * 1024, backup_count: int = 3):
+        self.records = []
+        self.current = None
+        self.pending = None
+        self.slow_ms = slow_ms
+        self.summary = summary
+
+        self.log = None
+        if log_path:
+            self.log = logging.getLogger("aide.profile")
+            self.log.propagate = False
+            self.log.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(os.path.expanduser(log_path), maxBytes=max_bytes,
+                                                           backupCount=backup_count)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.log.addHandler(handler)
+
+    def start(self, sql: str):
+        self.current = {
+            "sql": " ".join(sql.split()),
+            "caller": find_caller(),
+            "duration": 0.0,
+            "rows": 0,
+            "triggers": 0,
+            "expanded": None,
+        }
+        self.records.append(self.current)
+        return self.current
+
+    def finish(self, record: dict):
+        if self.current is record:
+            self.current = None
+
+        # rows are fetched after the statement has finished, so a record is logged only when the next one finishes
+        self.write_log()
+        self.pending = record
+
+    def write_log(self):
+        record = self.pending
+        self.pending = None
+        if self.log and record and record["duration"] * 1000 >= self.slow_ms:
+            self.log.info("%.3f ms | %d rows | %d triggers | %s | %s", record["duration"] * 1000, record["rows"],
+                          record["triggers"], record["caller"], record["expanded"] or record["sql"])
+
+    def trace(self, statement: str):
+        # called by SQLite for every executed statement, including the statements of the fired triggers
+        current = self.current
+        if current is None or (statement.startswith(TRANSACTION_STATEMENTS) and
+                               not current["sql"].startswith(TRANSACTION_STATEMENTS)):
+            # not issued through a profiled cursor, e.g. the implicit BEGIN
+            self.finish(self.start(statement))
+            self.current = current
+        elif current["expanded"] is None:
+            current["expanded"] = statement
+        else:
+            current["triggers"] += 1
+
+    def get_summary(self):
+        """
+        Aggregate the records by (caller, statement); the most expensive first
+        """
+        groups = {}
+        for r in self.records:
+            g = groups.setdefault((r["caller"], r["sql"]), {
+                "caller": r["caller"], "sql": r["sql"], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0
+            })
+            g["count"] += 1
+            g["total_ms"] += r["duration"] * 1000
+            g["max_ms"] = max(g["max_ms"], r["duration"] * 1000)
+            g["rows"] += r["rows"]
+        return sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+
+    def print_summary(self, file=sys.stderr, limit: int = 20):
+        summary = self.get_summary()
+        if not summary:
+            return
+        total = sum(g["total_ms"] for g in summary)
+        print("\nSQL profile: {} statements, {:.2f} ms".format(len(self.records), total), file=file)
+        print("{:>9} | {:>5} | {:>8} | {:>6} | {:<28} | {}".format(
+            "total ms", "calls", "max ms", "rows", "caller", "statement"), file=file)
+        for g in summary[:limit]:
+            print("{:>9.3f} | {:>5} | {:>8.3f} | {:>6} | {:<28} | {}".format(
+                g["total_ms"], g["count"], g["max_ms"], g["rows"], g["caller"], g["sql"][:80]), file=file)
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    record = None
+
+    def _timed(self, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.record["duration"] += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        profiler = self.connection.profiler
+        self.record = profiler.start(sql)
+        try:
+            return self._timed(super().execute, sql, parameters)
+        finally:
+            profiler.finish(self.record)
+
+    def executemany(self, sql, seq_of_parameters):
+        profiler = self.connection.profiler
+        self.record = profiler.start(sql)
+        try:
+            return self._timed(super().executemany, sql, seq_of_parameters)
+        finally:
+            profiler.finish(self.record)
+
+    def executescript(self, sql_script):
+        profiler = self.connection.profiler
+        self.record = profiler.start(sql_script)
+        try:
+            return self._timed(super().executescript, sql_script)
+        finally:
+            profiler.finish(self.record)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is not None:
+            self.record["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, size if size is not None else self.arraysize)
+        self.record["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self.record["rows"] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        self.record["rows"] += 1
+        return row
+
+
+class ProfilingConnection(sqlite3.Connection):
+    profiler = None
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        record = self.profiler.start("COMMIT")
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            record["duration"] += time.perf_counter() - start
+            self.profiler.finish(record)
+
+
+def connect(database_file: str, options: dict) -> ProfilingConnection:
+    """
+    Open a profiled connection. Options (the "profile" key in ~/.aide.conf):
+        log:     path of a rotating log with every statement
+        slow_ms: log only the statements slower than this
+        summary: print a summary at exit [default: true]
+    """
+    db = sqlite3.connect(database_file, factory=ProfilingConnection)
+    db.profiler = Profiler(options.get("log"), options.get("slow_ms", 0), options.get("summary", True))
+    db.set_trace_callback(db.profiler.trace)
+
+    atexit.register(db.profiler.write_log)
+    if db.profiler.summary:
+        atexit.register(db.profiler.print_summary)
+    return db
@@ -2,30 +2,74 @@ import sqlite3
 import core
 
 
-def add_project(db, cursor: sqlite3.Cursor, name: str, priority: int):
-    cursor.execute("INSERT INTO projects(name, priority) VALUES (?, ?)", (name, priority))
+def add_project(db, cursor: sqlite3.Cursor, name: str, priority: int, parent: int = None):
+    if parent is not None:
+        get_project_name(cursor, parent)
+    cursor.execute("INSERT INTO projects(name, priority, parent) VALUES (?, ?, ?)", (name, priority, parent))
+    db.commit()
+
+
+def get_project_name(cursor: sqlite3.Cursor, id_: int) -> str:
+    cursor.execute("SELECT name FROM projects WHERE id = ?", (id_,))
+    project = cursor.fetchone()
+    if not project:
+        raise ValueError("No project %s" % id_)
+    return project[0]
+
+
+def move_project(db, cursor: sqlite3.Cursor, id_: int, parent: int = None):
+    """
+    Make the project a sub-project of `parent`, or a top-level one if it is None
+    """
+    get_project_name(cursor, id_)
+    if parent is not None:
+        get_project_name(cursor, parent)
+        cursor.execute("SELECT 1 FROM project_tree WHERE ancestor = ? AND descendant = ?", (id_, parent))
+        if cursor.fetchone():
+            raise ValueError("Project %s is inside project %s" % (parent, id_))
+    cursor.execute("UPDATE projects SET parent = ? WHERE id = ?", (parent, id_))
     db.commit()
 
 
 def list_projects(cursor: sqlite3.Cursor, open_projects: bool = None):
+    """
+    The projects, by priority. With `open_projects`, only the open (or closed) projects that have tasks in their
+    subtree, with the rollups of the tasks of the subtree
+    """
     if open_projects is None:
-        query = "SELECT id, name, priority, 0 FROM projects ORDER BY priority DESC"
-    else:
-        query = "SELECT projects.id, projects.name, projects.priority, sum(tasks.weight) FROM projects " \
-                "INNER JOIN tasks ON tasks.project = projects.id " \
-                "WHERE open=%d GROUP BY tasks.project ORDER BY projects.priority DESC" \
-                % (int(open_projects))
-    cursor.execute(query)
-    projects = cursor.fetchall()
+        cursor.execute("SELECT id, name, priority, 0, parent, hidden FROM projects ORDER BY priority DESC")
+        return [{
+            "id": p[0],
+            "name": p[1],
+            "priority": p[2],
+            "total": p[3],
+            "parent": p[4],
+            "hidden": p[5],
+        } for p in cursor.fetchall()]
+
+    # project_stats is kept up to date by triggers on tasks (migrations/009_project_stats.sql), project_tree
+    # holds the subtree of every project (migrations/010_project_tree.sql)
+    cursor.execute("SELECT p.id, p.name, p.priority, sum(s.total_weight), sum(s.open_count), sum(s.closed_count), "
+                   "sum(s.closed_weight), max(s.last_activity), p.parent, p.hidden FROM projects p "
+                   "JOIN project_tree t ON t.ancestor = p.id JOIN project_stats s ON s.project = t.descendant "
+                   "WHERE p.open = ? GROUP BY p.id HAVING sum(s.open_count + s.closed_count) > 0 "
+                   "ORDER BY p.priority DESC", (int(open_projects),))
     return [{
         "id": p[0],
         "name": p[1],
         "priority": p[2],
-        "total": p[3]
-    } for p in projects]
+        "total": p[3],
+        "open_count": p[4],
+        "closed_count": p[5],
+        "closed": p[6],
+        "last_activity": p[7],
+        "parent": p[8],
+        "hidden": p[9],
+    } for p in cursor.fetchall()]
 
 
-def modify_project(db, cursor: sqlite3.Cursor, id_: str, name: str = None, priority: int = None):
+def modify_project(db, cursor: sqlite3.Cursor, id_: str, name: str = None, priority: int = None,
+                   hidden: bool = None):
     setters = []
     query_arguments = []
 
@@ -37,7 +81,12 @@ def modify_project(db, cursor: sqlite3.Cursor, id_: str, name: str = None, prior
         setters.append("priority=?")
         query_arguments.append(priority)
 
-    query = "UPDATE projects SET " + " AND ".join(setters) + " WHERE id = ?"
+    # the tasks of a hidden project are not in the default lists, the top task and the reports
+    if hidden is not None:
+        setters.append("hidden=?")
+        query_arguments.append(int(hidden))
+
+    query = "UPDATE projects SET " + ", ".join(setters) + " WHERE id = ?"
     query_arguments.append(id_)
 
     cursor.execute(query, query_arguments)
@@ -45,9 +94,46 @@ def modify_project(db, cursor: sqlite3.Cursor, id_: str, name: str = None, prior
 
 
 def get_project_progress(cursor: sqlite3.Cursor, id_: int):
-    cursor.execute("SELECT SUM(weight) FROM tasks WHERE project=?", (id_,))
-    total = cursor.fetchone()[0]
+    """
+    (total weight, closed weight) of the tasks of the project and its sub-projects; (None, None) if there are none
+    """
+    cursor.execute("SELECT sum(s.total_weight), sum(s.closed_weight), sum(s.open_count + s.closed_count) "
+                   "FROM project_tree t JOIN project_stats s ON s.project = t.descendant WHERE t.ancestor = ?", (id_,))
+    total, closed, count = cursor.fetchone()
+    return (total, closed) if count else (None, None)
 
-    cursor.execute("SELECT SUM(weight) FROM tasks WHERE project=? AND status = 0", (id_,))
-    closed = cursor.fetchone()[0]
-    return total, closed
+
+# the rollups computed from the tasks, as in project_stats
+STATS_QUERY = "SELECT project, sum(status != 0), sum(status = 0), sum(weight), " \
+              "sum(CASE WHEN status = 0 THEN weight ELSE 0 END) FROM tasks GROUP BY project"
+
+
+def check_stats(cursor: sqlite3.Cursor):
+    """
+    The projects whose rollups differ from their tasks: a list of (project, stored, actual)
+    """
+    cursor.execute(STATS_QUERY)
+    actual = {s[0]: s[1:] for s in cursor.fetchall()}
+    cursor.execute("SELECT project, open_count, closed_count, total_weight, closed_weight FROM project_stats")
+    stored = {s[0]: s[1:] for s in cursor.fetchall()}
+
+    mismatches = []
+    for project in sorted(set(actual) | set(stored)):
+        a = actual.get(project, (0, 0, 0.0, 0.0))
+        s = stored.get(project, (0, 0, 0.0, 0.0))
+        # the weights are summed up incrementally, so they may be off by rounding
+        if a[:2] != s[:2] or abs(a[2] - s[2]) > 1e-6 or abs(a[3] - s[3]) > 1e-6:
+            mismatches.append((project, s, a))
+    return mismatches
+
+
+def rebuild_stats(db, cursor: sqlite3.Cursor):
+    """
+    Recompute the rollups of all the projects from their tasks; the last activity dates are kept
+    """
+    cursor.execute("UPDATE project_stats SET open_count = 0, closed_count = 0, total_weight = 0, closed_weight = 0")
+    cursor.execute("INSERT INTO project_stats(project, open_count, closed_count, total_weight, closed_weight) " +
+                   STATS_QUERY + " ON CONFLICT (project) DO UPDATE SET open_count = excluded.open_count, "
+                   "closed_count = excluded.closed_count, total_weight = excluded.total_weight, "
+                   "closed_weight = excluded.closed_weight")
+    db.commit()
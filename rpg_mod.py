@@ -1,4 +1,111 @@
+"""
+Quests, awards and the character.
+
+The progression is set by rules, which can be changed in ~/.aide.conf (the missing keys keep the defaults):
+
+    "rpg_rules": {
+        "first_level_xp": 100,   # the XP above which level 1 is left
+        "level_xp": [50, 5],     # every next level takes 50 + 5 * level more XP
+        "level_gold": 100,       # gold for every level
+        "skill_xp": [50, 0],     # a skill level takes 50 + 0 * value XP
+        "quest_gold": [10, 2]    # a quest gives (10 - willingness) // 2 gold per unit of its time
+    }
+
+The rules are compiled once by configure() into the cumulative XP of the levels, so the level of any XP is a
+binary search. Every XP and gold change is recorded in rpg_ledger, so after a change of the rules the character
+and the skills are recomputed from the ledger by rebuild(). Sync exchanges the quest and award rows of the ledger
+and recomputes the character in the same way.
+"""
+import bisect
+import collections
 import sqlite3
+import time
+
+import notify
+import schema
+
+DEFAULT_RULES = {
+    "first_level_xp": 100,
+    "level_xp": [50, 5],
+    "level_gold": 100,
+    "skill_xp": [50, 0],
+    "quest_gold": [10, 2],
+}
+PRECOMPUTED_LEVELS = 200
+
+# events of rpg_ledger
+OPENING = 0  # the progress made before the ledger, see migrations/008_rpg_opening.sql
+QUEST = 1
+LEVEL_UP = 2
+SKILL_UP = 3
+AWARD = 4
+
+
+class Rules:
+    """
+    Compiled progression rules: thresholds[i] is the total XP above which level i + 1 is left; skill_totals[v] is the
+    XP a skill takes to reach the value v. Both tables are extended on demand
+    """
+
+    def __init__(self, rules: dict):
+        unknown = set(rules) - set(DEFAULT_RULES)
+        if unknown:
+            raise ValueError("Unknown RPG rules: " + ", ".join(sorted(unknown)))
+        rules = dict(DEFAULT_RULES, **rules)
+        self.level_base, self.level_step = (int(x) for x in rules["level_xp"])
+        self.skill_base, self.skill_step = (int(x) for x in rules["skill_xp"])
+        self.gold_base, self.gold_divisor = (int(x) for x in rules["quest_gold"])
+        self.level_gold = int(rules["level_gold"])
+        if self.level_base <= 0 or self.level_step < 0 or self.skill_base <= 0 or self.skill_step < 0:
+            raise ValueError("Every level must take more XP than the previous one")
+        if self.gold_divisor <= 0:
+            raise ValueError("The divisor of quest_gold must be positive")
+
+        self.thresholds = [int(rules["first_level_xp"])]
+        self.skill_totals = [0]
+        self.extend(PRECOMPUTED_LEVELS)
+
+    def extend(self, levels: int):
+        for _ in range(levels):
+            self.thresholds.append(self.thresholds[-1] + self.level_base + self.level_step * len(self.thresholds))
+            value = len(self.skill_totals) - 1
+            self.skill_totals.append(self.skill_totals[-1] + self.skill_base + self.skill_step * value)
+
+    def level(self, xp: int) -> int:
+        while self.thresholds[-1] < xp:
+            self.extend(len(self.thresholds))
+        return 1 + bisect.bisect_left(self.thresholds, xp)
+
+    def next_level_xp(self, level: int) -> int:
+        while len(self.thresholds) < level:
+            self.extend(len(self.thresholds))
+        return self.thresholds[level - 1]
+
+    def skill(self, total: int):
+        """
+        (value, XP made on the value) of a skill with `total` XP
+        """
+        while self.skill_totals[-1] < total:
+            self.extend(len(self.skill_totals))
+        # a value is reached with more XP than it takes
+        value = bisect.bisect_left(self.skill_totals, total) - 1 if total > 0 else 0
+        return value, total - self.skill_totals[value]
+
+    def skill_total(self, value: int, xp: int) -> int:
+        while len(self.skill_totals) <= value:
+            self.extend(len(self.skill_totals))
+        return self.skill_totals[value] + xp
+
+    def quest_gold(self, willingness, time_) -> int:
+        return ((self.gold_base - int(willingness)) // self.gold_divisor) * int(time_)
+
+
+_rules = Rules({})
+
+
+def configure(config: dict):
+    global _rules
+    _rules = Rules(config.get("rpg_rules", {}))
 
 
 def add_quest(db, cursor: sqlite3.Cursor, name: str, xp: int, gold_reward: int, trained_skill: int):
@@ -20,45 +127,107 @@ def get_quests(cursor: sqlite3.Cursor):
 
 
 def close_quest(db, cursor: sqlite3.Cursor, id_: str):
-    cursor.execute("SELECT name, xp, willingness, trained_skill, time FROM quests WHERE id = ?", (id_,))
-    quest = cursor.fetchone()
-    if not quest:
-        return
-
-    # level up, if necessary
-    cursor.execute("SELECT xp, level, xp_for_next_level FROM character WHERE id = 1")
-    character = cursor.fetchone()
-
-    current_xp = character[0] + quest[1]
-    levelup = False
-    if current_xp > character[2]:
-        levelup = True
-        next_level = character[2] + 50 + character[1] * 5
-        cursor.execute(
-            "UPDATE character SET level = level + 1, xp_for_next_level = ? WHERE id = 1", (next_level,))
-
-    # update xp and gold
-    will = int(quest[2])
-    time = int(quest[4])
-    gold = ((10 - will) // 2) * time
-    if levelup:
-        gold += 100
-    cursor.execute("UPDATE character SET xp = xp + ?, gold = gold + ? WHERE id = 1", (quest[1], gold))
-
-    # increase the skill
-    cursor.execute("SELECT name, value, xp FROM skills WHERE id = ?", (quest[3],))
-    skill = cursor.fetchone()
-
-    skill_xp = skill[2] + quest[1]
-    skill_increased = False
-    if skill_xp > 50:
-        skill_increased = True
-        cursor.execute("UPDATE skills SET value = value + 1, xp = ? WHERE id = ?", (skill_xp - 50, quest[3]))
-    else:
-        cursor.execute("UPDATE skills SET xp = ? WHERE id = ?", (skill_xp, quest[3]))
+    """
+    Complete one quest; returns (name, leveled up, skill increased, skill name, skill level), or None
+    """
+    summary = close_quests(db, cursor, [id_])
+    if not summary["quests"]:
+        return None
+    skill = summary["skills"][0] if summary["skills"] else {"name": "", "value": 0, "levels": 0}
+    return summary["quests"][0], summary["levels"] > 0, skill["levels"] > 0, skill["name"], str(skill["value"])
+
+
+def close_quests(db, cursor: sqlite3.Cursor, ids: list, commit: bool = True):
+    """
+    Complete the quests `ids` (a quest may be listed several times) in one transaction and return a summary:
+    {"quests": names, "xp", "gold", "levels": levels gained, "level", "xp_for_next_level",
+    "skills": [{"id", "name", "value", "levels", "xp"}]}
+    """
+    if not ids:
+        return resolve_quests(cursor, ids)[0]
+
+    # the character is read and written in the same transaction, so that concurrent completions add up
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    summary, ledger = resolve_quests(cursor, ids)
+    cursor.execute("UPDATE character SET xp = xp + ?, gold = gold + ?, level = ?, xp_for_next_level = ? "
+                   "WHERE id = 1", (summary["xp"], summary["gold"], summary["level"], summary["xp_for_next_level"]))
+    cursor.executemany("UPDATE skills SET value = ?, xp = ? WHERE id = ?",
+                       [(s["value"], s["xp"], s["id"]) for s in summary["skills"]])
+    cursor.executemany("INSERT INTO rpg_ledger(time, event, ref, skill, xp, gold) VALUES (?, ?, ?, ?, ?, ?)", ledger)
+
+    character = read_character(cursor)
+    if commit:
+        db.commit()
+        cache_character(cursor, character)
+    quests = [row[2] for row in ledger if row[1] == QUEST]
+    for id_, name in zip(quests, summary["quests"]):
+        notify.post("quest", id=id_, name=name)
+    return summary
 
-    db.commit()
-    return quest[0], levelup, skill_increased, skill[0], str(skill[1] + 1)
+
+def simulate(cursor: sqlite3.Cursor, ids: list):
+    """
+    What if the quests `ids` were completed: the summary close_quests() would return, without changing anything
+    """
+    return resolve_quests(cursor, ids)[0]
+
+
+def resolve_quests(cursor: sqlite3.Cursor, ids: list):
+    """
+    The outcome of completing the quests `ids` under the current rules: (summary, rows of rpg_ledger)
+    """
+    cursor.execute("SELECT xp, level FROM character WHERE id = 1")
+    character_xp, level = cursor.fetchone()
+    counts = collections.Counter(int(i) for i in ids)
+    cursor.execute("SELECT id, name, xp, willingness, trained_skill, time FROM quests WHERE id IN (" +
+                   ", ".join("?" * len(counts)) + ")", list(counts))
+    quests = {q[0]: q for q in cursor.fetchall()}
+
+    now = int(time.time())
+    xp = 0
+    gold = 0
+    skill_xp = collections.Counter()
+    names = []
+    ledger = []
+    for id_ in ids:
+        quest = quests.get(int(id_))
+        if not quest:
+            continue
+        quest_gold = _rules.quest_gold(quest[3], quest[5])
+        xp += quest[2]
+        gold += quest_gold
+        if quest[4] is not None:
+            skill_xp[quest[4]] += quest[2]
+        names.append(quest[1])
+        ledger.append((now, QUEST, quest[0], quest[4], quest[2], quest_gold))
+
+    # the character gets all the levels the XP is enough for; a level is never taken away
+    new_level = max(level, _rules.level(character_xp + xp)) if names else level
+    gold += _rules.level_gold * (new_level - level)
+    ledger += [(now, LEVEL_UP, n, None, 0, _rules.level_gold) for n in range(level + 1, new_level + 1)]
+
+    skills = []
+    if skill_xp:
+        cursor.execute("SELECT id, name, value, xp FROM skills WHERE id IN (" + ", ".join("?" * len(skill_xp)) + ")",
+                       list(skill_xp))
+        for id_, name, value, current_xp in cursor.fetchall():
+            new_value, new_xp = _rules.skill(_rules.skill_total(value, current_xp) + skill_xp[id_])
+            if new_value < value:
+                new_value, new_xp = value, current_xp + skill_xp[id_]
+            skills.append({"id": id_, "name": name, "value": new_value, "levels": new_value - value, "xp": new_xp})
+            ledger += [(now, SKILL_UP, n, id_, 0, 0) for n in range(value + 1, new_value + 1)]
+
+    summary = {
+        "quests": names,
+        "xp": xp,
+        "gold": gold,
+        "levels": new_level - level,
+        "level": new_level,
+        "xp_for_next_level": _rules.next_level_xp(new_level),
+        "skills": skills,
+    }
+    return summary, ledger
 
 
 def add_award(db, cursor: sqlite3.Cursor, name: str, price: int):
@@ -82,25 +251,131 @@ def claim_award(db, cursor: sqlite3.Cursor, id_: str):
     award = cursor.fetchone()
 
     cursor.execute("UPDATE character SET gold = gold - ? WHERE id = 1", (award[1],))
+    cursor.execute("INSERT INTO rpg_ledger(time, event, ref, gold) VALUES (?, ?, ?, ?)",
+                   (int(time.time()), AWARD, id_, -award[1]))
+    character = read_character(cursor)
     db.commit()
+    cache_character(cursor, character)
+    notify.post("award", id=id_, name=award[0])
+
+    return award[0], award[1], str(character["gold"])
 
-    cursor.execute("SELECT gold FROM character WHERE id = 1")
-    gold = cursor.fetchone()
 
-    return award[0], award[1], str(gold[0])
+# (connection key, character) is replaced as a whole, like the top task cache in core
+_character_cache = (None, None)
 
 
 def get_character_stats(cursor: sqlite3.Cursor):
-    cursor.execute("SELECT level, gold, xp, xp_for_next_level FROM character WHERE id = 1")
-    character = cursor.fetchone()
+    """
+    The character, from the cache unless it has changed. The changes made through this module update the cache,
+    the changes made by other processes are noticed by character.version
+    """
+    global _character_cache
+    key = schema.connection_key(cursor)
+    cached_key, character = _character_cache
+    if cached_key != key:
+        cursor.execute("SELECT version FROM character WHERE id = 1")
+        if character is None or cursor.fetchone()[0] != character["version"]:
+            character = read_character(cursor)
+        _character_cache = (key, character)
+    return dict(character)
+
+
+def read_character(cursor: sqlite3.Cursor):
+    cursor.execute("SELECT level, gold, xp, xp_for_next_level, version FROM character WHERE id = 1")
+    level, gold, xp, threshold, version = cursor.fetchone()
+
+    # the XP made on the current level, out of the XP the level takes
+    previous_threshold = _rules.next_level_xp(level - 1) if level > 1 else 0
+    span = threshold - previous_threshold
     return {
-        "level": character[0],
-        "gold": character[1],
-        "xp": character[2],
-        "xp_for_next_level": character[3]
+        "level": level,
+        "gold": gold,
+        "xp": xp,
+        "xp_for_next_level": threshold,
+        "xp_progress": max(0, min(100, 100 * (xp - previous_threshold) // span)) if span > 0 else 0,
+        "version": version,
     }
 
 
+def rebuild(db, cursor: sqlite3.Cursor):
+    """
+    Recompute the character, the skills and the level-ups from the quests and awards of the ledger under the current
+    rules; the gold of a quest is recomputed from its current willingness and time. Returns the character
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    recompute(cursor)
+    character = read_character(cursor)
+    db.commit()
+    cache_character(cursor, character)
+    notify.post("rebuild", name="character")
+    return character
+
+
+def recompute(cursor: sqlite3.Cursor):
+    """
+    rebuild() within the transaction of the caller, e.g. of sync after the ledger rows of a peer have been applied
+    """
+    cursor.execute("SELECT id, willingness, time FROM quests")
+    quests = {q[0]: q[1:] for q in cursor.fetchall()}
+    cursor.execute("SELECT id, time, event, ref, skill, xp, gold FROM rpg_ledger WHERE event IN (?, ?, ?) "
+                   "ORDER BY time, id", (OPENING, QUEST, AWARD))
+
+    xp = 0
+    gold = 0
+    level = 1
+    rewarded = 1  # the levels up to this one have been paid for
+    skills = collections.Counter()  # skill -> total XP
+    quest_gold = []
+    events = []
+    for id_, time_, event, ref, skill, row_xp, row_gold in cursor.fetchall():
+        if event == QUEST and ref in quests:
+            row_gold = _rules.quest_gold(*quests[ref])
+            quest_gold.append((row_gold, id_))
+        gold += row_gold
+        if skill is not None:
+            value = _rules.skill(skills[skill])[0]
+            skills[skill] += row_xp
+            if event == QUEST:
+                new_value = _rules.skill(skills[skill])[0]
+                events += [(time_, SKILL_UP, n, skill, 0, 0) for n in range(value + 1, new_value + 1)]
+        elif event == OPENING:
+            xp += row_xp
+            level = _rules.level(xp)
+            rewarded = max(rewarded, ref)
+        if event == QUEST:
+            xp += row_xp
+            new_level = _rules.level(xp)
+            for n in range(level + 1, new_level + 1):
+                bonus = _rules.level_gold if n > rewarded else 0
+                gold += bonus
+                events.append((time_, LEVEL_UP, n, None, 0, bonus))
+            level = max(level, new_level)
+            rewarded = max(rewarded, level)
+
+    cursor.execute("DELETE FROM rpg_ledger WHERE event IN (?, ?)", (LEVEL_UP, SKILL_UP))
+    cursor.executemany("UPDATE rpg_ledger SET gold = ? WHERE id = ?", quest_gold)
+    cursor.executemany("INSERT INTO rpg_ledger(time, event, ref, skill, xp, gold) VALUES (?, ?, ?, ?, ?, ?)", events)
+    cursor.execute("DELETE FROM rpg_weekly")
+    cursor.execute("INSERT INTO rpg_weekly(week, skill, xp, gold_earned, gold_spent) "
+                   "SELECT date(time, 'unixepoch', 'localtime', 'weekday 0', '-6 days'), coalesce(skill, 0), sum(xp), "
+                   "sum(max(gold, 0)), sum(max(-gold, 0)) FROM rpg_ledger WHERE event != ? GROUP BY 1, 2", (OPENING,))
+
+    cursor.execute("UPDATE character SET xp = ?, gold = ?, level = ?, xp_for_next_level = ? WHERE id = 1",
+                   (xp, gold, level, _rules.next_level_xp(level)))
+    cursor.executemany("UPDATE skills SET value = ?, xp = ? WHERE id = ?",
+                       [_rules.skill(total) + (skill,) for skill, total in skills.items()])
+
+
+def cache_character(cursor: sqlite3.Cursor, character: dict):
+    """
+    Write-through: `character` has been read after the last change and committed
+    """
+    global _character_cache
+    _character_cache = (schema.connection_key(cursor), character)
+
+
 def get_skills(cursor: sqlite3.Cursor):
     cursor.execute("SELECT id, name, value, xp FROM skills")
     skills = cursor.fetchall()
@@ -110,3 +385,31 @@ def get_skills(cursor: sqlite3.Cursor):
         "value": s[2],
         "xp": s[3]
     } for s in skills]
+
+
+def get_report(cursor: sqlite3.Cursor, weeks: int = 8):
+    """
+    The last `weeks` weeks: {"weeks": [{"week", "xp", "skills": {name: xp}, "gold_earned", "gold_spent"}],
+    "levels": [(date, level)], "skills": [(date, skill, level)]}, newest first
+    """
+    cursor.execute("SELECT w.week, w.xp, w.gold_earned, w.gold_spent, s.name FROM rpg_weekly w "
+                   "LEFT JOIN skills s ON s.id = w.skill "
+                   "WHERE w.week >= date('now', 'localtime', 'weekday 0', ?) ORDER BY w.week DESC, s.name",
+                   ("-%d days" % (7 * weeks - 1),))
+    report = {}
+    for week, xp, earned, spent, skill in cursor.fetchall():
+        totals = report.setdefault(week, {"week": week, "xp": 0, "skills": {}, "gold_earned": 0, "gold_spent": 0})
+        totals["xp"] += xp
+        totals["gold_earned"] += earned
+        totals["gold_spent"] += spent
+        if skill and xp:
+            totals["skills"][skill] = xp
+
+    cursor.execute("SELECT date(time, 'unixepoch', 'localtime'), ref FROM rpg_ledger WHERE event = ? "
+                   "ORDER BY time DESC, id DESC LIMIT 20", (LEVEL_UP,))
+    levels = cursor.fetchall()
+    cursor.execute("SELECT date(l.time, 'unixepoch', 'localtime'), s.name, l.ref FROM rpg_ledger l "
+                   "JOIN skills s ON s.id = l.skill WHERE l.event = ? ORDER BY l.time DESC, l.id DESC LIMIT 20",
+                   (SKILL_UP,))
+    skills = cursor.fetchall()
+    return {"weeks": list(report.values()), "levels": levels, "skills": skills}
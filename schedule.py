@@ -0,0 +1,224 @@
+"""
+Planning by weight.
+
+The weight a day can take is set per weekday in ~/.aide.conf (a single number applies to every day; the missing
+weekdays get DEFAULT_CAPACITY):
+
+    "daily_capacity": {"mon": 8, "tue": 8, "wed": 8, "thu": 8, "fri": 6, "sat": 2, "sun": 0}
+
+The room of a day is its capacity minus the weight of the tasks already due that day.
+
+`aide reschedule` spreads the overdue open tasks over the next days, except the blocked tasks and the tasks of
+hidden projects: the tasks with higher priority (and, among them, the heavier ones) are placed first, each on the
+earliest day that still has room for its weight. A task that does not fit anywhere goes to the least loaded day.
+The plan is applied with a single UPDATE.
+
+`aide plan` assigns the undated tasks to the upcoming days without changing them. The backlog is taken
+project by project (higher priority first) in the order of the tasks in the project; every task goes to the
+earliest day that has room for it and is not before the previous task of its project. A task heavier than
+a whole day gets a free day of its own. The plan is kept in task_plan and recomputed on read, from the first
+task that has changed since the last time.
+"""
+import datetime
+import json
+import sqlite3
+
+import notify
+
+DEFAULT_DAYS = 7
+DEFAULT_CAPACITY = 8.0
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def get_capacity(config: dict):
+    """
+    The capacity of every weekday, Monday first
+    """
+    capacity = config.get("daily_capacity", DEFAULT_CAPACITY)
+    if isinstance(capacity, dict):
+        unknown = set(capacity) - set(WEEKDAYS)
+        if unknown:
+            raise ValueError("Unknown weekdays in daily_capacity: " + ", ".join(sorted(unknown)))
+        return [float(capacity.get(d, DEFAULT_CAPACITY)) for d in WEEKDAYS]
+    return [float(capacity)] * 7
+
+
+def day_capacity(capacity, day: datetime.date) -> float:
+    # a single number, or a list from get_capacity()
+    if isinstance(capacity, (int, float)):
+        return float(capacity)
+    return capacity[day.weekday()]
+
+
+def get_today(cursor: sqlite3.Cursor) -> datetime.date:
+    cursor.execute("SELECT date('now')")
+    return datetime.date.fromisoformat(cursor.fetchone()[0])
+
+
+def get_days(cursor: sqlite3.Cursor, days: int):
+    today = get_today(cursor)
+    return [(today + datetime.timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def plan_reschedule(cursor: sqlite3.Cursor, days: int = DEFAULT_DAYS, capacity=DEFAULT_CAPACITY):
+    """
+    The new due dates of the overdue tasks: a list of tasks with an additional "new_date" key
+    """
+    if days < 1:
+        raise ValueError("Tasks can be rescheduled over at least one day")
+    dates = get_days(cursor, days)
+
+    # the weight already due on each of the days
+    cursor.execute("SELECT due_date, sum(weight) FROM tasks WHERE status=1 AND due_date BETWEEN ? AND ? "
+                   "GROUP BY due_date", (dates[0], dates[-1]))
+    load = dict.fromkeys(dates, 0.0)
+    load.update((d, float(w)) for d, w in cursor.fetchall())
+    room = {d: day_capacity(capacity, datetime.date.fromisoformat(d)) for d in dates}
+
+    # like in the lists, the routine tasks of hidden projects and the tasks that cannot be done yet are left out
+    cursor.execute("SELECT id, name, priority, weight, due_date FROM tasks WHERE status=1 AND due_date < date('now') "
+                   "AND hidden=0 AND blocked_count=0 ORDER BY priority DESC, weight DESC, due_date ASC, id ASC")
+    plan = []
+    for id_, name, priority, weight, due_date in cursor.fetchall():
+        day = next((d for d in dates if load[d] + weight <= room[d]), None)
+        if day is None:
+            day = min(dates, key=lambda d: load[d] - room[d])  # the earliest of the days with the most room
+        load[day] += weight
+        plan.append({
+            "id": id_,
+            "name": name,
+            "priority": priority,
+            "weight": weight,
+            "due_date": due_date,
+            "new_date": day,
+        })
+    return plan
+
+
+def reschedule(db, cursor: sqlite3.Cursor, days: int = DEFAULT_DAYS, capacity=DEFAULT_CAPACITY):
+    """
+    Move the overdue tasks to the dates from plan_reschedule() in one transaction; returns the plan
+    """
+    plan = plan_reschedule(cursor, days, capacity)
+    if not plan:
+        return plan
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS reschedule (id INTEGER PRIMARY KEY, due_date TEXT)")
+    cursor.execute("DELETE FROM temp.reschedule")
+    cursor.executemany("INSERT INTO temp.reschedule(id, due_date) VALUES (?, ?)",
+                       [(t["id"], t["new_date"]) for t in plan])
+    # the tasks closed or moved in the meantime are left alone
+    cursor.execute("UPDATE tasks SET due_date = (SELECT r.due_date FROM temp.reschedule r WHERE r.id = tasks.id) "
+                   "WHERE id IN (SELECT id FROM temp.reschedule) AND status=1 AND due_date < date('now')")
+    cursor.execute("DELETE FROM temp.reschedule")
+    db.commit()
+    notify.post("reschedule", name="%d tasks" % len(plan))
+    return plan
+
+
+def get_backlog(cursor: sqlite3.Cursor):
+    """
+    (id, project, weight) of the undated open tasks, in the order they are planned
+    """
+    # tasks_backlog_index holds only the undated open tasks, so the rest of the tasks is not scanned
+    cursor.execute("SELECT t.id, t.project, t.weight FROM projects p JOIN tasks t "
+                   "ON t.project = p.id AND t.status = 1 AND t.due_date IS NULL "
+                   "WHERE p.open = 1 AND p.hidden = 0 ORDER BY p.priority DESC, p.id, t.order_in_project, t.id")
+    return cursor.fetchall()
+
+
+def place_tasks(tasks: list, today: datetime.date, capacity, load: dict, after: dict):
+    """
+    First fit: the day (an offset from today) of every task. `load` (offset -> weight) and `after`
+    (project -> the earliest offset) describe the days taken so far; both are updated
+    """
+    if not any(day_capacity(capacity, today + datetime.timedelta(days=i)) > 0 for i in range(7)):
+        raise ValueError("The daily capacity is 0 on all the weekdays")
+    capacities = {}
+
+    def room(offset):
+        if offset not in capacities:
+            capacities[offset] = day_capacity(capacity, today + datetime.timedelta(days=offset))
+        return capacities[offset] - load.get(offset, 0.0)
+
+    # the days before `first_open` are full, so they are skipped by every task
+    first_open = 0
+    days = []
+    for _, project, weight in tasks:
+        while room(first_open) <= 0:
+            first_open += 1
+        offset = max(first_open, after.get(project, 0))
+        while not (weight <= room(offset) or (room(offset) == capacities[offset] > 0)):
+            offset += 1
+        load[offset] = load.get(offset, 0.0) + weight
+        after[project] = offset
+        days.append(offset)
+    return days
+
+
+def update_plan(db, cursor: sqlite3.Cursor, capacity=DEFAULT_CAPACITY) -> int:
+    """
+    Bring task_plan up to date with the tasks; returns the number of the re-planned tasks
+    """
+    today = get_today(cursor)
+    cursor.execute("SELECT due_date, sum(weight) FROM tasks WHERE status=1 AND due_date >= ? GROUP BY due_date",
+                   (today.isoformat(),))
+    dated = {(datetime.date.fromisoformat(d) - today).days: float(w) for d, w in cursor.fetchall() if w}
+    state = json.dumps([today.isoformat(), capacity, sorted(dated.items())])
+    backlog = get_backlog(cursor)
+
+    cursor.execute("SELECT value FROM plan_meta WHERE key = 'state'")
+    previous_state = cursor.fetchone()
+    cursor.execute("SELECT task, project, weight, day FROM task_plan ORDER BY position")
+    planned = cursor.fetchall()
+
+    # first-fit places a task regardless of the tasks after it, so the plan is kept up to the first change
+    start = 0
+    if previous_state and previous_state[0] == state:
+        common = min(len(planned), len(backlog))
+        while start < common and planned[start][:3] == tuple(backlog[start]):
+            start += 1
+        if start == len(planned) == len(backlog):
+            return 0
+
+    load = dict(dated)
+    after = {}
+    for _, project, weight, day in planned[:start]:
+        offset = (datetime.date.fromisoformat(day) - today).days
+        load[offset] = load.get(offset, 0.0) + weight
+        after[project] = offset
+    days = place_tasks(backlog[start:], today, capacity, load, after)
+
+    cursor.execute("DELETE FROM task_plan WHERE position >= ?", (start,))
+    cursor.executemany("INSERT INTO task_plan(position, task, project, weight, day) VALUES (?, ?, ?, ?, ?)",
+                       [(start + i, t[0], t[1], t[2], (today + datetime.timedelta(days=d)).isoformat())
+                        for i, (t, d) in enumerate(zip(backlog[start:], days))])
+    cursor.execute("INSERT OR REPLACE INTO plan_meta(key, value) VALUES ('state', ?)", (state,))
+    db.commit()
+    return len(backlog) - start
+
+
+def get_plan(db, cursor: sqlite3.Cursor, days: int = DEFAULT_DAYS, capacity=DEFAULT_CAPACITY):
+    """
+    The next `days` days: a list of {"date", "capacity", "due" (weight of the dated tasks), "tasks" (planned ones)}
+    """
+    if days < 1:
+        raise ValueError("The plan covers at least one day")
+    update_plan(db, cursor, capacity)
+    dates = get_days(cursor, days)
+
+    cursor.execute("SELECT due_date, sum(weight) FROM tasks WHERE status=1 AND due_date BETWEEN ? AND ? "
+                   "GROUP BY due_date", (dates[0], dates[-1]))
+    due = dict(cursor.fetchall())
+    plan = {d: {
+        "date": d,
+        "capacity": day_capacity(capacity, datetime.date.fromisoformat(d)),
+        "due": float(due.get(d) or 0),
+        "tasks": [],
+    } for d in dates}
+
+    cursor.execute("SELECT p.day, t.id, t.name, t.project, t.weight FROM task_plan p JOIN tasks t ON t.id = p.task "
+                   "WHERE p.day <= ? ORDER BY p.day, p.position", (dates[-1],))
+    for day, id_, name, project, weight in cursor.fetchall():
+        plan[day]["tasks"].append({"id": id_, "name": name, "project": project, "weight": weight})
+    return list(plan.values())
@@ -0,0 +1,42 @@
+"""
+Schema upgrades.
+
+A new DB is created from db.sql and triggers.sql; the scripts in migrations/ are then applied in order.
+PRAGMA user_version holds the number of the last applied script, so an up-to-date DB costs one PRAGMA
+at startup. connection_key() is the key of the in-process caches of core, rpg_mod and views.
+"""
+import os
+import re
+import sqlite3
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def connection_key(cursor: sqlite3.Cursor):
+    # changes when the DB is written, through this connection or any other one
+    db = cursor.connection
+    return id(db), cursor.execute("PRAGMA data_version").fetchone()[0], db.total_changes
+
+
+def get_migrations():
+    migrations = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r"(\d+)_.*\.sql$", name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(MIGRATIONS_DIR, name)))
+    return sorted(migrations)
+
+
+def upgrade(db: sqlite3.Connection):
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    for number, path in get_migrations():
+        if number <= version:
+            continue
+        with open(path) as f:
+            script = f.read()
+        # executescript() commits on its own, so the version is bumped within the script
+        try:
+            db.executescript("BEGIN;\n" + script + "\nPRAGMA user_version = %d;\nCOMMIT;" % number)
+        except sqlite3.Error:
+            db.rollback()
+            raise
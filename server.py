@@ -0,0 +1,333 @@
+"""
+HTTP/JSON API for a shared Aide DB.
+
+`aide server` serves the functions of core, project_mod and rpg_mod to many clients from one process:
+
+    POST /call/core.close_task     {"args": [12], "kwargs": {}}   -> {"result": "Task name"}
+    GET  /call/rpg_mod.get_quests?args=[]&kwargs={}              -> {"result": [...]}
+    GET  /tasks?due_date=today&project=3&closed=1                -> {"result": [...]}   core.list_tasks()
+    GET  /tasks/top                                              -> {"result": {...}}   the top task
+
+The functions take the same arguments as the local ones without `db` and `cursor`. Reading functions are
+served with GET and an ETag; a client that sends it back in If-None-Match gets 304 Not Modified, without the
+function being run, until the DB changes or the minute is over. Reads run in parallel on a pool of connections.
+Writes are queued to a single writer, which applies all the queued calls in one transaction (each in its own
+savepoint) and commits once per batch; it also takes the weekly snapshot of the history (see history.py). The
+arguments are passed to SQLite as bound parameters only.
+
+Clients point to the server with "server": "http://127.0.0.1:8321" in ~/.aide.conf (see client.py).
+There is no authentication, so the server listens on the loopback interface unless told otherwise.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import core
+import history
+import notes
+import notify
+import project_mod
+import rpg_mod
+import schedule
+import schema
+import status
+import views
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8321
+
+# name -> (function, modifies the DB); reading functions take a cursor, writing ones take (db, cursor)
+EXPORTED = {
+    "core.list_tasks": (core.list_tasks, False),
+    "core.get_top_task": (core.get_top_task, False),
+    "core.get_due_boundaries": (core.get_due_boundaries, False),
+    "core.get_total_weight": (core.get_total_weight, False),
+    "core.add_task": (core.add_task, True),
+    "core.modify_task": (core.modify_task, True),
+    "core.move_tasks": (core.move_tasks, True),
+    "core.add_note_to_task": (core.add_note_to_task, True),
+    "core.close_task": (core.close_task, True),
+    "core.close_tasks": (core.close_tasks, True),
+    "core.delete_task": (core.delete_task, True),
+    "core.add_note": (core.add_note, True),
+    "core.get_blockers": (core.get_blockers, False),
+    "core.link_tasks": (core.link_tasks, True),
+    "core.unlink_tasks": (core.unlink_tasks, True),
+    "history.get_events": (history.get_events, False),
+    "history.get_state": (history.get_state, False),
+    "history.get_postponed": (history.get_postponed, False),
+    "notes.get_journal": (notes.get_journal, False),
+    "notes.get_first_day": (notes.get_first_day, False),
+    "project_mod.list_projects": (project_mod.list_projects, False),
+    "project_mod.get_project_progress": (project_mod.get_project_progress, False),
+    "project_mod.check_stats": (project_mod.check_stats, False),
+    "project_mod.rebuild_stats": (project_mod.rebuild_stats, True),
+    "project_mod.add_project": (project_mod.add_project, True),
+    "project_mod.modify_project": (project_mod.modify_project, True),
+    "project_mod.move_project": (project_mod.move_project, True),
+    "rpg_mod.get_quests": (rpg_mod.get_quests, False),
+    "rpg_mod.get_awards": (rpg_mod.get_awards, False),
+    "rpg_mod.get_character_stats": (rpg_mod.get_character_stats, False),
+    "rpg_mod.get_skills": (rpg_mod.get_skills, False),
+    "rpg_mod.get_report": (rpg_mod.get_report, False),
+    "rpg_mod.simulate": (rpg_mod.simulate, False),
+    "rpg_mod.add_quest": (rpg_mod.add_quest, True),
+    "rpg_mod.close_quest": (rpg_mod.close_quest, True),
+    "rpg_mod.close_quests": (rpg_mod.close_quests, True),
+    "rpg_mod.add_award": (rpg_mod.add_award, True),
+    "rpg_mod.claim_award": (rpg_mod.claim_award, True),
+    "rpg_mod.rebuild": (rpg_mod.rebuild, True),
+    "schedule.plan_reschedule": (schedule.plan_reschedule, False),
+    "schedule.reschedule": (schedule.reschedule, True),
+    "schedule.get_plan": (schedule.get_plan, True),  # brings the stored plan up to date
+    "status.get_snapshot": (status.get_snapshot, False),
+    "views.filter_tasks": (views.filter_tasks, False),
+    "views.list_view": (views.list_view, False),
+    "views.get_views": (views.get_views, False),
+    "views.get_tags": (views.get_tags, False),
+    "views.save_view": (views.save_view, True),
+    "views.delete_view": (views.delete_view, True),
+    "views.tag_task": (views.tag_task, True),
+    "views.untag_task": (views.untag_task, True),
+}
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(sqlite3.connect(db_path, check_same_thread=False))
+
+    def read(self, function, args: list, kwargs: dict):
+        db = self.connections.get()
+        try:
+            return function(db.cursor(), *args, **kwargs)
+        finally:
+            db.rollback()  # end the read transaction, so that the next read sees the latest commit
+            self.connections.put(db)
+
+
+class DatabaseVersion:
+    """
+    The ETag of the reads: it changes with every commit to the DB, by the writer or any other process, and every
+    minute, since the top task and the lists of today depend on the time as well
+    """
+    def __init__(self, db_path: str):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.token = os.urandom(4).hex()  # a restarted server does not match the ETags of the previous one
+        self.data_version = None
+        self.generation = 0
+
+    def etag(self) -> str:
+        with self.lock:
+            # PRAGMA data_version changes when another connection commits; its values are only comparable within
+            # the same connection, so all the reads are checked against this one
+            data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self.data_version:
+                self.data_version = data_version
+                self.generation += 1
+            return '"%s-%d-%d"' % (self.token, self.generation, time.time() // 60)
+
+
+class BatchConnection:
+    """
+    Stands in for the connection in the writing functions: their commits are deferred to the end of the batch
+    """
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def cursor(self):
+        return self.db.cursor()
+
+    def commit(self):
+        pass
+
+
+class Call:
+    def __init__(self, function, args: list, kwargs: dict):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class Writer(threading.Thread):
+    def __init__(self, db_path: str, max_batch: int = 100):
+        super().__init__(name="aide-writer", daemon=True)
+        # transactions are controlled by the writer itself
+        self.db = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.calls = queue.Queue()
+        self.max_batch = max_batch
+
+    def write(self, function, args: list, kwargs: dict):
+        call = Call(function, args, kwargs)
+        self.calls.put(call)
+        call.done.wait()
+        if call.error:
+            raise call.error
+        return call.result
+
+    def take_batch(self):
+        batch = [self.calls.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.calls.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        connection = BatchConnection(self.db)
+        while True:
+            batch = self.take_batch()
+            cursor = self.db.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for call in batch:
+                    # a failing call is rolled back on its own and does not affect the rest of the batch
+                    cursor.execute("SAVEPOINT call")
+                    try:
+                        call.result = call.function(connection, cursor, *call.args, **call.kwargs)
+                    except Exception as e:
+                        call.error = e
+                        cursor.execute("ROLLBACK TO call")
+                    cursor.execute("RELEASE call")
+                # the weekly snapshot of the history, which the local clients take when they connect
+                history.snapshot_if_due(connection, cursor)
+                cursor.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self.db.in_transaction:
+                    self.db.rollback()
+                for call in batch:
+                    call.error = call.error or e
+            for call in batch:
+                call.done.set()
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "Aide"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if url.path == "/tasks/top":
+                name, args, kwargs = "core.get_top_task", [], {}
+            elif url.path == "/tasks":
+                name, args = "core.list_tasks", []
+                kwargs = {
+                    "exclude_closed_tasks": query.get("closed", "0") == "0",
+                    "exclude_overdue_tasks": query.get("overdue", "1") == "0",
+                    "due_date": query.get("due_date"),
+                    "project": int(query["project"]) if "project" in query else None,
+                }
+            elif url.path.startswith("/call/"):
+                name = url.path[len("/call/"):]
+                args = json.loads(query.get("args", "[]"))
+                kwargs = json.loads(query.get("kwargs", "{}"))
+            else:
+                self.reply(404, {"error": "Not found: %s" % url.path})
+                return
+        except ValueError as e:
+            self.reply(400, {"error": str(e)})
+            return
+
+        if name not in EXPORTED or EXPORTED[name][1]:
+            self.reply(404, {"error": "Not a reading function: %s" % name})
+            return
+        self.call(name, args, kwargs)
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        name = url.path[len("/call/"):] if url.path.startswith("/call/") else None
+        if name not in EXPORTED:
+            self.reply(404, {"error": "Unknown function: %s" % name})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError as e:
+            self.reply(400, {"error": str(e)})
+            return
+        self.call(name, body.get("args", []), body.get("kwargs", {}))
+
+    def call(self, name: str, args: list, kwargs: dict):
+        function, modifies = EXPORTED[name]
+        # taken before the read, so that a commit in the meantime gives the next poll a new ETag
+        etag = None if modifies else self.server.version.etag()
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.reply(304, None, etag)
+            return
+        try:
+            if modifies:
+                result = self.server.writer.write(function, args, kwargs)
+            else:
+                result = self.server.readers.read(function, args, kwargs)
+        except (TypeError, ValueError, sqlite3.Error) as e:
+            self.reply(400, {"error": "%s: %s" % (type(e).__name__, e)})
+            return
+        except Exception as e:
+            logging.exception("%s failed", name)
+            self.reply(500, {"error": "%s: %s" % (type(e).__name__, e)})
+            return
+        self.reply(200, {"result": result}, etag)
+
+    def reply(self, code: int, content: dict, etag: str = None):
+        body = json.dumps(content).encode() if code != 304 else b""
+        headers = {"Content-Type": "application/json"}
+        if etag:
+            headers["ETag"] = etag
+
+        self.send_response(code)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("%s " + format, self.address_string(), *args)
+
+
+def serve(config: dict, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, readers: int = 4):
+    httpd = create_server(config, host, port, readers)
+    logging.info("Serving %s on http://%s:%d", config["db_path"], host, httpd.server_port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def create_server(config: dict, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, readers: int = 4):
+    """
+    The server with its readers and the running writer; port 0 picks a free port
+    """
+    notify.configure(config)
+    rpg_mod.configure(config)
+    db_path = os.path.expanduser(config["db_path"])
+
+    # migrate the DB and let the readers work while a batch is being written
+    db = sqlite3.connect(db_path)
+    schema.upgrade(db)
+    history.snapshot_if_due(db, db.cursor())
+    db.execute("PRAGMA journal_mode=WAL")
+    db.close()
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    httpd.readers = ConnectionPool(db_path, readers)
+    httpd.writer = Writer(db_path)
+    httpd.writer.start()
+    httpd.version = DatabaseVersion(db_path)
+    return httpd
@@ -0,0 +1,137 @@
+"""
+Status snapshot for status bars (i3blocks, tmux, shell prompts).
+
+The snapshot is rewritten atomically by the "status_file" hook after every committed change,
+so a status bar only needs to `cat` it. Two variants are written: plain text at `path`
+and JSON at `path.json`.
+"""
+import ctypes
+import ctypes.util
+import datetime
+import json
+import os
+import sqlite3
+import struct
+import time
+
+import core
+import rpg_mod
+
+DEFAULT_PATH = "~/.cache/aide/status"
+
+
+def get_snapshot(cursor: sqlite3.Cursor):
+    task = core.list_tasks(cursor, True, due_date="today")
+    task = task[0] if task else None
+    character = rpg_mod.get_character_stats(cursor)
+    return {
+        "top_task": {
+            "id": task["id"],
+            "name": task["name"],
+            "weight": task["weight"],
+            "due_time": task["due_time"],
+        } if task else None,
+        "weight": {
+            "closed": core.get_total_weight(cursor, True, False),
+            "total": core.get_total_weight(cursor),
+        },
+        "character": {
+            "level": character["level"],
+            "xp": character["xp"],
+            "xp_for_next_level": character["xp_for_next_level"],
+            "gold": character["gold"],
+        },
+        "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def format_snapshot(snapshot: dict):
+    task = snapshot["top_task"]
+    task = "%s [%g]" % (task["name"], task["weight"]) if task else "No open tasks"
+    return "{} | {:g}/{:g} | L{}".format(task, snapshot["weight"]["closed"], snapshot["weight"]["total"],
+                                          snapshot["character"]["level"])
+
+
+def write_atomically(path: str, text: str):
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_snapshot(cursor: sqlite3.Cursor, path: str):
+    return save_snapshot(path, get_snapshot(cursor))
+
+
+def save_snapshot(path: str, snapshot: dict):
+    # the snapshot may come from the server (see client.py), the files are always local
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    write_atomically(path + ".json", json.dumps(snapshot) + "\n")
+    write_atomically(path, format_snapshot(snapshot) + "\n")
+    return snapshot
+
+
+def get_path(config: dict):
+    for hook in config.get("hooks", []):
+        if hook.get("type") == "status_file":
+            return hook.get("path", DEFAULT_PATH)
+    return None
+
+
+def read(path: str, as_json: bool = False):
+    path = os.path.expanduser(path) + (".json" if as_json else "")
+    with open(path) as f:
+        return f.read().rstrip("\n")
+
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_TO = 0x80
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def changes(path: str):
+    """
+    Yield every time the file at `path` is replaced. Uses inotify; falls back to polling if it is not available
+    """
+    directory, name = os.path.split(os.path.expanduser(path))
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fd = getattr(libc, "inotify_init", lambda: -1)()
+    if fd < 0 or libc.inotify_add_watch(fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        yield from _poll(os.path.join(directory, name))
+        return
+
+    try:
+        while True:
+            data = os.read(fd, 4096)
+            offset = 0
+            changed = False
+            while offset < len(data):
+                _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                event_name = data[offset:offset + length].rstrip(b"\0").decode()
+                offset += length
+                changed = changed or event_name == name
+            if changed:
+                yield
+    finally:
+        os.close(fd)
+
+
+def _poll(path: str, interval: float = 1.0):
+    last = _mtime(path)
+    while True:
+        time.sleep(interval)
+        mtime = _mtime(path)
+        if mtime != last:
+            last = mtime
+            yield
+
+
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,277 @@
+"""
+Delta replication between Aide DBs.
+
+The triggers from migrations/002_sync.sql log every change of the synced tables. `aide sync PATH` sends the
+changes made since the last sync with the same peer and applies the changes received from it:
+
+    aide sync ~/laptop/tasks.db     # another DB file: both DBs are updated
+    aide sync ~/Dropbox/aide        # a directory: changes are exchanged through files, e.g. with offline machines
+
+Rows are identified by uuids. Only the last change of a row is sent, together with the current content of
+the row, so a sync costs time proportional to the number of changed rows. Conflicts are resolved per row:
+the change with the later (time, node) wins in both DBs. Hence, the clocks of the synced machines should be
+roughly in sync. The RPG progress is exchanged as the quest and award rows of rpg_ledger, which are never changed;
+the character and the skill values are recomputed from the ledger when such rows are received.
+"""
+import glob
+import json
+import os
+import sqlite3
+
+import rpg_mod
+import schema
+
+# table -> synced columns; the tables are ordered so that the referenced rows are applied first
+TABLES = {
+    "projects": ("name", "priority", "open", "parent", "hidden"),
+    "skills": ("name",),
+    "quests": ("name", "xp", "willingness", "trained_skill", "time"),
+    "awards": ("name", "price"),
+    "rpg_ledger": ("time", "event", "ref", "skill", "xp", "gold"),
+    "notes": ("date", "text"),
+    "tasks": ("due_date", "name", "priority", "due_time", "status", "weight", "repeat_period", "project", "quest",
+              "order_in_project", "note"),
+}
+
+# (table, column) -> referenced table, or {event: referenced table} for the ledger; references are sent as uuids
+REFERENCES = {
+    ("projects", "parent"): "projects",
+    ("quests", "trained_skill"): "skills",
+    ("rpg_ledger", "ref"): {rpg_mod.QUEST: "quests", rpg_mod.AWARD: "awards"},
+    ("rpg_ledger", "skill"): "skills",
+    ("tasks", "project"): "projects",
+    ("tasks", "quest"): "quests",
+}
+
+UPSERT = 0
+DELETE = 1
+
+
+class SyncError(Exception):
+    pass
+
+
+def get_node(cursor: sqlite3.Cursor) -> str:
+    cursor.execute("SELECT value FROM sync_meta WHERE key = 'node'")
+    return cursor.fetchone()[0]
+
+
+def reset_node(db, cursor: sqlite3.Cursor):
+    """
+    Give the DB a new node id; needed once for a copy of a DB that has already been synced
+    """
+    cursor.execute("UPDATE sync_meta SET value = lower(hex(randomblob(8))) WHERE key = 'node'")
+    cursor.execute("DELETE FROM sync_peers")
+    db.commit()
+
+
+def get_peer(cursor: sqlite3.Cursor, peer: str):
+    cursor.execute("SELECT received_seq, sent_seq FROM sync_peers WHERE peer = ?", (peer,))
+    return cursor.fetchone() or (0, 0)
+
+
+def set_peer(cursor: sqlite3.Cursor, peer: str, received_seq: int = None, sent_seq: int = None):
+    cursor.execute("INSERT OR IGNORE INTO sync_peers(peer) VALUES (?)", (peer,))
+    if received_seq is not None:
+        cursor.execute("UPDATE sync_peers SET received_seq = ? WHERE peer = ?", (received_seq, peer))
+    if sent_seq is not None:
+        cursor.execute("UPDATE sync_peers SET sent_seq = ? WHERE peer = ?", (sent_seq, peer))
+    cursor.execute("UPDATE sync_peers SET synced = datetime('now') WHERE peer = ?", (peer,))
+
+
+def get_changes(cursor: sqlite3.Cursor, since: int, until: int, exclude_node: str = None):
+    """
+    The last change of every row changed after the change log entry `since`, with the current content of the row.
+    Rows whose last change is after `until` are skipped
+    """
+    cursor.execute("SELECT seq, tbl, uuid, op, modified, node FROM changelog WHERE seq IN "
+                   "(SELECT max(seq) FROM changelog WHERE seq > ? GROUP BY tbl, uuid) AND seq <= ? ORDER BY seq",
+                   (since, until))
+    changes = []
+    for seq, table, uuid, op, modified, node in cursor.fetchall():
+        change = {"seq": seq, "table": table, "uuid": uuid, "op": op, "modified": modified, "node": node}
+        if node == exclude_node:
+            continue  # the peer has it already
+        if op == UPSERT:
+            change["row"] = read_row(cursor, table, uuid)
+            if change["row"] is None:
+                continue  # deleted in the meantime without a log entry, e.g. by an older version of aide
+        changes.append(change)
+    return changes
+
+
+def read_row(cursor: sqlite3.Cursor, table: str, uuid: str):
+    columns = TABLES[table]
+    cursor.execute("SELECT " + ", ".join(columns) + " FROM " + table + " WHERE uuid = ?", (uuid,))
+    values = cursor.fetchone()
+    if values is None:
+        return None
+
+    row = dict(zip(columns, values))
+    for column in columns:
+        referenced_table = get_referenced_table(table, column, row)
+        if referenced_table and row[column] is not None:
+            cursor.execute("SELECT uuid FROM " + referenced_table + " WHERE id = ?", (row[column],))
+            reference = cursor.fetchone()
+            row[column] = reference[0] if reference else None
+    return row
+
+
+def get_referenced_table(table: str, column: str, row: dict):
+    referenced_table = REFERENCES.get((table, column))
+    if isinstance(referenced_table, dict):
+        return referenced_table.get(row.get("event"))
+    return referenced_table
+
+
+def last_local_change(cursor: sqlite3.Cursor, table: str, uuid: str):
+    cursor.execute("SELECT modified, node FROM changelog WHERE tbl = ? AND uuid = ? ORDER BY seq DESC LIMIT 1",
+                   (table, uuid))
+    return cursor.fetchone()
+
+
+def apply_changes(cursor: sqlite3.Cursor, changes: list):
+    """
+    Apply the changes received from a peer; returns the number of applied ones. Must run in a transaction
+    """
+    order = list(TABLES)
+    # the tables that are not synced any more, e.g. the character in the files of older versions, are skipped
+    changes = sorted((c for c in changes if c["table"] in order), key=lambda c: (order.index(c["table"]), c["seq"]))
+    applied = 0
+    ledger = False
+
+    # the triggers skip the changes, they are logged here with their original time and node
+    cursor.execute("INSERT INTO sync_meta(key, value) VALUES ('applying', '1')")
+    for change in changes:
+        local = last_local_change(cursor, change["table"], change["uuid"])
+        if local and tuple(local) >= (change["modified"], change["node"]):
+            continue  # the local change is newer, or it is the same change
+
+        if change["op"] == DELETE:
+            cursor.execute("DELETE FROM " + change["table"] + " WHERE uuid = ?", (change["uuid"],))
+        else:
+            write_row(cursor, change["table"], change["uuid"], change["row"])
+        cursor.execute("INSERT INTO changelog(tbl, uuid, op, modified, node) VALUES (?, ?, ?, ?, ?)",
+                       (change["table"], change["uuid"], change["op"], change["modified"], change["node"]))
+        applied += 1
+        ledger = ledger or change["table"] == "rpg_ledger"
+    cursor.execute("DELETE FROM sync_meta WHERE key = 'applying'")
+    if ledger:
+        rpg_mod.recompute(cursor)
+    return applied
+
+
+def write_row(cursor: sqlite3.Cursor, table: str, uuid: str, row: dict):
+    row = dict(row)
+    for column in TABLES[table]:
+        referenced_table = get_referenced_table(table, column, row)
+        if referenced_table and row.get(column) is not None:
+            cursor.execute("SELECT id FROM " + referenced_table + " WHERE uuid = ?", (row[column],))
+            reference = cursor.fetchone()
+            # the referenced row has been deleted here; tasks fall back to the inbox
+            row[column] = reference[0] if reference else (1 if column == "project" else None)
+
+    columns = [c for c in TABLES[table] if c in row]
+    values = [row[c] for c in columns]
+    cursor.execute("UPDATE " + table + " SET " + ", ".join(c + " = ?" for c in columns) + " WHERE uuid = ?",
+                   values + [uuid])
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO " + table + "(uuid, " + ", ".join(columns) + ") VALUES (?" + ", ?" * len(columns) +
+                       ")", [uuid] + values)
+
+
+def last_seq(cursor: sqlite3.Cursor) -> int:
+    cursor.execute("SELECT max(seq) FROM changelog")
+    return cursor.fetchone()[0] or 0
+
+
+def sync_databases(db, other_db):
+    """
+    Exchange the changes between two DBs; returns the numbers of (received, sent) changes
+    """
+    cursor = db.cursor()
+    other_cursor = other_db.cursor()
+    node = get_node(cursor)
+    other_node = get_node(other_cursor)
+    if node == other_node:
+        raise SyncError("Both DBs have the node id %s: one of them is a copy. Run `aide sync --reset-node` on it"
+                        % node)
+
+    # both DBs are locked, so that no change is made between reading the log and updating the sync vectors
+    cursor.execute("BEGIN IMMEDIATE")
+    other_cursor.execute("BEGIN IMMEDIATE")
+    try:
+        changes = get_changes(cursor, get_peer(cursor, other_node)[1], last_seq(cursor), other_node)
+        other_changes = get_changes(other_cursor, get_peer(other_cursor, node)[1], last_seq(other_cursor), node)
+        sent = apply_changes(other_cursor, changes)
+        received = apply_changes(cursor, other_changes)
+
+        # the exchanged changes are in both logs now, so neither of them has to be sent again
+        end = last_seq(cursor)
+        other_end = last_seq(other_cursor)
+        set_peer(cursor, other_node, received_seq=other_end, sent_seq=end)
+        set_peer(other_cursor, node, received_seq=end, sent_seq=other_end)
+        other_db.commit()
+        db.commit()
+    except BaseException:
+        other_db.rollback()
+        db.rollback()
+        raise
+    return received, sent
+
+
+def sync_directory(db, path: str):
+    """
+    Apply the changes from the files of the other DBs in `path` and write the local changes into a new file.
+    Returns the numbers of (received, sent) changes
+    """
+    cursor = db.cursor()
+    node = get_node(cursor)
+    path = os.path.abspath(os.path.expanduser(path))
+    os.makedirs(path, exist_ok=True)
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # the changes received from the directory are there already, so they are not written back
+        local_end = last_seq(cursor)
+
+        received = 0
+        for file_path in sorted(glob.glob(os.path.join(path, "*.json"))):
+            other_node, _, last = os.path.basename(file_path)[:-len(".json")].split("-")
+            peer = other_node + "@" + path
+            if other_node == node or int(last) <= get_peer(cursor, peer)[0]:
+                continue
+            with open(file_path) as f:
+                received += apply_changes(cursor, json.load(f))
+            set_peer(cursor, peer, received_seq=int(last))
+
+        peer = "dir:" + path
+        sent_seq = get_peer(cursor, peer)[1]
+        changes = get_changes(cursor, sent_seq, local_end)
+        if changes:
+            # zero-padded, so that the files of a node sort in the order they were written
+            file_path = os.path.join(path, "%s-%012d-%012d.json" % (node, sent_seq + 1, local_end))
+            with open(file_path + ".tmp", "w") as f:
+                json.dump(changes, f)
+            os.replace(file_path + ".tmp", file_path)
+        set_peer(cursor, peer, sent_seq=last_seq(cursor))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return received, len(changes)
+
+
+def sync(db, path: str):
+    path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        return sync_directory(db, path)
+    if not os.path.exists(path):
+        raise SyncError("No such DB or directory: %s" % path)
+
+    other_db = sqlite3.connect(path)
+    try:
+        schema.upgrade(other_db)  # the other DB may have been used by an older version
+        return sync_databases(db, other_db)
+    finally:
+        other_db.close()
@@ -0,0 +1,20 @@
+"""
+A new DB for the tests, created like aide does on the first start and upgraded to the latest migration.
+"""
+import os
+import sqlite3
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import schema  # noqa: E402
+
+
+def create_database(path: str = ":memory:"):
+    db = sqlite3.connect(path)
+    for script in ("db.sql", "triggers.sql"):
+        with open(os.path.join(ROOT, script)) as f:
+            db.executescript(f.read())
+    schema.upgrade(db)
+    return db
@@ -0,0 +1,186 @@
+"""
+Tasks: the top task, their order in a project and their dependencies.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from database import create_database
+import core
+
+
+class TopTaskTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = create_database(os.path.join(self.directory, "aide.db"))
+        self.cursor = self.db.cursor()
+        core._top_task_cache = (None, 0.0, None)
+        self.queries = []
+        self.db.set_trace_callback(self.queries.append)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+    def add_task(self, name: str, priority: int, actionable_at: str = "-1 minute") -> int:
+        core.add_task(self.db, self.cursor, name, priority, "", "", 1)
+        id_ = self.cursor.lastrowid
+        self.cursor.execute("UPDATE tasks SET actionable_at = datetime('now', ?) WHERE id = ?", (actionable_at, id_))
+        self.db.commit()
+        return id_
+
+    def top_task(self):
+        del self.queries[:]
+        task = core.get_top_task(self.cursor)
+        return task["name"] if task else None
+
+    def task_queries(self):
+        return [q for q in self.queries if "FROM tasks" in q]
+
+    def test_actionable_tasks_only(self):
+        self.add_task("later", 90, "+1 hour")
+        self.add_task("now", 10)
+        self.assertEqual(self.top_task(), "now")
+        self.assertEqual(core.get_due_boundaries(self.cursor), [mock.ANY])
+
+    def test_cached_until_a_write(self):
+        self.add_task("a", 10)
+        self.assertEqual(self.top_task(), "a")
+        self.assertEqual(self.top_task(), "a")
+        self.assertEqual(self.task_queries(), [])
+
+        self.add_task("b", 20)
+        self.assertEqual(self.top_task(), "b")
+        self.assertNotEqual(self.task_queries(), [])
+
+    def test_write_by_another_connection(self):
+        self.add_task("a", 10)
+        self.assertEqual(self.top_task(), "a")
+        other = sqlite3.connect(os.path.join(self.directory, "aide.db"))
+        other.execute("UPDATE tasks SET name = 'renamed'")
+        other.commit()
+        other.close()
+        self.assertEqual(self.top_task(), "renamed")
+
+    def test_cached_until_the_next_boundary(self):
+        self.add_task("a", 10)
+        self.add_task("b", 20, "+1 hour")
+        self.assertEqual(self.top_task(), "a")
+        self.assertEqual(self.top_task(), "a")
+        self.assertEqual(self.task_queries(), [])
+
+        with mock.patch("time.time", return_value=time.time() + 2 * 60 * 60):
+            self.top_task()
+        self.assertNotEqual(self.task_queries(), [])
+
+
+class TaskOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.db = create_database()
+        self.cursor = self.db.cursor()
+
+    def tearDown(self):
+        self.db.close()
+
+    def add_task(self, name: str, repeat: str = None) -> int:
+        core.add_task(self.db, self.cursor, name, 0, "", "", 1, repeat)
+        self.cursor.execute("SELECT id FROM tasks WHERE name = ? ORDER BY id DESC", (name,))
+        return self.cursor.fetchone()[0]
+
+    def orders(self):
+        self.cursor.execute("SELECT name, order_in_project FROM tasks WHERE project = 1 AND status = 1")
+        return dict(self.cursor.fetchall())
+
+    def names(self):
+        return [t["name"] for t in core.list_tasks(self.cursor, project=1)]
+
+    def test_new_tasks_on_top(self):
+        for name in ("a", "b", "c"):
+            self.add_task(name)
+        self.assertEqual(self.names(), ["c", "b", "a"])
+        # every new task gets a position of its own, a gap apart
+        self.assertEqual(sorted(self.orders().values()), [-2 * core.ORDER_GAP, -core.ORDER_GAP, 0])
+
+    def test_move_updates_the_moved_task_only(self):
+        ids = {name: self.add_task(name) for name in ("a", "b", "c")}
+        before = self.orders()
+        core.move_tasks(self.db, self.cursor, [ids["a"]], after=ids["c"])
+        after = self.orders()
+
+        self.assertEqual(self.names(), ["c", "a", "b"])
+        self.assertEqual({n: o for n, o in after.items() if n != "a"}, {n: o for n, o in before.items() if n != "a"})
+
+    def test_repeated_task_keeps_its_place(self):
+        self.add_task("a")
+        daily = self.add_task("daily", "+1 day")
+        self.add_task("b")
+        core.close_task(self.db, self.cursor, daily)
+        self.assertEqual(self.names(), ["b", "daily", "a"])
+
+
+class DependencyTest(unittest.TestCase):
+    def setUp(self):
+        self.db = create_database()
+        self.cursor = self.db.cursor()
+        self.blocker = self.add_task("blocker", 10)
+        self.task = self.add_task("task", 90)
+        core.link_tasks(self.db, self.cursor, self.task, self.blocker)
+
+    def tearDown(self):
+        self.db.close()
+
+    def add_task(self, name: str, priority: int) -> int:
+        core.add_task(self.db, self.cursor, name, priority, "", "", 1)
+        return self.cursor.lastrowid
+
+    def names(self, **kwargs):
+        return [t["name"] for t in core.list_tasks(self.cursor, **kwargs)]
+
+    def test_blocked_until_the_blocker_is_closed(self):
+        self.assertEqual(self.names(), ["blocker"])
+        self.assertEqual(self.names(exclude_blocked=False), ["task", "blocker"])
+        self.assertEqual(core.get_top_task(self.cursor)["name"], "blocker")
+        self.assertEqual(core.get_blockers(self.cursor, self.task), [{"id": self.blocker, "name": "blocker",
+                                                                       "status": 1}])
+
+        core.close_task(self.db, self.cursor, self.blocker)
+        self.assertEqual(self.names(), ["task"])
+        self.assertEqual(core.get_top_task(self.cursor)["name"], "task")
+
+        # reopening the blocker blocks the task again
+        core.modify_task(self.db, self.cursor, self.blocker, status=1)
+        self.assertEqual(self.names(), ["blocker"])
+
+    def test_several_blockers(self):
+        other = self.add_task("other blocker", 20)
+        core.link_tasks(self.db, self.cursor, self.task, other)
+        core.close_task(self.db, self.cursor, self.blocker)
+        self.assertNotIn("task", self.names())
+
+        core.unlink_tasks(self.db, self.cursor, self.task, other)
+        self.assertIn("task", self.names())
+
+    def test_deleted_blocker(self):
+        core.delete_task(self.db, self.cursor, self.blocker)
+        self.assertEqual(self.names(), ["task"])
+        self.assertEqual(core.get_blockers(self.cursor, self.task), [])
+
+    def test_cycles(self):
+        middle = self.add_task("middle", 50)
+        core.link_tasks(self.db, self.cursor, middle, self.task)
+        with self.assertRaises(ValueError):
+            core.link_tasks(self.db, self.cursor, self.blocker, middle)
+        with self.assertRaises(ValueError):
+            core.link_tasks(self.db, self.cursor, self.task, self.task)
+        with self.assertRaises(ValueError):
+            core.link_tasks(self.db, self.cursor, self.task, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
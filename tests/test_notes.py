@@ -0,0 +1,83 @@
+"""
+The journal: notes and closed tasks, day by day.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import io
+import os
+import unittest
+
+from database import ROOT, create_database
+import core
+import notes
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.db = create_database()
+        self.cursor = self.db.cursor()
+
+    def tearDown(self):
+        self.db.close()
+
+    def add_task(self, name: str) -> int:
+        core.add_task(self.db, self.cursor, name, 0, "", "", 1)
+        return self.cursor.lastrowid
+
+    def set_status(self, id_: int, status: int, date: str):
+        # the status event is moved to the given day
+        core.modify_task(self.db, self.cursor, id_, status=status)
+        self.cursor.execute("UPDATE task_events SET time = CAST(strftime('%s', ?, '+12 hours') AS INTEGER) "
+                            "WHERE id = (SELECT max(id) FROM task_events WHERE task = ?)", (date, id_))
+        self.db.commit()
+
+    def test_days(self):
+        core.add_note(self.db, self.cursor, "2024-03-01", "first")
+        core.add_note(self.db, self.cursor, "2024-03-03", "second")
+        self.set_status(self.add_task("report"), 0, "2024-03-01")
+
+        self.assertEqual(notes.get_journal(self.cursor, "2024-03-01", "2024-03-31"), [
+            {"date": "2024-03-01", "notes": [{"id": 1, "text": "first"}], "closed": [{"id": 1, "name": "report"}]},
+            {"date": "2024-03-03", "notes": [{"id": 2, "text": "second"}], "closed": []},
+        ])
+        self.assertEqual([d["date"] for d in notes.get_journal(self.cursor, reverse=True)],
+                         ["2024-03-03", "2024-03-01"])
+        self.assertEqual(notes.get_first_day(self.cursor), "2024-03-01")
+
+    def test_closed_again(self):
+        again = self.add_task("closed again")
+        self.set_status(again, 0, "2024-03-01")
+        self.set_status(again, 1, "2024-03-02")
+        self.set_status(again, 0, "2024-03-05")
+        reopened = self.add_task("reopened")
+        self.set_status(reopened, 0, "2024-03-01")
+        self.set_status(reopened, 1, "2024-03-02")
+
+        self.assertEqual(notes.get_journal(self.cursor), [
+            {"date": "2024-03-05", "notes": [], "closed": [{"id": again, "name": "closed again"}]},
+        ])
+
+    def test_closed_before_the_history(self):
+        # as the tasks closed before migrations/003_task_events.sql: no close event
+        self.cursor.execute("INSERT INTO tasks(name, priority, weight, due_date, status, project) "
+                            "VALUES ('old', 0, 1, '2020-05-04', 0, 1)")
+        self.cursor.execute("INSERT INTO tasks(name, priority, weight, due_date, status, project) "
+                            "VALUES ('undated', 0, 1, NULL, 0, 1)")
+        with open(os.path.join(ROOT, "migrations", "017_closed_events.sql")) as f:
+            self.db.executescript(f.read())
+
+        self.assertEqual([(d["date"], d["closed"][0]["name"]) for d in notes.get_journal(self.cursor)],
+                         [("2020-05-04", "old")])
+
+    def test_export_markdown(self):
+        core.add_note(self.db, self.cursor, "2024-03-01", "line one\nline two")
+        self.set_status(self.add_task("report"), 0, "2024-03-01")
+        out = io.StringIO()
+
+        self.assertEqual(notes.export_markdown(self.cursor, 2024, out), 1)
+        self.assertEqual(out.getvalue(), "# Journal 2024\n\n## 2024-03-01, Friday\n\n"
+                                         "- line one\n  line two\n- [x] report\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
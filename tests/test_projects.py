@@ -0,0 +1,69 @@
+"""
+Hidden projects: their tasks are left out of the default lists, the top task and the reports.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import create_database
+import core
+import pool
+import project_mod
+import schedule
+
+
+class HiddenProjectTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "aide.db")
+        self.db = create_database(self.db_path)
+        self.cursor = self.db.cursor()
+        core._top_task_cache = (None, 0.0, None)
+
+        project_mod.add_project(self.db, self.cursor, "routines", 0)
+        self.routines = self.cursor.lastrowid
+        core.add_task(self.db, self.cursor, "water plants", 90, "", "today", 2, project=self.routines)
+        self.routine = self.cursor.lastrowid
+        core.add_task(self.db, self.cursor, "write report", 10, "", "today", 3)
+        core.add_task(self.db, self.cursor, "stretch", 50, "", "no", 1, project=self.routines)
+        project_mod.modify_project(self.db, self.cursor, self.routines, hidden=True)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+    def names(self, **kwargs):
+        return [t["name"] for t in core.list_tasks(self.cursor, **kwargs)]
+
+    def test_left_out(self):
+        self.assertEqual(self.names(), ["write report"])
+        self.assertEqual(core.get_top_task(self.cursor)["name"], "write report")
+        self.assertEqual(core.get_total_weight(self.cursor), 3.0)
+        self.assertEqual(schedule.get_backlog(self.cursor), [])
+
+    def test_listed_with_their_project(self):
+        self.assertEqual(self.names(project=self.routines), ["stretch", "water plants"])
+
+    def test_moved_and_shown(self):
+        core.modify_task(self.db, self.cursor, self.routine, project=1)
+        self.assertEqual(self.names(), ["water plants", "write report"])
+
+        project_mod.modify_project(self.db, self.cursor, self.routines, hidden=False)
+        self.assertEqual(self.names(), ["water plants", "stretch", "write report"])
+        self.assertEqual(core.get_total_weight(self.cursor), 5.0)
+
+    def test_profiles(self):
+        other_path = os.path.join(self.directory, "other.db")
+        create_database(other_path).close()
+        profiles = pool.Pool({"profiles": {"home": {"db_path": self.db_path}, "work": {"db_path": other_path}}})
+
+        self.assertEqual(profiles.get_top_task()["name"], "write report")
+        self.assertEqual(profiles.get_total_weights(), [{"profile": "home", "total": 3.0, "closed": 0.0},
+                                                        {"profile": "work", "total": 0.0, "closed": 0.0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
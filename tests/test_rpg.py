@@ -0,0 +1,83 @@
+"""
+The progression rules, completing quests and rebuilding the character from the ledger.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import unittest
+
+from database import create_database
+import rpg_mod
+
+
+class RulesTest(unittest.TestCase):
+    def test_default_levels(self):
+        rules = rpg_mod.Rules({})
+        # level 1 is left above 100 XP, every next level takes 50 + 5 * level more
+        self.assertEqual([rules.next_level_xp(n) for n in (1, 2, 3)], [100, 155, 215])
+        self.assertEqual([rules.level(xp) for xp in (0, 100, 101, 155, 156, 216)], [1, 1, 2, 2, 3, 4])
+
+    def test_beyond_the_precomputed_levels(self):
+        rules = rpg_mod.Rules({})
+        level = rules.level(10 ** 8)
+        self.assertLess(rules.next_level_xp(level - 1), 10 ** 8)
+        self.assertGreaterEqual(rules.next_level_xp(level), 10 ** 8)
+
+    def test_skills(self):
+        rules = rpg_mod.Rules({"skill_xp": [50, 10]})
+        # value 1 takes 50 XP, value 2 60 more, value 3 70 more
+        self.assertEqual([rules.skill(total) for total in (0, 50, 51, 110, 111, 181)],
+                         [(0, 0), (0, 50), (1, 1), (1, 60), (2, 1), (3, 1)])
+        self.assertEqual(rules.skill_total(2, 1), 111)
+
+    def test_quest_gold(self):
+        rules = rpg_mod.Rules({"quest_gold": [12, 3]})
+        self.assertEqual(rules.quest_gold(3, 2), 6)
+
+    def test_invalid_rules(self):
+        for rules in ({"level_gold_": 1}, {"level_xp": [0, 5]}, {"skill_xp": [50, -1]}, {"quest_gold": [10, 0]}):
+            with self.assertRaises(ValueError):
+                rpg_mod.Rules(rules)
+
+
+class ProgressionTest(unittest.TestCase):
+    def setUp(self):
+        self.db = create_database()
+        self.cursor = self.db.cursor()
+        rpg_mod._character_cache = (None, None)
+        self.cursor.execute("INSERT INTO skills(name) VALUES ('writing')")
+        rpg_mod.add_quest(self.db, self.cursor, "essay", 80, 2, self.cursor.lastrowid)
+        self.quest = self.cursor.lastrowid
+
+    def tearDown(self):
+        rpg_mod.configure({})
+        self.db.close()
+
+    def test_close_quests(self):
+        simulated = rpg_mod.simulate(self.cursor, [self.quest, self.quest])
+        summary = rpg_mod.close_quests(self.db, self.cursor, [self.quest, self.quest])
+
+        # 160 XP: two levels, 100 gold each, and (10 - 2) // 2 * 1 gold per quest
+        self.assertEqual(summary, simulated)
+        self.assertEqual((summary["xp"], summary["levels"], summary["level"], summary["gold"]), (160, 2, 3, 208))
+        self.assertEqual(summary["skills"], [{"id": 1, "name": "writing", "value": 3, "levels": 3, "xp": 10}])
+        character = rpg_mod.get_character_stats(self.cursor)
+        self.assertEqual((character["xp"], character["level"], character["gold"]), (160, 3, 208))
+
+        report = rpg_mod.get_report(self.cursor)
+        self.assertEqual((report["weeks"][0]["xp"], report["weeks"][0]["gold_earned"]), (160, 208))
+        self.assertEqual([level for _, level in report["levels"]], [3, 2])
+
+    def test_rebuild_under_new_rules(self):
+        rpg_mod.close_quests(self.db, self.cursor, [self.quest, self.quest])
+        rpg_mod.configure({"rpg_rules": {"first_level_xp": 50, "level_xp": [100, 0], "level_gold": 10,
+                                         "quest_gold": [10, 1]}})
+        character = rpg_mod.rebuild(self.db, self.cursor)
+
+        # levels are left above 50 and 150 XP; the level-ups and the quests are paid under the new rules
+        self.assertEqual((character["xp"], character["level"], character["xp_for_next_level"]), (160, 3, 250))
+        self.assertEqual(character["gold"], 2 * 10 + 2 * 8)
+        self.assertEqual(rpg_mod.get_report(self.cursor)["weeks"][0]["gold_earned"], character["gold"])
+
+
+if __name__ == '__main__':
+    unittest.main()
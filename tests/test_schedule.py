@@ -0,0 +1,70 @@
+"""
+Rescheduling the overdue tasks by weight.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import unittest
+
+from database import create_database
+import core
+import project_mod
+import schedule
+
+
+class RescheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.db = create_database()
+        self.cursor = self.db.cursor()
+        self.days = schedule.get_days(self.cursor, 3)
+
+    def tearDown(self):
+        self.db.close()
+
+    def add_task(self, name: str, priority: int, weight: float, overdue: bool = True, project: int = None) -> int:
+        core.add_task(self.db, self.cursor, name, priority, "", "", weight, project=project)
+        id_ = self.cursor.lastrowid
+        if overdue:
+            self.cursor.execute("UPDATE tasks SET due_date = date('now', '-2 days') WHERE id = ?", (id_,))
+            self.db.commit()
+        return id_
+
+    def new_dates(self):
+        return {t["name"]: t["new_date"] for t in schedule.plan_reschedule(self.cursor, 3, 2.0)}
+
+    def test_capacity(self):
+        self.add_task("low", 10, 1)
+        self.add_task("high", 90, 2)
+        self.add_task("middle", 50, 1)
+        self.add_task("due today", 0, 1, overdue=False)
+
+        # today has 1 left beside the task due today: the highest priority goes first, to the first day with room
+        self.assertEqual(self.new_dates(), {"high": self.days[1], "middle": self.days[0], "low": self.days[2]})
+
+    def test_overflow(self):
+        for name in ("a", "b", "c", "d"):
+            self.add_task(name, 0, 2)
+        # three days of room for two, the fourth task goes to the earliest of the least loaded days
+        self.assertEqual(self.new_dates(), {"a": self.days[0], "b": self.days[1], "c": self.days[2],
+                                            "d": self.days[0]})
+
+    def test_hidden_and_blocked(self):
+        project_mod.add_project(self.db, self.cursor, "routines", 0)
+        routines = self.cursor.lastrowid
+        project_mod.modify_project(self.db, self.cursor, routines, hidden=True)
+        self.add_task("routine", 90, 1, project=routines)
+        blocker = self.add_task("blocker", 10, 1)
+        blocked = self.add_task("blocked", 90, 1)
+        core.link_tasks(self.db, self.cursor, blocked, blocker)
+
+        self.assertEqual(self.new_dates(), {"blocker": self.days[0]})
+
+    def test_reschedule(self):
+        id_ = self.add_task("a", 0, 1)
+        self.assertEqual([t["id"] for t in schedule.reschedule(self.db, self.cursor, 3, 2.0)], [id_])
+        self.cursor.execute("SELECT due_date FROM tasks WHERE id = ?", (id_,))
+        self.assertEqual(self.cursor.fetchone()[0], self.days[0])
+        self.assertEqual(schedule.plan_reschedule(self.cursor, 3, 2.0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+The HTTP/JSON API: the arguments of the clients and the writer.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from database import create_database
+import client
+import server
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "aide.db")
+        self.db = create_database(self.db_path)
+        self.cursor = self.db.cursor()
+
+        self.httpd = server.create_server({"db_path": self.db_path}, port=0, readers=1)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.connection = client.Connection("http://127.0.0.1:%d" % self.httpd.server_port)
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+    def names(self, **kwargs):
+        return [t["name"] for t in self.connection.call("core.list_tasks", [], kwargs)]
+
+    def test_arguments_are_not_sql(self):
+        self.connection.call("core.add_task", ["a", 0, "", "2024-01-01') OR 1=1 OR date('", 1], {})
+        self.connection.call("core.add_task", ["b", 0, "", "today", 1], {})
+
+        self.assertEqual(self.names(due_date="today"), ["b"])
+        self.assertEqual(self.names(project="1 OR 1=1"), [])
+        self.cursor.execute("SELECT name, due_date FROM tasks ORDER BY id")
+        self.assertEqual(self.cursor.fetchall()[0], ("a", None))
+
+    def test_writer_takes_the_weekly_snapshot(self):
+        self.cursor.execute("UPDATE task_snapshots SET time = time - ?", (server.history.SNAPSHOT_INTERVAL,))
+        self.db.commit()
+        self.connection.call("core.add_task", ["a", 0, "", "today", 1], {})
+
+        self.cursor.execute("SELECT count(*), max(time) FROM task_snapshots")
+        count, last = self.cursor.fetchone()
+        self.assertEqual(count, 2)
+        self.assertAlmostEqual(last, time.time(), delta=60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Two-DB sync: changes made in one DB reach the other one.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from database import create_database
+import project_mod
+import rpg_mod
+import sync
+
+
+class TwoDatabasesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = create_database(os.path.join(self.directory, "a.db"))
+        self.cursor = self.db.cursor()
+        for name in ("home", "work", "garden"):
+            project_mod.add_project(self.db, self.cursor, name, 0)
+        self.cursor.execute("INSERT INTO skills(name) VALUES ('writing')")
+        rpg_mod.add_quest(self.db, self.cursor, "essay", 80, 2, self.cursor.lastrowid)
+
+        # the peer starts as a copy, as described in the README
+        self.db.close()
+        shutil.copy(os.path.join(self.directory, "a.db"), os.path.join(self.directory, "b.db"))
+        self.db = sqlite3.connect(os.path.join(self.directory, "a.db"))
+        self.cursor = self.db.cursor()
+        self.other_db = sqlite3.connect(os.path.join(self.directory, "b.db"))
+        self.other_cursor = self.other_db.cursor()
+        sync.reset_node(self.other_db, self.other_cursor)
+        sync.sync_databases(self.db, self.other_db)
+
+    def tearDown(self):
+        self.db.close()
+        self.other_db.close()
+        shutil.rmtree(self.directory)
+
+    def project_id(self, cursor: sqlite3.Cursor, name: str) -> int:
+        cursor.execute("SELECT id FROM projects WHERE name = ?", (name,))
+        return cursor.fetchone()[0]
+
+    def test_move_project(self):
+        work = self.project_id(self.cursor, "work")
+        garden = self.project_id(self.cursor, "garden")
+        project_mod.move_project(self.db, self.cursor, garden, work)
+        sync.sync_databases(self.db, self.other_db)
+
+        other_work = self.project_id(self.other_cursor, "work")
+        other_garden = self.project_id(self.other_cursor, "garden")
+        self.other_cursor.execute("SELECT parent FROM projects WHERE id = ?", (other_garden,))
+        self.assertEqual(self.other_cursor.fetchone()[0], other_work)
+        # the closure table of the peer follows the move
+        self.other_cursor.execute("SELECT depth FROM project_tree WHERE ancestor = ? AND descendant = ?",
+                                  (other_work, other_garden))
+        self.assertEqual(self.other_cursor.fetchone(), (1,))
+
+    def test_hide_project(self):
+        project_mod.modify_project(self.db, self.cursor, self.project_id(self.cursor, "home"), hidden=True)
+        sync.sync_databases(self.db, self.other_db)
+
+        self.other_cursor.execute("SELECT hidden FROM projects WHERE id = ?",
+                                  (self.project_id(self.other_cursor, "home"),))
+        self.assertEqual(self.other_cursor.fetchone()[0], 1)
+
+    def test_close_quests(self):
+        # a quest in each DB: together they are enough for level 3
+        rpg_mod.close_quests(self.db, self.cursor, [self.quest_id(self.cursor)])
+        rpg_mod.close_quests(self.other_db, self.other_cursor, [self.quest_id(self.other_cursor)])
+        sync.sync_databases(self.db, self.other_db)
+
+        for db, cursor in ((self.db, self.cursor), (self.other_db, self.other_cursor)):
+            character = rpg_mod.read_character(cursor)
+            self.assertEqual((character["xp"], character["level"]), (160, 3))
+            self.assertEqual(rpg_mod.get_skills(cursor)[0]["value"], 3)
+            self.assertEqual(rpg_mod.get_report(cursor)["weeks"][0]["xp"], 160)
+            # the progress received from the peer is in the ledger, so a rebuild keeps it
+            self.assertEqual(rpg_mod.rebuild(db, cursor)["xp"], 160)
+
+    def quest_id(self, cursor: sqlite3.Cursor) -> int:
+        cursor.execute("SELECT id FROM quests WHERE name = 'essay'")
+        return cursor.fetchone()[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Tags, filter expressions and saved views.
+
+Run from the repository root: python -m unittest discover tests
+"""
+import unittest
+
+from database import create_database
+import core
+import project_mod
+import views
+
+
+class FilterTest(unittest.TestCase):
+    def setUp(self):
+        self.db = create_database()
+        self.cursor = self.db.cursor()
+        views._results_cache = (None, {})
+        project_mod.add_project(self.db, self.cursor, "work", 0)
+        self.work = self.cursor.lastrowid
+        project_mod.add_project(self.db, self.cursor, "reports", 0, self.work)
+        self.reports = self.cursor.lastrowid
+
+        self.ids = {}
+        for name, priority, weight, date, project in (("mail", 10, 1, "today", None),
+                                                      ("write report", 60, 3, "+3 days", self.reports),
+                                                      ("plan week", 80, 2, "no", self.work),
+                                                      ("read paper", 40, 1, "2020-01-01", None)):
+            core.add_task(self.db, self.cursor, name, priority, "", date, weight, project=project)
+            self.ids[name] = self.cursor.lastrowid
+        views.tag_task(self.db, self.cursor, self.ids["mail"], ["home", "quick"])
+        views.tag_task(self.db, self.cursor, self.ids["read paper"], ["quick"])
+
+    def tearDown(self):
+        self.db.close()
+
+    def names(self, expression: str):
+        return [t["name"] for t in views.filter_tasks(self.cursor, expression)]
+
+    def test_terms(self):
+        self.assertEqual(self.names(""), ["plan week", "write report", "read paper", "mail"])
+        self.assertEqual(self.names("tag:quick"), ["read paper", "mail"])
+        self.assertEqual(self.names("!tag:quick"), ["plan week", "write report"])
+        self.assertEqual(self.names("project:%d" % self.work), ["plan week", "write report"])
+        self.assertEqual(self.names("prio>=60 weight<3"), ["plan week"])
+        self.assertEqual(self.names("due<=today"), ["read paper", "mail"])
+        self.assertEqual(self.names("due>today"), ["write report"])
+        self.assertEqual(self.names("due=none"), ["plan week"])
+        self.assertEqual(self.names("report"), ["write report"])
+
+    def test_status(self):
+        core.close_task(self.db, self.cursor, self.ids["mail"])
+        self.assertEqual(self.names("tag:quick"), ["read paper"])
+        self.assertEqual(self.names("tag:quick closed"), ["mail"])
+        self.assertEqual(self.names("tag:quick !open"), ["mail"])
+        self.assertEqual(self.names("tag:quick any"), ["read paper", "mail"])
+
+    def test_blocked_and_hidden(self):
+        core.link_tasks(self.db, self.cursor, self.ids["plan week"], self.ids["mail"])
+        self.assertNotIn("plan week", self.names(""))
+        self.assertEqual(self.names("blocked"), ["plan week"])
+
+        project_mod.modify_project(self.db, self.cursor, self.reports, hidden=True)
+        self.assertNotIn("write report", self.names(""))
+        self.assertEqual(self.names("project:%d" % self.reports), ["write report"])
+
+    def test_invalid_expressions(self):
+        for expression in ("due<none", "due<=someday", "colour:red", "size>3", "!any"):
+            with self.assertRaises(ValueError):
+                views.filter_tasks(self.cursor, expression)
+
+    def test_results_follow_the_writes(self):
+        self.assertEqual(self.names("tag:work"), [])
+        views.tag_task(self.db, self.cursor, self.ids["plan week"], ["work"])
+        self.assertEqual(self.names("tag:work"), ["plan week"])
+        views.untag_task(self.db, self.cursor, self.ids["plan week"], ["work"])
+        self.assertEqual(self.names("tag:work"), [])
+
+    def test_tags(self):
+        self.assertEqual(views.get_tags(self.cursor, self.ids["mail"]), ["home", "quick"])
+        self.assertEqual(views.get_tags(self.cursor), [("home", 1), ("quick", 2)])
+
+    def test_views(self):
+        views.save_view(self.db, self.cursor, "quick", "tag:quick")
+        views.save_view(self.db, self.cursor, "quick", "tag:quick prio>20")
+        self.assertEqual(views.get_views(self.cursor), [{"name": "quick", "expression": "tag:quick prio>20"}])
+        self.assertEqual([t["name"] for t in views.list_view(self.cursor, "quick")], ["read paper"])
+        with self.assertRaises(ValueError):
+            views.save_view(self.db, self.cursor, "broken", "due<none")
+
+        self.assertTrue(views.delete_view(self.db, self.cursor, "quick"))
+        with self.assertRaises(ValueError):
+            views.list_view(self.cursor, "quick")
+
+
+if __name__ == '__main__':
+    unittest.main()
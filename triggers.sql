@@ -1,17 +1,10 @@
--- DROP TRIGGER "main"."set_due_date";
-DROP TRIGGER "main"."repeat_task";
-DROP TRIGGER "main"."repeat_task_workdays";
+-- Initial triggers of a new DB; migrations/002_sync.sql redefines the repeat triggers, so do not re-apply this
+-- script to a DB that aide has already opened
+DROP TRIGGER IF EXISTS "main"."set_due_date";
+DROP TRIGGER IF EXISTS "main"."repeat_task";
+DROP TRIGGER IF EXISTS "main"."repeat_task_workdays";
 
 
--- CREATE TRIGGER "set_due_date"
---    AFTER
---    INSERT
---    ON tasks
---   FOR EACH ROW WHEN (new.due_date is null)
--- BEGIN
---     UPDATE tasks SET due_date=date('now') WHERE id = new.id;
--- END;
-
 CREATE TRIGGER "main"."repeat_task"
     AFTER UPDATE
     ON tasks
@@ -0,0 +1,205 @@
+"""
+Tags, filter expressions and saved views.
+
+A filter is a list of terms that all have to match; a term is negated by a leading "!":
+
+    tag:work prio>50 due<=+3d !closed
+
+    tag:NAME                  the task has the tag
+    project:ID                the task is in the project or one of its sub-projects
+    prio, weight OP NUMBER    OP is one of = != < <= > >=
+    due OP DATE               DATE is today, tomorrow, YYYY-MM-DD, none or +3d, -1w, +2m (relative to today)
+    open, closed, any         the status; open tasks by default
+    blocked                   the task waits for open tasks; like in the lists, open ones are left out otherwise
+    WORD                      the name contains the word
+
+As in core.list_tasks(), the tasks of hidden projects only match filters with a project term.
+An expression is compiled once into a parameterized WHERE clause. Saved views are named expressions kept in the DB;
+their results are cached until the next write to the DB. Tags and views are not synced.
+"""
+import functools
+import re
+import sqlite3
+
+import core
+import schema
+
+DEFAULT_LIMIT = 35
+
+FIELDS = {
+    "prio": "priority",
+    "priority": "priority",
+    "weight": "weight",
+    "due": "due_date",
+}
+DATE_UNITS = {"d": "days", "w": "days", "m": "months"}
+
+TERM = re.compile(r"^(\w+)(<=|>=|!=|=|<|>)(.+)$")
+
+# (connection key, {(expression, limit): tasks}) is replaced as a whole, like the top task cache in core
+_results_cache = (None, {})
+
+
+def parse_date(value: str):
+    """
+    SQL expression and parameters of a date of a filter
+    """
+    if value == "today":
+        return "date('now')", []
+    if value == "tomorrow":
+        return "date('now', '+1 day')", []
+    match = re.match(r"^([+-]\d+)([dwm])$", value)
+    if match:
+        amount = int(match.group(1)) * (7 if match.group(2) == "w" else 1)
+        return "date('now', ?)", ["%+d %s" % (amount, DATE_UNITS[match.group(2)])]
+    if re.match(r"^\d{4}-\d{2}-\d{2}$", value):
+        return "?", [value]
+    raise ValueError("Unknown date in a filter: " + value)
+
+
+def compile_term(term: str):
+    """
+    (SQL condition, parameters) of a term; the status terms are handled by compile_filter()
+    """
+    if term.startswith("tag:"):
+        return "id IN (SELECT tt.task FROM task_tags tt JOIN tags g ON g.id = tt.tag WHERE g.name = ?)", [term[4:]]
+    if term.startswith("project:"):
+        return "project IN (SELECT descendant FROM project_tree WHERE ancestor = ?)", [int(term[8:])]
+    if term == "blocked":
+        return "blocked_count > 0", []
+
+    match = TERM.match(term)
+    if match and match.group(1) in FIELDS:
+        field, operator, value = FIELDS[match.group(1)], match.group(2), match.group(3)
+        if field != "due_date":
+            return field + " " + operator + " ?", [float(value)]
+        if value == "none":
+            if operator not in ("=", "!="):
+                raise ValueError("Tasks without a due date can only be matched with due=none or due!=none")
+            return "due_date IS " + ("NULL" if operator == "=" else "NOT NULL"), []
+        sql, params = parse_date(value)
+        return "due_date " + operator + " " + sql, params
+    if match or ":" in term:
+        raise ValueError("Unknown filter term: " + term)
+    return "name LIKE ?", ["%" + term + "%"]
+
+
+@functools.lru_cache(maxsize=256)
+def compile_filter(expression: str):
+    """
+    (WHERE clause, parameters, index hint) of a filter expression
+    """
+    conditions = []
+    params = []
+    status = "status=1"
+    has_project = has_tag = has_blocked = False
+    for term in expression.split():
+        negated = term.startswith("!")
+        term = term[1:] if negated else term
+        if term in ("open", "closed", "any"):
+            if term == "any" and negated:
+                raise ValueError("!any matches no task")
+            status = {"open": "status=1", "closed": "status=0", "any": None}[term]
+            if negated:
+                status = "status=0" if term == "open" else "status=1"
+            continue
+        sql, term_params = compile_term(term)
+        has_project = has_project or term.startswith("project:")
+        has_tag = has_tag or term.startswith("tag:")
+        has_blocked = has_blocked or term == "blocked"
+        conditions.append("NOT (" + sql + ")" if negated else sql)
+        params += term_params
+
+    if not has_blocked:
+        conditions.insert(0, "(blocked_count=0 OR status=0)")
+    # the same conditions as the partial indexes, so that SQLite can use them
+    if not has_project:
+        conditions.insert(0, "hidden=0")
+    if status:
+        conditions.insert(0, status)
+    # walking the open tasks by priority stops at the limit; the closed tasks are the most of the table, so they are
+    # read in one pass rather than through tasks_project_index; a tag or a project selects fewer tasks by itself
+    if has_project or has_tag:
+        hint = ""
+    elif status == "status=1":
+        hint = " INDEXED BY tasks_visible_index"
+    else:
+        hint = " NOT INDEXED"
+    return " AND ".join(conditions) or "1", tuple(params), hint
+
+
+def filter_tasks(cursor: sqlite3.Cursor, expression: str, limit: int = DEFAULT_LIMIT):
+    """
+    The tasks matching the filter, by priority; raises ValueError if the expression is not valid
+    """
+    global _results_cache
+    key = schema.connection_key(cursor)
+    cached_key, results = _results_cache
+    if cached_key != key:
+        results = {}
+        _results_cache = (key, results)
+    if (expression, limit) in results:
+        return [dict(t) for t in results[(expression, limit)]]
+
+    where, params, hint = compile_filter(expression)
+    cursor.execute("SELECT id, name, priority, " + core.utc_to_local("due_time") + ", status, weight, due_date, "
+                   "project, order_in_project, note FROM tasks" + hint + " WHERE " + where +
+                   " ORDER BY priority DESC, id DESC LIMIT ?", params + (limit,))
+    tasks = [core.task_to_dict(t) for t in cursor.fetchall()]
+    results[(expression, limit)] = tasks
+    return [dict(t) for t in tasks]
+
+
+def get_views(cursor: sqlite3.Cursor):
+    cursor.execute("SELECT name, expression FROM views ORDER BY name")
+    return [{"name": v[0], "expression": v[1]} for v in cursor.fetchall()]
+
+
+def save_view(db, cursor: sqlite3.Cursor, name: str, expression: str):
+    compile_filter(expression)
+    cursor.execute("INSERT INTO views(name, expression) VALUES (?, ?) "
+                   "ON CONFLICT (name) DO UPDATE SET expression = excluded.expression", (name, expression))
+    db.commit()
+
+
+def delete_view(db, cursor: sqlite3.Cursor, name: str):
+    cursor.execute("DELETE FROM views WHERE name = ?", (name,))
+    db.commit()
+    return cursor.rowcount > 0
+
+
+def list_view(cursor: sqlite3.Cursor, name: str, limit: int = DEFAULT_LIMIT):
+    """
+    The tasks of a saved view; raises ValueError if there is no such view
+    """
+    cursor.execute("SELECT expression FROM views WHERE name = ?", (name,))
+    view = cursor.fetchone()
+    if not view:
+        raise ValueError("No view named %s" % name)
+    return filter_tasks(cursor, view[0], limit)
+
+
+def tag_task(db, cursor: sqlite3.Cursor, id_: int, tags: list):
+    cursor.executemany("INSERT OR IGNORE INTO tags(name) VALUES (?)", [(t,) for t in tags])
+    cursor.execute("INSERT OR IGNORE INTO task_tags(task, tag) SELECT ?, id FROM tags WHERE name IN (" +
+                   ", ".join("?" * len(tags)) + ")", [id_] + list(tags))
+    db.commit()
+
+
+def untag_task(db, cursor: sqlite3.Cursor, id_: int, tags: list):
+    cursor.execute("DELETE FROM task_tags WHERE task = ? AND tag IN (SELECT id FROM tags WHERE name IN (" +
+                   ", ".join("?" * len(tags)) + "))", [id_] + list(tags))
+    db.commit()
+
+
+def get_tags(cursor: sqlite3.Cursor, id_: int = None):
+    """
+    The tags of a task, or all the tags with the number of their tasks
+    """
+    if id_ is not None:
+        cursor.execute("SELECT g.name FROM task_tags tt JOIN tags g ON g.id = tt.tag WHERE tt.task = ? ORDER BY g.name",
+                       (id_,))
+        return [t[0] for t in cursor.fetchall()]
+    cursor.execute("SELECT g.name, count(tt.task) FROM tags g LEFT JOIN task_tags tt ON tt.tag = g.id "
+                   "GROUP BY g.id ORDER BY g.name")
+    return cursor.fetchall()